@@ -0,0 +1,293 @@
+"""Сводные таблицы посещаемости для отчётов.
+
+employee_daily_stats хранит итоги по сотруднику за день, department_monthly_stats —
+по отделу за месяц: отработанные часы, опоздания, отметки без ухода и покрытие
+смен. Триггеры на attendance, shifts и employees только помечают затронутые
+пары (сотрудник, день) в stats_dirty; refresh_aggregates() пересчитывает из
+исходных данных лишь эти дни и затронутые ими месяцы отделов. Поэтому отчёты
+читают O(дней) готовых строк вместо O(отметок). Дни периодов, перенесённых в
+архив (archive.py), заморожены: их отметок в рабочей базе больше нет.
+Каждый пересчёт увеличивает номер в stats_version: по нему кэши производных
+данных (графики, charts.py) узнают, что сводки изменились.
+
+Запуск: python aggregates.py refresh | rebuild
+"""
+import argparse
+import logging
+import time
+
+from database import get_connection, transaction
+from log_config import setup_logging
+
+logger = logging.getLogger('iRama.aggregates')
+
+# Пересчёт дневных итогов для помеченных пар (сотрудник, день). Дни сводок —
+# строки 'гггг-мм-дд', в attendance и shifts — секунды и номера дней (timestamps.py)
+_DAILY_SQL = '''
+    WITH dirty AS (SELECT employee_id, day, CAST(strftime('%s', day) AS INTEGER) AS day_start FROM stats_dirty),
+    att AS (
+        SELECT a.employee_id, d.day,
+               COUNT(*) AS events,
+               SUM(CASE WHEN a.check_out_time IS NOT NULL
+                        THEN (a.check_out_time - a.check_in_time) / 3600.0
+                        ELSE 0 END) AS hours_worked,
+               SUM(a.check_out_time IS NULL) AS missing_checkouts,
+               SUM(s.id IS NOT NULL AND a.check_in_time > s.shift_date * 86400
+                                                          + strftime('%s', '1970-01-01 ' || s.start_time)) AS late_arrivals
+        FROM dirty d
+        JOIN attendance a ON a.employee_id = d.employee_id
+                         AND a.check_in_time >= d.day_start AND a.check_in_time < d.day_start + 86400
+        LEFT JOIN shifts s ON s.id = a.shift_id
+        GROUP BY a.employee_id, d.day
+    ),
+    sh AS (
+        SELECT s.employee_id, d.day,
+               COUNT(*) AS shifts_scheduled,
+               SUM(EXISTS (SELECT 1 FROM attendance a WHERE a.shift_id = s.id)) AS shifts_attended
+        FROM dirty d
+        JOIN shifts s ON s.employee_id = d.employee_id AND s.shift_date = d.day_start / 86400
+        GROUP BY s.employee_id, d.day
+    )
+    INSERT INTO employee_daily_stats (employee_id, day, department, hours_worked, late_arrivals,
+                                      missing_checkouts, shifts_scheduled, shifts_attended)
+    SELECT d.employee_id, d.day, e.department,
+           IFNULL(att.hours_worked, 0), IFNULL(att.late_arrivals, 0), IFNULL(att.missing_checkouts, 0),
+           IFNULL(sh.shifts_scheduled, 0), IFNULL(sh.shifts_attended, 0)
+    FROM dirty d
+    LEFT JOIN att ON att.employee_id = d.employee_id AND att.day = d.day
+    LEFT JOIN sh ON sh.employee_id = d.employee_id AND sh.day = d.day
+    LEFT JOIN employees e ON e.id = d.employee_id
+    WHERE att.events IS NOT NULL OR sh.shifts_scheduled IS NOT NULL
+'''
+
+# Условие «день {day} ('гггг-мм-дд') входит в архивный период»
+_FROZEN_SQL = '''
+    EXISTS (SELECT 1 FROM archive_periods p
+            WHERE {day} >= date(p.first_day * 86400, 'unixepoch') AND {day} < date(p.end_day * 86400, 'unixepoch'))
+'''
+
+# Пересчёт месячных итогов отделов по дневным строкам
+_MONTHLY_SQL = '''
+    INSERT INTO department_monthly_stats (department, month, employees, hours_worked, late_arrivals,
+                                          missing_checkouts, shifts_scheduled, shifts_attended)
+    SELECT k.department, k.month, COUNT(DISTINCT s.employee_id),
+           SUM(s.hours_worked), SUM(s.late_arrivals), SUM(s.missing_checkouts),
+           SUM(s.shifts_scheduled), SUM(s.shifts_attended)
+    FROM stats_dirty_months k
+    JOIN employee_daily_stats s ON s.department IS k.department
+                               AND s.day >= k.month || '-01' AND s.day < date(k.month || '-01', '+1 month')
+    GROUP BY k.department, k.month
+'''
+
+
+def create_aggregate_schema(conn):
+    """Создаёт сводные таблицы и триггеры (вызывается из миграции)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS employee_daily_stats (
+            employee_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            department TEXT,
+            hours_worked REAL NOT NULL DEFAULT 0,
+            late_arrivals INTEGER NOT NULL DEFAULT 0,
+            missing_checkouts INTEGER NOT NULL DEFAULT 0,
+            shifts_scheduled INTEGER NOT NULL DEFAULT 0,
+            shifts_attended INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employee_daily_stats_department_day "
+                 "ON employee_daily_stats (department, day)")
+    # Покрывающий индекс: итоги по дням для графиков читаются без обращения к таблице
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employee_daily_stats_day_totals ON employee_daily_stats "
+                 "(day, department, hours_worked, late_arrivals, missing_checkouts, shifts_attended)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS department_monthly_stats (
+            department TEXT,
+            month TEXT NOT NULL,
+            employees INTEGER NOT NULL DEFAULT 0,
+            hours_worked REAL NOT NULL DEFAULT 0,
+            late_arrivals INTEGER NOT NULL DEFAULT 0,
+            missing_checkouts INTEGER NOT NULL DEFAULT 0,
+            shifts_scheduled INTEGER NOT NULL DEFAULT 0,
+            shifts_attended INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (department, month)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_dirty (
+            employee_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO stats_version (id, version) VALUES (1, 0)")
+    triggers = {
+        'attendance_stats_insert': "AFTER INSERT ON attendance BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (new.employee_id, date(new.check_in_time, 'unixepoch')); END",
+        'attendance_stats_delete': "AFTER DELETE ON attendance BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (old.employee_id, date(old.check_in_time, 'unixepoch')); END",
+        'attendance_stats_update': "AFTER UPDATE ON attendance BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (old.employee_id, date(old.check_in_time, 'unixepoch')); "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (new.employee_id, date(new.check_in_time, 'unixepoch')); END",
+        'shifts_stats_insert': "AFTER INSERT ON shifts BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (new.employee_id, date(new.shift_date * 86400, 'unixepoch')); END",
+        'shifts_stats_delete': "AFTER DELETE ON shifts BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (old.employee_id, date(old.shift_date * 86400, 'unixepoch')); END",
+        'shifts_stats_update': "AFTER UPDATE ON shifts BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (old.employee_id, date(old.shift_date * 86400, 'unixepoch')); "
+            "INSERT OR IGNORE INTO stats_dirty VALUES (new.employee_id, date(new.shift_date * 86400, 'unixepoch')); END",
+        # Перевод в другой отдел меняет месячные итоги обоих отделов
+        'employees_stats_department': "AFTER UPDATE OF department ON employees BEGIN "
+            "INSERT OR IGNORE INTO stats_dirty SELECT employee_id, day FROM employee_daily_stats "
+            "WHERE employee_id = new.id; END",
+    }
+    for name, body in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def mark_all_dirty(conn):
+    """Помечает для пересчёта все дни, по которым есть отметки или смены."""
+    conn.execute('''
+        INSERT OR IGNORE INTO stats_dirty (employee_id, day)
+        SELECT employee_id, date(check_in_time, 'unixepoch') FROM attendance WHERE check_in_time IS NOT NULL
+        UNION
+        SELECT employee_id, date(shift_date * 86400, 'unixepoch') FROM shifts WHERE shift_date IS NOT NULL
+    ''')
+
+
+def stats_version(conn=None):
+    """Номер версии сводных таблиц; растёт при каждом их изменении."""
+    conn = conn or get_connection()
+    return conn.execute("SELECT version FROM stats_version WHERE id = 1").fetchone()[0]
+
+
+def _bump_version(conn):
+    conn.execute("UPDATE stats_version SET version = version + 1 WHERE id = 1")
+
+
+def refresh_aggregates(conn=None):
+    """Пересчитывает сводные строки для помеченных дней; возвращает их число."""
+    conn = conn or get_connection()
+    if conn.execute("SELECT 1 FROM stats_dirty LIMIT 1").fetchone() is None:
+        return 0
+    start = time.perf_counter()
+    with transaction(conn, 'IMMEDIATE'):
+        conn.execute(f"DELETE FROM stats_dirty WHERE {_FROZEN_SQL.format(day='stats_dirty.day')}")
+        dirty = conn.execute("SELECT COUNT(*) FROM stats_dirty").fetchone()[0]
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS stats_dirty_months (department TEXT, month TEXT)")
+        conn.execute("DELETE FROM stats_dirty_months")
+        # Месяцы отделов до пересчёта (старый отдел при переводе сотрудника)...
+        conn.execute('''
+            INSERT INTO stats_dirty_months
+            SELECT DISTINCT s.department, substr(s.day, 1, 7)
+            FROM stats_dirty d JOIN employee_daily_stats s ON s.employee_id = d.employee_id AND s.day = d.day
+        ''')
+        conn.execute('''
+            DELETE FROM employee_daily_stats
+            WHERE (employee_id, day) IN (SELECT employee_id, day FROM stats_dirty)
+        ''')
+        conn.execute(_DAILY_SQL)
+        # ...и после него
+        conn.execute('''
+            INSERT INTO stats_dirty_months
+            SELECT DISTINCT s.department, substr(s.day, 1, 7)
+            FROM stats_dirty d JOIN employee_daily_stats s ON s.employee_id = d.employee_id AND s.day = d.day
+        ''')
+        conn.execute('''
+            DELETE FROM department_monthly_stats
+            WHERE EXISTS (SELECT 1 FROM stats_dirty_months k
+                          WHERE k.department IS department_monthly_stats.department
+                            AND k.month = department_monthly_stats.month)
+        ''')
+        conn.execute('''
+            DELETE FROM stats_dirty_months
+            WHERE rowid NOT IN (SELECT MIN(rowid) FROM stats_dirty_months GROUP BY department, month)
+        ''')
+        conn.execute(_MONTHLY_SQL)
+        conn.execute("DELETE FROM stats_dirty")
+        if dirty:
+            _bump_version(conn)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Сводные таблицы обновлены: {dirty} дней за {elapsed:.2f} с",
+                extra={'elapsed_ms': round(elapsed * 1000, 1), 'rows': dirty})
+    return dirty
+
+
+def rebuild_aggregates(conn=None):
+    """Полный пересчёт сводных таблиц (после загрузки истории или сбоя).
+
+    Дневные строки архивных периодов сохраняются, как и месячные строки
+    отделов, начинающиеся в архивном периоде.
+    """
+    conn = conn or get_connection()
+    with transaction(conn, 'IMMEDIATE'):
+        conn.execute(f"DELETE FROM employee_daily_stats WHERE NOT {_FROZEN_SQL.format(day='day')}")
+        frozen_month = _FROZEN_SQL.format(day="month || '-01'")
+        conn.execute(f"DELETE FROM department_monthly_stats WHERE NOT {frozen_month}")
+        _bump_version(conn)
+        mark_all_dirty(conn)
+        return refresh_aggregates(conn)
+
+
+def department_monthly(start_month, end_month, department=None, conn=None, refresh=True):
+    """Итоги отделов по месяцам ('гггг-мм') включительно."""
+    conn = conn or get_connection()
+    if refresh:
+        refresh_aggregates(conn)
+    sql = '''
+        SELECT department, month, employees, ROUND(hours_worked, 2), late_arrivals,
+               missing_checkouts, shifts_scheduled, shifts_attended
+        FROM department_monthly_stats
+        WHERE month BETWEEN ? AND ?
+    '''
+    params = [start_month, end_month]
+    if department is not None:
+        sql += " AND department = ?"
+        params.append(department)
+    sql += " ORDER BY month, department"
+    return conn.execute(sql, params).fetchall()
+
+
+def employee_daily(start_date, end_date, employee_id=None, department=None, conn=None, refresh=True):
+    """Итоги сотрудников по дням за период ('гггг-мм-дд') включительно."""
+    conn = conn or get_connection()
+    if refresh:
+        refresh_aggregates(conn)
+    sql = '''
+        SELECT s.employee_id, e.name, s.day, s.department, ROUND(s.hours_worked, 2), s.late_arrivals,
+               s.missing_checkouts, s.shifts_scheduled, s.shifts_attended
+        FROM employee_daily_stats s
+        LEFT JOIN employees e ON e.id = s.employee_id
+        WHERE s.day BETWEEN ? AND ?
+    '''
+    params = [start_date, end_date]
+    if employee_id is not None:
+        sql += " AND s.employee_id = ?"
+        params.append(employee_id)
+    if department is not None:
+        sql += " AND s.department = ?"
+        params.append(department)
+    sql += " ORDER BY s.day, s.employee_id"
+    return conn.execute(sql, params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводные таблицы посещаемости iRama")
+    parser.add_argument('command', choices=['refresh', 'rebuild'])
+    args = parser.parse_args()
+    setup_logging()
+    if args.command == 'refresh':
+        count = refresh_aggregates()
+    else:
+        count = rebuild_aggregates()
+    print(f"Пересчитано дней: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Табель, переработки и опоздания на pandas.
+
+Смены и отметки за период читаются двумя запросами в типизированные
+DataFrame; отметки сопоставляются со сменами слиянием по shift_id, а
+отметки без подходящей смены — через merge_asof по ближайшему началу смены
+того же сотрудника. Все расчёты векторные, без циклов по строкам; смены,
+переходящие через полночь (end_time <= start_time), заканчиваются на
+следующий день.
+
+Запуск: python analytics.py 2025-01-01 2025-12-31 -o tabel.xlsx [--department D]
+"""
+import argparse
+import logging
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+
+from archive import source_table
+from database import get_connection
+from log_config import setup_logging
+from timestamps import DAY_SECONDS, to_epoch_day
+
+logger = logging.getLogger('iRama.analytics')
+
+# Опоздание засчитывается, если приход позже начала смены больше чем на LATE_GRACE_MINUTES
+LATE_GRACE_MINUTES = 0
+# Максимальное расстояние от прихода до начала смены при сопоставлении без shift_id
+MATCH_TOLERANCE_HOURS = 6
+
+SUMMARY_COLUMNS = {
+    'employee_id': "ID",
+    'name': "Сотрудник",
+    'department': "Отдел",
+    'shifts_scheduled': "Смен по графику",
+    'shifts_attended': "Отработано смен",
+    'absences': "Пропуски",
+    'scheduled_hours': "Часы по графику",
+    'hours_worked': "Отработано часов",
+    'overtime_hours': "Переработка, ч",
+    'late_arrivals': "Опоздания",
+    'late_minutes': "Опоздания, мин",
+    'missing_checkouts': "Без отметки ухода",
+}
+
+
+def _epoch_to_datetime(values):
+    """Секунды эпохи из базы → datetime64; NULL и нераспознанные строки → NaT."""
+    return pd.to_datetime(pd.to_numeric(values, errors='coerce'), unit='s')
+
+
+def _time_of_day(values):
+    """'чч:мм' → timedelta64; некорректное время → NaT."""
+    return pd.to_timedelta(values.astype('string') + ':00', errors='coerce')
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def load_period(start_date, end_date, department=None, conn=None):
+    """Читает смены и отметки за период [start_date, end_date] включительно.
+
+    Возвращает (shifts, attendance). Обе таблицы читаются с запасом в один
+    день до начала периода, чтобы ночные смены и ранние приходы сопоставлялись
+    правильно; столбец in_period отмечает строки самого периода.
+    """
+    conn = conn or get_connection()
+    start = _as_date(start_date)
+    end = _as_date(end_date) + timedelta(days=1)
+    first_day, end_day = to_epoch_day(start) - 1, to_epoch_day(end)
+    department_sql = " AND e.department = ?" if department is not None else ""
+    extra = [department] if department is not None else []
+    # Архивные периоды (archive.py) читаются через представления UNION ALL
+    shifts_table = source_table(conn, 'shifts', first_day * DAY_SECONDS, end_day * DAY_SECONDS)
+    attendance_table = source_table(conn, 'attendance', first_day * DAY_SECONDS, end_day * DAY_SECONDS)
+
+    shifts = pd.read_sql_query(
+        f'''SELECT s.id AS shift_id, s.employee_id, e.name, e.department,
+                   s.shift_date, s.start_time, s.end_time
+            FROM {shifts_table} s JOIN employees e ON e.id = s.employee_id
+            WHERE s.shift_date >= ? AND s.shift_date < ?{department_sql}''',
+        conn, params=[first_day, end_day, *extra],
+    )
+    attendance = pd.read_sql_query(
+        f'''SELECT a.id AS attendance_id, a.employee_id, e.name, e.department,
+                   a.shift_id, a.check_in_time, a.check_out_time
+            FROM {attendance_table} a JOIN employees e ON e.id = a.employee_id
+            WHERE a.check_in_time >= ? AND a.check_in_time < ?{department_sql}''',
+        conn, params=[first_day * DAY_SECONDS, end_day * DAY_SECONDS, *extra],
+    )
+
+    shift_date = pd.to_datetime(pd.to_numeric(shifts['shift_date'], errors='coerce'), unit='D')
+    shifts['shift_start'] = shift_date + _time_of_day(shifts['start_time'])
+    shift_end = shift_date + _time_of_day(shifts['end_time'])
+    shifts['shift_end'] = shift_end.where(shift_end > shifts['shift_start'], shift_end + pd.Timedelta(days=1))
+    shifts['in_period'] = (shifts['shift_start'] >= pd.Timestamp(start)) & (shifts['shift_start'] < pd.Timestamp(end))
+    shifts = shifts.drop(columns=['shift_date', 'start_time', 'end_time']).astype({
+        'shift_id': 'int64', 'employee_id': 'int64', 'name': 'string', 'department': 'category',
+    })
+
+    attendance['check_in'] = _epoch_to_datetime(attendance.pop('check_in_time'))
+    attendance['check_out'] = _epoch_to_datetime(attendance.pop('check_out_time'))
+    attendance['in_period'] = attendance['check_in'] >= pd.Timestamp(start)
+    attendance = attendance.astype({
+        'attendance_id': 'int64', 'employee_id': 'int64', 'name': 'string', 'department': 'category',
+        'shift_id': 'Int64',
+    })
+    return shifts, attendance
+
+
+def match_attendance(shifts, attendance, tolerance_hours=MATCH_TOLERANCE_HOURS):
+    """Сопоставляет отметки со сменами; добавляет matched_shift_id, shift_start, shift_end и worked_hours."""
+    windows = shifts[['shift_id', 'employee_id', 'shift_start', 'shift_end']]
+    matched = attendance.merge(windows, on=['shift_id', 'employee_id'], how='left')
+    orphan = matched['shift_start'].isna() & matched['check_in'].notna()
+    if orphan.any():
+        # shift_id указывает на смену вне периода или другого сотрудника: берём ближайшую по началу
+        retry = pd.merge_asof(
+            matched.loc[orphan].drop(columns=['shift_id', 'shift_start', 'shift_end']).sort_values('check_in'),
+            windows.sort_values('shift_start'), left_on='check_in', right_on='shift_start',
+            by='employee_id', direction='nearest', tolerance=pd.Timedelta(hours=tolerance_hours),
+        )
+        matched = pd.concat([matched.loc[~orphan], retry], ignore_index=True)
+    matched = matched.rename(columns={'shift_id': 'matched_shift_id'})
+    matched['worked_hours'] = (matched['check_out'] - matched['check_in']).dt.total_seconds() / 3600
+    matched['missing_checkout'] = matched['check_out'].isna()
+    return matched
+
+
+def shift_report(shifts, attendance, grace_minutes=LATE_GRACE_MINUTES):
+    """Одна строка на смену периода: часы, опоздание, пропуск, переработка.
+
+    Возвращает (report, unscheduled): во втором — отметки, для которых смена не нашлась.
+    """
+    matched = match_attendance(shifts, attendance)
+    scheduled = matched['matched_shift_id'].notna()
+    per_shift = matched[scheduled].groupby('matched_shift_id').agg(
+        first_check_in=('check_in', 'min'),
+        hours_worked=('worked_hours', 'sum'),
+        missing_checkouts=('missing_checkout', 'sum'),
+    )
+    per_shift.index = per_shift.index.astype('int64')
+    report = shifts[shifts['in_period']].merge(per_shift, left_on='shift_id', right_index=True, how='left')
+    report['attended'] = report['first_check_in'].notna()
+    report['hours_worked'] = report['hours_worked'].fillna(0.0)
+    report['missing_checkouts'] = report['missing_checkouts'].fillna(0).astype('int64')
+    report['scheduled_hours'] = (report['shift_end'] - report['shift_start']).dt.total_seconds() / 3600
+    late = (report['first_check_in'] - report['shift_start']).dt.total_seconds() / 60
+    report['late'] = late > grace_minutes
+    report['late_minutes'] = late.where(report['late'], 0.0).fillna(0.0)
+    report['overtime_hours'] = (report['hours_worked'] - report['scheduled_hours']).clip(lower=0)
+    return report, matched[~scheduled & matched['in_period']]
+
+
+def employee_summary(start_date, end_date, department=None, grace_minutes=LATE_GRACE_MINUTES, conn=None):
+    """Итоги по сотрудникам за период: часы, переработка, опоздания, пропуски."""
+    shifts, attendance = load_period(start_date, end_date, department, conn)
+    report, unscheduled = shift_report(shifts, attendance, grace_minutes)
+    summary = report.groupby('employee_id').agg(
+        shifts_scheduled=('shift_id', 'size'),
+        shifts_attended=('attended', 'sum'),
+        scheduled_hours=('scheduled_hours', 'sum'),
+        hours_worked=('hours_worked', 'sum'),
+        overtime_hours=('overtime_hours', 'sum'),
+        late_arrivals=('late', 'sum'),
+        late_minutes=('late_minutes', 'sum'),
+        missing_checkouts=('missing_checkouts', 'sum'),
+    )
+    # Часы по отметкам вне графика целиком считаются переработкой
+    extra = unscheduled.groupby('employee_id').agg(
+        extra_hours=('worked_hours', 'sum'), extra_missing=('missing_checkout', 'sum'),
+    )
+    summary = summary.join(extra, how='outer').fillna(0)
+    summary['hours_worked'] += summary['extra_hours']
+    summary['overtime_hours'] += summary.pop('extra_hours')
+    summary['missing_checkouts'] += summary.pop('extra_missing')
+    summary['absences'] = summary['shifts_scheduled'] - summary['shifts_attended']
+
+    people = pd.concat([shifts[['employee_id', 'name', 'department']],
+                        attendance[['employee_id', 'name', 'department']]])
+    summary = summary.join(people.drop_duplicates('employee_id').set_index('employee_id')).reset_index()
+    int_columns = ['shifts_scheduled', 'shifts_attended', 'absences', 'late_arrivals', 'missing_checkouts']
+    summary[int_columns] = summary[int_columns].astype('int64')
+    summary = summary[list(SUMMARY_COLUMNS)].sort_values(['department', 'name', 'employee_id'])
+    return summary.round({'scheduled_hours': 2, 'hours_worked': 2, 'overtime_hours': 2, 'late_minutes': 0})
+
+
+def timesheet(start_date, end_date, department=None, conn=None):
+    """Табель: строки — сотрудники, столбцы — дни периода, значения — отработанные часы."""
+    shifts, attendance = load_period(start_date, end_date, department, conn)
+    matched = match_attendance(shifts, attendance)
+    # Часы относятся ко дню начала смены (для отметок вне графика — ко дню прихода)
+    matched['day'] = matched['shift_start'].fillna(matched['check_in']).dt.normalize()
+    days = pd.date_range(_as_date(start_date), _as_date(end_date), freq='D')
+    sheet = matched.pivot_table(index=['employee_id', 'name'], columns='day', values='worked_hours',
+                                aggfunc='sum', fill_value=0.0, observed=True)
+    sheet = sheet.reindex(columns=days, fill_value=0.0).round(2)
+    sheet.columns = [day.strftime('%d.%m') for day in sheet.columns]
+    sheet['Итого'] = sheet.sum(axis=1).round(2)
+    return sheet
+
+
+def export_report(output, start_date, end_date, department=None, conn=None):
+    """Сохраняет итоги (и табель для .xlsx) в файл; возвращает число сотрудников.
+
+    .xlsx — два листа «Итоги» и «Табель» (нужен openpyxl), иначе CSV с итогами.
+    """
+    summary = employee_summary(start_date, end_date, department, conn=conn).rename(columns=SUMMARY_COLUMNS)
+    if os.fspath(output).lower().endswith('.xlsx'):
+        sheet = timesheet(start_date, end_date, department, conn=conn)
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            summary.to_excel(writer, sheet_name="Итоги", index=False)
+            sheet.to_excel(writer, sheet_name="Табель")
+    else:
+        summary.to_csv(output, index=False, encoding='utf-8-sig')
+    logger.info(f"Табель за {start_date} – {end_date} сохранён: {output} ({len(summary)} сотрудников)")
+    return len(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Табель и переработки iRama")
+    parser.add_argument('start_date', help="гггг-мм-дд")
+    parser.add_argument('end_date', help="гггг-мм-дд (включительно)")
+    parser.add_argument('-o', '--output', default='tabel.xlsx', help=".xlsx или .csv")
+    parser.add_argument('--department')
+    args = parser.parse_args()
+    setup_logging()
+    count = export_report(args.output, args.start_date, args.end_date, args.department)
+    print(f"Сотрудников в табеле: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""Архив закрытых периодов посещаемости в отдельных файлах SQLite.
+
+Отметки (attendance) и смены (shifts) закрытого периода — целых месяцев,
+обычно года — переносятся из рабочей базы в файл archive/irama_<период>.db.
+Рабочая база, её индексы и резервные копии перестают расти с историей, а
+запись отметок касается только её. Перенесённые периоды регистрируются в
+таблице archive_periods рабочей базы.
+
+Для чтения архивы присоединяются (ATTACH, только чтение) по требованию:
+source_table() возвращает 'attendance' или 'shifts', если период запроса
+целиком в рабочей базе, иначе — временное представление attendance_all или
+shifts_all (UNION ALL рабочей таблицы и нужных архивов). Сводные таблицы
+(aggregates.py) по архивным дням заморожены и не пересчитываются.
+
+Перенос идёт в два шага: строки копируются во временный файл, который после
+проверки переименовывается, и только затем удаляются из рабочей базы в одной
+транзакции. Смены, на которые ссылаются отметки вне периода, остаются в
+рабочей базе, чтобы каскадное удаление не задело эти отметки. Если между
+шагами строки периода добавили, изменили или удалили, перенос отменяется.
+
+Запуск: python archive.py archive 2023 [2023-12] [--vacuum] | list
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from datetime import date
+from urllib.parse import quote
+
+from change_log import current_cursor
+from database import DB_PATH, get_connection, transaction
+from log_config import setup_logging
+from timestamps import DAY_SECONDS, from_epoch_day, to_epoch_day
+
+logger = logging.getLogger('iRama.archive')
+
+ARCHIVE_DIR = 'archive'
+ARCHIVE_PREFIX = 'irama_'
+# Имена схем присоединённых архивов и представлений поверх них
+SCHEMA_PREFIX = 'archive_'
+UNION_VIEWS = {'attendance': 'attendance_all', 'shifts': 'shifts_all'}
+# SQLite по умолчанию присоединяет не больше 10 баз к одному соединению
+MAX_ATTACHED = 10
+
+_COLUMNS = {
+    'attendance': 'id, employee_id, shift_id, check_in_time, check_out_time',
+    'shifts': 'id, employee_id, shift_date, start_time, end_time',
+}
+
+# Схема файла архива: те же столбцы и индексы, без внешних ключей (employees
+# остаются в рабочей базе)
+_ARCHIVE_SCHEMA = [
+    '''CREATE TABLE shifts (
+        id INTEGER PRIMARY KEY,
+        employee_id INTEGER,
+        shift_date INTEGER,
+        start_time TEXT,
+        end_time TEXT
+    )''',
+    '''CREATE TABLE attendance (
+        id INTEGER PRIMARY KEY,
+        employee_id INTEGER,
+        shift_id INTEGER,
+        check_in_time INTEGER,
+        check_out_time INTEGER
+    )''',
+    "CREATE INDEX idx_shifts_employee_date ON shifts (employee_id, shift_date)",
+    "CREATE INDEX idx_attendance_check_in ON attendance (check_in_time)",
+    "CREATE INDEX idx_attendance_employee_check_in ON attendance (employee_id, check_in_time)",
+]
+
+
+def create_archive_schema(conn):
+    """Создаёт реестр архивных периодов (вызывается из миграции)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_periods (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            first_day INTEGER NOT NULL,
+            end_day INTEGER NOT NULL,
+            attendance_rows INTEGER NOT NULL,
+            shifts_rows INTEGER NOT NULL,
+            archived_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    ''')
+
+
+def _parse_month(value):
+    """'гггг' или 'гггг-мм' → (первый месяц, последний месяц) как date."""
+    if len(value) == 4:
+        year = int(value)
+        return date(year, 1, 1), date(year, 12, 1)
+    first = date.fromisoformat(f"{value}-01")
+    return first, first
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _period_name(first, last):
+    if first.month == 1 and last.month == 12 and first.year == last.year:
+        return str(first.year)
+    if first == last:
+        return first.strftime('%Y-%m')
+    return f"{first:%Y-%m}_{last:%Y-%m}"
+
+
+def _database_dir(conn):
+    """Каталог файла рабочей базы: пути архивов в реестре относительны ему."""
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == 'main':
+            return os.path.dirname(path)
+    return ''
+
+
+def _archive_path(conn, path):
+    return os.path.join(_database_dir(conn), path)
+
+
+def _attach(conn, path, schema, readonly=True):
+    uri = f"file:{quote(os.path.abspath(path))}" + ('?mode=ro' if readonly else '')
+    conn.execute("ATTACH DATABASE ? AS " + schema, (uri,))
+
+
+def _attached(conn):
+    return {name for _, name, _ in conn.execute("PRAGMA database_list") if name.startswith(SCHEMA_PREFIX)}
+
+
+def list_archives(conn=None):
+    """Зарегистрированные архивы: (имя, путь, первый день, последний день, отметок, смен)."""
+    conn = conn or get_connection()
+    return conn.execute('''
+        SELECT name, path, first_day, end_day - 1, attendance_rows, shifts_rows
+        FROM archive_periods ORDER BY first_day
+    ''').fetchall()
+
+
+def source_table(conn, table, start=None, end=None):
+    """Таблица или представление для чтения table за [start, end) в секундах.
+
+    Если с периодом пересекается хотя бы один архив, нужные архивы
+    присоединяются, лишние отсоединяются, и возвращается представление
+    UNION ALL. Вызывается вне транзакции: ATTACH в ней запрещён.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("end_day * ? > ?")
+        params += [DAY_SECONDS, start]
+    if end is not None:
+        conditions.append("first_day * ? < ?")
+        params += [DAY_SECONDS, end]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(f"SELECT name, path FROM archive_periods {where} ORDER BY first_day", params).fetchall()
+    if not rows:
+        return table
+    if len(rows) >= MAX_ATTACHED:
+        raise sqlite3.OperationalError(f"период затрагивает {len(rows)} архивов, можно не больше {MAX_ATTACHED - 1}")
+
+    wanted = {SCHEMA_PREFIX + name.replace('-', '_'): path for name, path in rows}
+    attached = _attached(conn)
+    if attached != set(wanted):
+        for schema in attached - set(wanted):
+            conn.execute(f"DETACH DATABASE {schema}")
+        for schema, path in wanted.items():
+            if schema not in attached:
+                _attach(conn, _archive_path(conn, path), schema)
+        for base, view in UNION_VIEWS.items():
+            selects = [f"SELECT {_COLUMNS[base]} FROM main.{base}"]
+            selects += [f"SELECT {_COLUMNS[base]} FROM {schema}.{base}" for schema in sorted(wanted)]
+            conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+            conn.execute(f"CREATE TEMP VIEW {view} AS {' UNION ALL '.join(selects)}")
+        logger.debug(f"Присоединены архивы: {', '.join(sorted(wanted))}")
+    return UNION_VIEWS[table]
+
+
+def _copy_rows(conn, path, first_day, end_day):
+    """Шаг 1: копирует строки периода в новый файл архива; возвращает (отметок, смен)."""
+    start, end = first_day * DAY_SECONDS, end_day * DAY_SECONDS
+    _attach(conn, path, 'archive_new', readonly=False)
+    try:
+        conn.execute("PRAGMA archive_new.journal_mode = DELETE")
+        with transaction(conn, 'IMMEDIATE'):
+            for statement in _ARCHIVE_SCHEMA:
+                conn.execute(statement.replace('CREATE TABLE ', 'CREATE TABLE archive_new.', 1)
+                             .replace('CREATE INDEX ', 'CREATE INDEX archive_new.', 1))
+            conn.execute(f'''
+                INSERT INTO archive_new.attendance ({_COLUMNS['attendance']})
+                SELECT {_COLUMNS['attendance']} FROM attendance
+                WHERE check_in_time >= ? AND check_in_time < ? ORDER BY id
+            ''', (start, end))
+            # Смену, на которую ссылается отметка вне периода, оставляем в рабочей базе
+            conn.execute(f'''
+                INSERT INTO archive_new.shifts ({_COLUMNS['shifts']})
+                SELECT {_COLUMNS['shifts']} FROM shifts s
+                WHERE shift_date >= ? AND shift_date < ?
+                  AND NOT EXISTS (SELECT 1 FROM attendance a WHERE a.shift_id = s.id
+                                  AND (a.check_in_time < ? OR a.check_in_time >= ?))
+                ORDER BY id
+            ''', (first_day, end_day, start, end))
+            counts = tuple(conn.execute(f"SELECT COUNT(*) FROM archive_new.{table}").fetchone()[0]
+                           for table in ('attendance', 'shifts'))
+        conn.execute("ANALYZE archive_new")
+    finally:
+        conn.execute("DETACH DATABASE archive_new")
+    return counts
+
+
+def _remove_rows(conn, path, name, relative_path, first_day, end_day, counts):
+    """Шаг 2: удаляет перенесённые строки из рабочей базы и регистрирует архив."""
+    start, end = first_day * DAY_SECONDS, end_day * DAY_SECONDS
+    _attach(conn, path, 'archive_check')
+    try:
+        with transaction(conn, 'IMMEDIATE'):
+            # Пока шёл шаг 1, могли добавить отметки в закрытый период или на
+            # перенесённую смену. Проверка — до удаления: удаление смены каскадом
+            # удалило бы и такие отметки, не попавшие в архив
+            added = conn.execute('''
+                SELECT (SELECT COUNT(*) FROM attendance
+                        WHERE check_in_time >= ? AND check_in_time < ?
+                          AND id NOT IN (SELECT id FROM archive_check.attendance)),
+                       (SELECT COUNT(*) FROM attendance
+                        WHERE shift_id IN (SELECT id FROM archive_check.shifts)
+                          AND id NOT IN (SELECT id FROM archive_check.attendance))
+            ''', (start, end)).fetchone()
+            if any(added):
+                raise sqlite3.IntegrityError(f"после копирования добавлено отметок: за период {added[0]}, "
+                                             f"на перенесённые смены {added[1]}; повторите архивацию")
+            # Строки, изменённые (например, поздний уход) или удалённые после
+            # копирования, архив сохранил бы в старом виде
+            changed = [conn.execute(f'''
+                SELECT COUNT(*) FROM (
+                    SELECT {_COLUMNS[table]} FROM archive_check.{table}
+                    EXCEPT
+                    SELECT {_COLUMNS[table]} FROM {table} WHERE id IN (SELECT id FROM archive_check.{table}))
+            ''').fetchone()[0] for table in ('attendance', 'shifts')]
+            if any(changed):
+                raise sqlite3.IntegrityError(f"после копирования изменено или удалено: отметок {changed[0]}, "
+                                             f"смен {changed[1]}; повторите архивацию")
+            logged = current_cursor(conn)
+            conn.execute("DELETE FROM attendance WHERE id IN (SELECT id FROM archive_check.attendance)")
+            conn.execute("DELETE FROM shifts WHERE id IN (SELECT id FROM archive_check.shifts)")
+            # Перенос в архив — не удаление: потребители журнала изменений его не видят.
+            # После logged пишет только эта транзакция (блокировка IMMEDIATE)
+            conn.execute("DELETE FROM change_log WHERE seq > ?", (logged,))
+            conn.execute('''
+                INSERT INTO archive_periods (name, path, first_day, end_day, attendance_rows, shifts_rows)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (name, relative_path, first_day, end_day, *counts))
+            # Сводки по архивным дням остаются как есть (см. aggregates.refresh_aggregates)
+            conn.execute('''
+                DELETE FROM stats_dirty
+                WHERE day >= date(? * 86400, 'unixepoch') AND day < date(? * 86400, 'unixepoch')
+            ''', (first_day, end_day))
+    finally:
+        conn.execute("DETACH DATABASE archive_check")
+
+
+def archive_period(first_month, last_month=None, archive_dir=ARCHIVE_DIR, vacuum=False, conn=None):
+    """Переносит месяцы с first_month по last_month ('гггг' или 'гггг-мм') в архив.
+
+    Период должен быть закрыт (закончиться до начала текущего месяца) и не
+    пересекаться с уже архивированными. Возвращает сводку {'name', 'path',
+    'attendance_rows', 'shifts_rows', 'elapsed'} или None при ошибке.
+    """
+    from aggregates import refresh_aggregates  # aggregates читает реестр архивов
+    tmp_path = None
+    try:
+        conn = conn or get_connection()
+        start_time = time.perf_counter()
+        first, last = _parse_month(first_month)
+        if last_month is not None:
+            last = _parse_month(last_month)[1]
+        if last < first:
+            raise ValueError("конец периода раньше начала")
+        end = _next_month(last)
+        if end > date.today().replace(day=1):
+            raise ValueError(f"период до {end:%Y-%m} ещё не закрыт")
+        first_day, end_day = to_epoch_day(first), to_epoch_day(end)
+        overlap = conn.execute("SELECT name FROM archive_periods WHERE first_day < ? AND end_day > ?",
+                               (end_day, first_day)).fetchone()
+        if overlap:
+            raise ValueError(f"период пересекается с архивом {overlap[0]}")
+        if conn.in_transaction:
+            raise sqlite3.OperationalError("архивация не может выполняться внутри транзакции")
+
+        # Сводки закрытого периода замораживаются: сначала пересчитываем их
+        refresh_aggregates(conn)
+        name = _period_name(first, last)
+        relative_path = os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{name}.db")
+        path = _archive_path(conn, relative_path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.part'
+        for stale in (tmp_path, tmp_path + '-journal'):
+            if os.path.exists(stale):
+                os.remove(stale)
+        if os.path.exists(path):
+            # Файл прошлой прерванной попытки: в реестре его нет
+            os.chmod(path, 0o644)
+            os.remove(path)
+
+        counts = _copy_rows(conn, tmp_path, first_day, end_day)
+        check = sqlite3.connect(f"file:{quote(os.path.abspath(tmp_path))}?mode=ro", uri=True)
+        try:
+            result = check.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            check.close()
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"архив повреждён: {result}")
+        os.replace(tmp_path, path)
+        tmp_path = None
+        os.chmod(path, 0o444)
+        try:
+            _remove_rows(conn, path, name, relative_path, first_day, end_day, counts)
+        except Exception:
+            os.chmod(path, 0o644)
+            os.remove(path)
+            raise
+        if vacuum:
+            conn.execute("VACUUM")
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Период {name} перенесён в {relative_path}: отметок {counts[0]}, смен {counts[1]}",
+                    extra={'elapsed_ms': round(elapsed * 1000, 1), 'rows': counts[0] + counts[1]})
+        return {'name': name, 'path': relative_path, 'attendance_rows': counts[0],
+                'shifts_rows': counts[1], 'elapsed': elapsed}
+    except Exception as e:
+        logger.error(f"Ошибка архивации периода {first_month}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архив закрытых периодов iRama")
+    parser.add_argument('--db', default=DB_PATH, help="путь к базе (по умолчанию irama.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    archive = commands.add_parser('archive', help="перенести период в архив")
+    archive.add_argument('first', help="год (2023) или месяц (2023-01)")
+    archive.add_argument('last', nargs='?', help="последний месяц периода включительно")
+    archive.add_argument('--vacuum', action='store_true', help="сжать рабочую базу после переноса")
+    commands.add_parser('list', help="показать архивы")
+    args = parser.parse_args()
+    setup_logging()
+
+    conn = get_connection(args.db)
+    if args.command == 'archive':
+        summary = archive_period(args.first, args.last, vacuum=args.vacuum, conn=conn)
+        if summary is None:
+            raise SystemExit(1)
+        print(f"{summary['path']}: отметок {summary['attendance_rows']}, смен {summary['shifts_rows']}, "
+              f"{summary['elapsed']:.1f} с")
+    else:
+        for name, path, first_day, last_day, attendance_rows, shifts_rows in list_archives(conn):
+            print(f"{name:<16} {from_epoch_day(first_day)} – {from_epoch_day(last_day)}  "
+                  f"отметок {attendance_rows:>9}  смен {shifts_rows:>9}  {path}")
+
+
+if __name__ == '__main__':
+    main()
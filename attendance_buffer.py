@@ -0,0 +1,527 @@
+"""Буфер групповой записи отметок посещаемости.
+
+При пересменке сотни отметок приходят за минуту, и отдельная транзакция на
+каждую (BEGIN IMMEDIATE, запись кадров WAL, COMMIT) упирается в блокировку
+записи. AttendanceBuffer копит отметки в памяти и записывает их одной
+транзакцией, когда набралось max_batch штук или со времени первой прошло
+max_delay_ms. submit возвращает concurrent.futures.Future, которое
+получает id отметки после COMMIT (или исключение для отвергнутой строки).
+Если вызывающий ждёт результата сразу (flush_soon), пачка пишется без
+ожидания срока; под нагрузкой отметки всё равно собираются в пачки, пока
+идёт предыдущая запись.
+
+Каждая принятая отметка сначала дописывается в журнал рядом с базой
+(строка JSON с порядковым номером). У каждого буфера свой файл журнала
+(irama.db-attendance-<id>-<n>.journal), и буфер держит на нём исключительную
+блокировку, пока работает. В той же транзакции, что и пачка, в
+attendance_journal_state запоминается номер последней записанной отметки.
+recover() дописывает из журналов ровно те отметки, которые не успели
+попасть в базу, и берёт только журналы, блокировку которых удалось
+получить, — то есть брошенные упавшими процессами; журналы работающих
+буферов (в том числе в других процессах) не трогаются.
+
+Запуск: python attendance_buffer.py recover [--db irama.db] [--journal путь]
+"""
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import database
+from database import close_connection, get_connection, transaction
+from log_config import setup_logging
+from timestamps import to_epoch
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger('iRama.attendance_buffer')
+
+JOURNAL_PREFIX = '-attendance'
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_DELAY_MS = 5
+# Журнал начинается заново после записанной пачки, когда в файл дописано больше этого
+JOURNAL_ROTATE_BYTES = 1024 * 1024
+# Пауза перед повтором записи пачки после ошибки базы (например, диск занят)
+RETRY_DELAY = 0.5
+# После стольких неудачных попыток записи Future отметки получает исключение
+MAX_ATTEMPTS = 5
+
+_INSERT = "INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)"
+# Приход не записывается, если на ту же смену уже есть открытый
+_INSERT_UNIQUE_OPEN = '''
+    INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time)
+    SELECT ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM attendance
+                      WHERE employee_id = ? AND shift_id = ? AND check_out_time IS NULL)
+'''
+
+
+def _storage_values(employee_id, shift_id, check_in_time, check_out_time):
+    """Значения строки attendance; отметки 'гггг-мм-дд чч:мм' переводятся в секунды."""
+    return employee_id, shift_id, to_epoch(check_in_time), to_epoch(check_out_time)
+
+
+class DuplicateCheckIn(ValueError):
+    """На смену уже есть открытый приход (submit с unique_open=True)."""
+
+
+def create_journal_schema(conn):
+    """Таблица номеров последних записанных отметок журналов (вызывается из migrations)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_journal_state (
+            journal_id TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+class _Event:
+    __slots__ = ('seq', 'values', 'unique_open', 'future', 'attempts')
+
+    def __init__(self, seq, values, unique_open, future=None):
+        self.seq = seq
+        self.values = values
+        self.unique_open = unique_open
+        self.future = future
+        self.attempts = 0
+
+
+def _write_batch(conn, journal_id, events):
+    """Записывает пачку одной транзакцией; возвращает [(событие, id или исключение)].
+
+    journal_id=None — отметки не из журнала, номер не запоминается.
+    """
+    results = []
+    with transaction(conn, mode='IMMEDIATE'):
+        for event in events:
+            try:
+                if event.unique_open:
+                    employee_id, shift_id = event.values[:2]
+                    cursor = conn.execute(_INSERT_UNIQUE_OPEN, (*event.values, employee_id, shift_id))
+                    if cursor.rowcount == 0:
+                        raise DuplicateCheckIn(f"приход на смену {shift_id} уже отмечен")
+                else:
+                    cursor = conn.execute(_INSERT, event.values)
+                results.append((event, cursor.lastrowid))
+            except (sqlite3.IntegrityError, DuplicateCheckIn) as e:
+                # Ошибка одной строки откатывает только её оператор, остальная пачка пишется
+                results.append((event, e))
+        if journal_id is not None:
+            conn.execute("INSERT OR REPLACE INTO attendance_journal_state (journal_id, last_seq) VALUES (?, ?)",
+                         (journal_id, events[-1].seq))
+    return results
+
+
+def _journal_line(event):
+    return json.dumps({'seq': event.seq, 'event': event.values, 'unique_open': event.unique_open},
+                      ensure_ascii=False) + '\n'
+
+
+def _read_journal(file):
+    """(journal_id, [(seq, значения, unique_open)], номера отброшенных) из открытого журнала.
+
+    Оборванная последняя строка пропускается.
+    """
+    journal_id = None
+    entries = []
+    dropped = set()
+    file.seek(0)
+    for line in file:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Процесс упал посреди записи строки: отметка не была принята
+            break
+        if 'journal' in record:
+            journal_id = record['journal']
+        elif 'dropped' in record:
+            dropped.update(record['dropped'])
+        else:
+            entries.append((record['seq'], tuple(record['event']), record.get('unique_open', False)))
+    return journal_id, entries, dropped
+
+
+def _lock(file, wait):
+    """Исключительная блокировка открытого файла; без wait — False, если файл занят."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if wait:
+            raise
+        return False
+    return True
+
+
+def _same_file(file, path):
+    """Открытый файл всё ещё лежит по пути path (его не удалили и не заменили)."""
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _remove_journal(file, path):
+    """Удаляет файл журнала; в POSIX — не отпуская блокировку до удаления."""
+    if fcntl is None:
+        file.close()  # Windows не удаляет открытые файлы
+    os.remove(path)
+    file.close()
+
+
+def journal_paths(db_path=None):
+    """Файлы журналов буферов базы (у каждого буфера свой)."""
+    return sorted(glob.glob(glob.escape(db_path or database.DB_PATH) + '-*.journal'))
+
+
+def _open_abandoned(path):
+    """Открывает и блокирует файл брошенного журнала; None — журнал занят или уже удалён."""
+    try:
+        file = open(path, 'r+', encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    # Журнал работающего буфера заблокирован; журнал, удалённый или
+    # восстановленный другим процессом, пока мы его открывали, не совпадёт с путём
+    if _lock(file, wait=False) and _same_file(file, path):
+        return file
+    file.close()
+    return None
+
+
+def _recover_journals(paths, conn):
+    """Дописывает отметки брошенных журналов и удаляет их; возвращает число отметок.
+
+    Файлы одного буфера (если он упал посреди поворота журнала, их два)
+    разбираются вместе: номера отметок у них общие, и отметка, попавшая в
+    оба файла, дописывается один раз.
+    """
+    buffers = {}
+    try:
+        for path in paths:
+            file = _open_abandoned(path)
+            if file is None:
+                continue
+            journal_id, entries, dropped = _read_journal(file)
+            if journal_id is None:
+                # Буфер только что создал файл и ещё не записал заголовок
+                file.close()
+                continue
+            files, events, all_dropped = buffers.setdefault(journal_id, ([], {}, set()))
+            files.append((file, path))
+            events.update((seq, (values, unique_open)) for seq, values, unique_open in entries)
+            all_dropped |= dropped
+        total = 0
+        for journal_id, (files, events, dropped) in buffers.items():
+            row = conn.execute("SELECT last_seq FROM attendance_journal_state WHERE journal_id = ?",
+                               (journal_id,)).fetchone()
+            last_seq = row[0] if row is not None else 0
+            # Отметки, о неудаче которых вызывающий уже узнал, не дописываются.
+            # Журнал, записанный до перехода на целые отметки, содержит строки
+            pending = [_Event(seq, _storage_values(*values), unique_open)
+                       for seq, (values, unique_open) in sorted(events.items())
+                       if seq > last_seq and seq not in dropped]
+            if pending:
+                results = _write_batch(conn, journal_id, pending)
+                rejected = sum(isinstance(result, Exception) for _, result in results)
+                logger.warning(f"Из журнала {files[0][1]} восстановлено отметок: {len(pending) - rejected}, "
+                               f"отвергнуто: {rejected}")
+            total += len(pending)
+            # Строка состояния удаляется после файлов: иначе журнал могли бы дописать ещё раз
+            for file, path in files:
+                _remove_journal(file, path)
+            conn.execute("DELETE FROM attendance_journal_state WHERE journal_id = ?", (journal_id,))
+        return total
+    finally:
+        for files, _, _ in buffers.values():
+            for file, _ in files:
+                file.close()
+
+
+def recover(journal_path=None, conn=None):
+    """Дописывает в базу отметки брошенных журналов, не попавшие в неё; возвращает их число.
+
+    Без journal_path просматриваются все журналы базы database.DB_PATH.
+    """
+    conn = conn or get_connection()
+    return _recover_journals([journal_path] if journal_path else journal_paths(), conn)
+
+
+class AttendanceBuffer:
+    """Буфер отметок с групповой записью и журналом для восстановления."""
+
+    def __init__(self, db_path=None, max_batch=DEFAULT_MAX_BATCH, max_delay_ms=DEFAULT_MAX_DELAY_MS,
+                 fsync=False):
+        self.db_path = db_path or database.DB_PATH
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        # fsync журнала на каждую отметку переживает отключение питания, но
+        # стоит столько же, сколько транзакция; по умолчанию журнал, как и WAL
+        # с synchronous=NORMAL, переживает падение процесса
+        self.fsync = fsync
+        self.batches = 0
+        self.written = 0
+        self._events = []
+        self._first_at = None
+        self._urgent = False
+        # Пачки пишет один поток за раз: номера в журнале подтверждаются по порядку
+        self._flushing = False
+        self._seq = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        conn = get_connection(self.db_path)
+        _recover_journals(journal_paths(self.db_path), conn)
+        # Номер журнала один на всё время работы буфера, при повороте растёт только номер файла
+        self.journal_id = uuid.uuid4().hex
+        self._generation = 0
+        self._journal = None
+        self._start_journal()
+        self._thread = threading.Thread(target=self._run, name='irama-attendance-buffer', daemon=True)
+        self._thread.start()
+
+    def _start_journal(self):
+        """Начинает новый файл журнала; прежний удаляется.
+
+        Отметки очереди, ещё не записанные в базу, переносятся в новый файл с
+        прежними номерами: всё, что осталось только в старом, уже в базе.
+        Если процесс упадёт до удаления старого файла, recover() разберёт
+        оба вместе. Вызывается под self._condition (или до запуска потока записи).
+        """
+        old = (self._journal, self.journal_path) if self._journal is not None else None
+        self._generation += 1
+        self.journal_path = f"{self.db_path}{JOURNAL_PREFIX}-{self.journal_id}-{self._generation}.journal"
+        journal = open(self.journal_path, 'x', encoding='utf-8')
+        # Блокировка держится, пока буфер работает: recover() в других процессах журнал не тронет
+        _lock(journal, wait=True)
+        journal.write(json.dumps({'journal': self.journal_id}) + '\n')
+        for event in self._events:
+            journal.write(_journal_line(event))
+        journal.flush()
+        if self.fsync:
+            os.fsync(journal.fileno())
+        self._journal = journal
+        # Порог отсчитывается после перенесённой очереди: иначе большая очередь
+        # поворачивала бы журнал после каждой пачки
+        self._rotate_at = journal.tell() + JOURNAL_ROTATE_BYTES
+        if old is not None:
+            _remove_journal(*old)
+
+    def submit(self, employee_id, shift_id, check_in_time, check_out_time=None, unique_open=False,
+               flush_soon=False):
+        """Принимает отметку; возвращает Future с id записи после COMMIT.
+
+        unique_open — не записывать приход, если на смену уже есть открытый
+        (Future получит DuplicateCheckIn). flush_soon — вызывающий сразу ждёт
+        результата: если пачка сейчас не пишется, он записывает её сам, не
+        дожидаясь max_delay_ms, а пришедшие за это время отметки составят
+        следующую пачку.
+
+        Отметки времени — 'гггг-мм-дд чч:мм', datetime или секунды эпохи.
+
+        Если поток вызывающего уже внутри транзакции, отметка пишется сразу в
+        ней: запись пачки ждала бы блокировку, которую держит эта транзакция.
+        """
+        future = Future()
+        values = _storage_values(employee_id, shift_id, check_in_time, check_out_time)
+        conn = get_connection(self.db_path)
+        if conn.in_transaction:
+            try:
+                (_, result), = _write_batch(conn, None, [_Event(0, values, unique_open)])
+            except sqlite3.Error as e:
+                result = e
+            _resolve(future, result)
+            return future
+        batch = None
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("AttendanceBuffer закрыт")
+            self._seq += 1
+            event = _Event(self._seq, values, unique_open, future)
+            # Отметка принята, только когда она в журнале
+            self._journal.write(_journal_line(event))
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            if not self._events:
+                self._first_at = time.monotonic()
+            self._events.append(event)
+            if flush_soon and not self._flushing:
+                batch = self._take()
+            elif flush_soon:
+                self._urgent = True
+            elif len(self._events) == 1 or len(self._events) >= self.max_batch:
+                self._condition.notify_all()
+        if batch is not None:
+            self._commit(conn, batch)
+        return future
+
+    def _take(self):
+        """Забирает пачку и право записи; вызывается под self._condition."""
+        batch = self._events[:self.max_batch]
+        del self._events[:self.max_batch]
+        self._first_at = time.monotonic() if self._events else None
+        self._urgent = self._urgent and bool(self._events)
+        self._flushing = True
+        return batch
+
+    def _commit(self, conn, batch):
+        """Пишет пачку и отдаёт право записи; возвращает, удалась ли запись."""
+        try:
+            results = _write_batch(conn, self.journal_id, batch)
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось записать пачку отметок ({len(batch)}): {e}")
+            with self._condition:
+                for event in batch:
+                    event.attempts += 1
+                if self._closed:
+                    # После close() повторять некому: пачка отбрасывается сразу
+                    failed, retry = batch, []
+                else:
+                    failed = [event for event in batch if event.attempts >= MAX_ATTEMPTS]
+                    retry = [event for event in batch if event.attempts < MAX_ATTEMPTS]
+                if failed:
+                    # Вызывающий узнает о неудаче, поэтому recover() эти отметки не допишет
+                    self._journal.write(json.dumps({'dropped': [event.seq for event in failed]}) + '\n')
+                    self._journal.flush()
+                    logger.error(f"Отметки отброшены после попыток записи: {len(failed)}")
+                if retry:
+                    # Остаток пачки возвращается в начало очереди, его повторит поток записи
+                    self._events[:0] = retry
+                    self._first_at = time.monotonic()
+                    self._urgent = True
+                self._flushing = False
+                self._condition.notify_all()
+            for event in failed:
+                event.future.set_exception(e)
+            return False
+        self.batches += 1
+        self.written += len(batch)
+        for event, result in results:
+            _resolve(event.future, result)
+        with self._condition:
+            # Под постоянной нагрузкой очередь не пустеет, поэтому поворот не ждёт пустой очереди
+            if self._journal.tell() >= self._rotate_at:
+                self._start_journal()
+            self._flushing = False
+            self._condition.notify_all()
+        return True
+
+    def _run(self):
+        conn = get_connection(self.db_path)
+        try:
+            while True:
+                with self._condition:
+                    while True:
+                        if self._events and not self._flushing:
+                            remaining = self._first_at + self.max_delay - time.monotonic()
+                            if (self._closed or self._urgent or len(self._events) >= self.max_batch
+                                    or remaining <= 0):
+                                batch = self._take()
+                                break
+                            self._condition.wait(remaining)
+                        elif self._closed and not self._events and not self._flushing:
+                            return
+                        else:
+                            self._condition.wait()
+                if not self._commit(conn, batch):
+                    time.sleep(RETRY_DELAY)
+        finally:
+            close_connection(self.db_path)
+
+    def flush(self):
+        """Записывает всё принятое к этому моменту и ждёт COMMIT."""
+        with self._condition:
+            if not self._events:
+                return
+            last = self._events[-1].future
+            self._urgent = True
+            self._condition.notify_all()
+        try:
+            last.result()
+        except (sqlite3.Error, DuplicateCheckIn):
+            pass
+
+    def close(self):
+        """Дописывает буфер в базу и останавливает поток записи."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            # Всё принятое записано или отброшено с ошибкой у вызывающего: журнал больше не нужен
+            try:
+                conn = get_connection(self.db_path)
+                _remove_journal(self._journal, self.journal_path)
+                conn.execute("DELETE FROM attendance_journal_state WHERE journal_id = ?", (self.journal_id,))
+            except (sqlite3.Error, OSError) as e:
+                # База недоступна: журнал остаётся, его разберёт recover()
+                logger.error(f"Не удалось удалить журнал {self.journal_path}: {e}")
+                self._journal.close()
+        logger.info(f"Буфер отметок закрыт: записано {self.written} в {self.batches} транзакциях")
+
+
+def _resolve(future, result):
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_buffer():
+    """Общий буфер процесса для базы database.DB_PATH (закрывается при выходе)."""
+    global _shared
+    with _shared_lock:
+        if _shared is not None and _shared.db_path != database.DB_PATH:
+            _shared.close()
+            _shared = None
+        if _shared is None:
+            _shared = AttendanceBuffer()
+        return _shared
+
+
+def close_buffer():
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+            _shared = None
+
+
+atexit.register(close_buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Журнал буфера отметок iRama")
+    parser.add_argument('command', choices=['recover'])
+    parser.add_argument('--db', help="путь к базе (по умолчанию irama.db)")
+    parser.add_argument('--journal', help="путь к журналу (по умолчанию все брошенные журналы базы)")
+    args = parser.parse_args()
+    setup_logging()
+    if args.db:
+        database.DB_PATH = args.db
+    count = recover(args.journal)
+    print(f"Дописано из журнала: {count}")
+
+
+if __name__ == '__main__':
+    main()
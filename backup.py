@@ -1,35 +1,248 @@
-
 import sqlite3
-import shutil
+import gzip
 import os
-from datetime import datetime
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
 import logging
 
-logger = logging.getLogger('iRama')
+import database
+from database import create_connection
+
+try:
+    import zstandard
+except ImportError:  # сжатие zstd необязательно
+    zstandard = None
+
+logger = logging.getLogger('iRama.backup')
+
+BACKUP_DIR = 'backups'
+BACKUP_PREFIX = 'irama_backup_'
+# Копирование порциями: между шагами писатели успевают зафиксировать отметки
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.005
+# Сколько раз допускается перезапуск из-за записи в исходную базу,
+# после чего копия снимается одним шагом (в WAL это не блокирует писателей)
+MAX_RESTARTS = 3
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def copy_database(src, dst):
+    """Копирует src в dst через SQLite backup API порциями."""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            # Исходная база изменилась другим соединением — копирование началось заново
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+
+    try:
+        src.backup(dst, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_SLEEP)
+    except _BackupRestarted:
+        logger.info("Backup restarted by concurrent writes, finishing in a single step")
+        src.backup(dst, pages=-1)
+
+
+def _codec_for(path):
+    for codec, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return codec
+    return None
+
+
+def _open_compressed(path, mode, codec=None):
+    codec = codec or _codec_for(path)
+    if codec == 'gzip':
+        return gzip.open(path, mode)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        if 'r' in mode:
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, mode)
+
+
+def _decompressed_copy(backup_file, directory=None):
+    """Возвращает путь к несжатой копии резервной копии (временный файл)."""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    os.close(fd)
+    with _open_compressed(backup_file, 'rb') as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return tmp_path
+
+
+def _check_database(path):
+    """Проверяет целостность файла базы; возвращает (ok, сообщение)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            return False, result
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = {'employees', 'shifts', 'attendance'} - tables
+        if missing:
+            return False, f"missing tables: {', '.join(sorted(missing))}"
+        return True, 'ok'
+    except sqlite3.DatabaseError as e:
+        return False, str(e)
+    finally:
+        conn.close()
+
 
-def create_backup():
+def verify_backup(backup_file):
+    """Проверяет резервную копию (в том числе сжатую) через PRAGMA integrity_check."""
+    if not os.path.exists(backup_file):
+        return False
+    tmp_path = None
+    try:
+        path = backup_file
+        if _codec_for(backup_file) is not None:
+            tmp_path = path = _decompressed_copy(backup_file)
+        ok, message = _check_database(path)
+        if not ok:
+            logger.error(f"Backup verification failed for {backup_file}: {message}")
+        return ok
+    except Exception as e:
+        logger.error(f"Backup verification failed for {backup_file}: {str(e)}")
+        return False
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Возвращает пути резервных копий, от новых к старым."""
+    if not os.path.isdir(backup_dir):
+        return []
+    paths = [os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+             if name.startswith(BACKUP_PREFIX) and not name.endswith('.part')]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def prune_backups(backup_dir=BACKUP_DIR, keep_last=None, max_age_days=None):
+    """Удаляет старые копии: сверх keep_last и старше max_age_days.
+
+    Самая новая копия не удаляется никогда. Возвращает список удалённых путей.
+    """
+    backups = list_backups(backup_dir)
+    cutoff = time.time() - timedelta(days=max_age_days).total_seconds() if max_age_days is not None else None
+    removed = []
+    for index, path in enumerate(backups):
+        if index == 0:
+            continue
+        too_many = keep_last is not None and index >= keep_last
+        too_old = cutoff is not None and os.path.getmtime(path) < cutoff
+        if too_many or too_old:
+            os.remove(path)
+            removed.append(path)
+            logger.info(f"Old backup removed: {path}")
+    return removed
+
+
+def create_backup(db_path=None, backup_dir=BACKUP_DIR, compress=None, verify=True,
+                  keep_last=None, max_age_days=None):
+    """Создаёт резервную копию работающей базы без остановки записи.
+
+    Копируется только рабочая база: архивы периодов (archive.py) — отдельные
+    файлы, которые после создания не меняются, поэтому в копии не входят
+    (входит лишь их реестр archive_periods) и сохраняются один раз.
+    compress: None, 'gzip' или 'zstd'. db_path по умолчанию — database.DB_PATH
+    на момент вызова. Возвращает путь к копии или None.
+    """
+    db_path = db_path or database.DB_PATH
     try:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_dir = 'backups'
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
-            
-        backup_path = os.path.join(backup_dir, f'irama_backup_{timestamp}.db')
-        shutil.copy2('irama.db', backup_path)
+        if compress == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, falling back to gzip")
+            compress = 'gzip'
+        if compress not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compress}")
+
+        backup_path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{timestamp}.db{COMPRESSION_SUFFIXES[compress]}')
+        tmp_path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{timestamp}.db.part')
+        src = create_connection(db_path)
+        if src is None:
+            raise sqlite3.OperationalError(f"cannot open {db_path}")
+        dst = sqlite3.connect(tmp_path)
+        try:
+            copy_database(src, dst)
+            # Копия должна быть самодостаточным файлом без -wal
+            dst.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            dst.close()
+            src.close()
+
+        if verify:
+            ok, message = _check_database(tmp_path)
+            if not ok:
+                os.remove(tmp_path)
+                raise sqlite3.DatabaseError(f"integrity check failed: {message}")
+
+        if compress is None:
+            os.replace(tmp_path, backup_path)
+        else:
+            part_path = backup_path + '.part'
+            with open(tmp_path, 'rb') as src_file, _open_compressed(part_path, 'wb', compress) as dst_file:
+                shutil.copyfileobj(src_file, dst_file, 1024 * 1024)
+            os.replace(part_path, backup_path)
+            os.remove(tmp_path)
+
         logger.info(f"Database backup created: {backup_path}")
-        return True
+        if keep_last is not None or max_age_days is not None:
+            prune_backups(backup_dir, keep_last, max_age_days)
+        return backup_path
     except Exception as e:
         logger.error(f"Backup failed: {str(e)}")
-        return False
+        return None
+
+
+def restore_backup(backup_file, db_path=None):
+    """Восстанавливает базу из копии после проверки целостности.
 
-def restore_backup(backup_file):
+    Содержимое копируется в рабочую базу через backup API одним шагом,
+    то есть в одной транзакции: другие соединения видят либо старые
+    данные, либо восстановленные целиком. db_path по умолчанию —
+    database.DB_PATH на момент вызова.
+    """
+    db_path = db_path or database.DB_PATH
+    tmp_path = None
     try:
         if not os.path.exists(backup_file):
             raise FileNotFoundError("Backup file not found")
-            
-        shutil.copy2(backup_file, 'irama.db')
+
+        path = backup_file
+        if _codec_for(backup_file) is not None:
+            tmp_path = path = _decompressed_copy(backup_file, os.path.dirname(os.path.abspath(db_path)))
+        ok, message = _check_database(path)
+        if not ok:
+            raise sqlite3.DatabaseError(f"backup is corrupted: {message}")
+
+        src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        dst = create_connection(db_path)
+        try:
+            src.backup(dst, pages=-1)
+        finally:
+            src.close()
+            dst.close()
         logger.info(f"Database restored from: {backup_file}")
         return True
     except Exception as e:
         logger.error(f"Restore failed: {str(e)}")
         return False
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
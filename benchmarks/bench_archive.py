@@ -0,0 +1,119 @@
+"""Архив закрытых периодов: размер рабочей базы, резервная копия и отчёты.
+
+На синтетической базе (generate_data.py) все месяцы, кроме последнего,
+переносятся в архив (archive.py) с VACUUM рабочей базы. До и после
+печатаются размер рабочей базы, время и размер резервной копии
+(backup.create_backup), время отчёта за последний месяц (только рабочая
+база) и за всю историю (рабочая база и архивы через UNION ALL), а также
+время вставки отметок. Отчёты до и после сравниваются построчно.
+
+Запуск: python benchmarks/bench_archive.py [--scale small] [--runs 3]
+"""
+import argparse
+import calendar
+import hashlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive  # noqa: E402
+import database  # noqa: E402
+from backup import create_backup  # noqa: E402
+from generate_data import DEFAULT_SEED, FIRST_DAY, SCALES, generate_database  # noqa: E402
+from reports import write_attendance_report  # noqa: E402
+from timestamps import DAY_SECONDS  # noqa: E402
+
+INSERTS = 2000
+
+
+def _median(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def _report(conn, start, end):
+    buffer = io.StringIO()
+    write_attendance_report(buffer, start, end, conn=conn)
+    return hashlib.sha256(buffer.getvalue().encode()).hexdigest()
+
+
+def _insert_rate(conn):
+    """Отметок в секунду при вставке по одной в транзакции (как при check-in)."""
+    last = conn.execute("SELECT MAX(check_in_time) FROM attendance").fetchone()[0]
+    start = time.perf_counter()
+    for i in range(INSERTS):
+        with database.transaction(conn, 'IMMEDIATE'):
+            conn.execute("INSERT INTO attendance (employee_id, check_in_time) VALUES (?, ?)",
+                         (i % 100 + 1, last + DAY_SECONDS + i))
+    rate = INSERTS / (time.perf_counter() - start)
+    with database.transaction(conn):
+        conn.execute("DELETE FROM attendance WHERE check_in_time > ?", (last,))
+    return rate
+
+
+def _measure(conn, db_path, backup_dir, periods, runs):
+    start = time.perf_counter()
+    backup_path = create_backup(db_path, backup_dir, verify=False)
+    backup_time = time.perf_counter() - start
+    reports = {name: _median(lambda: _report(conn, *period), runs) for name, period in periods.items()}
+    return {
+        'db': os.path.getsize(db_path),
+        'backup': os.path.getsize(backup_path),
+        'backup_time': backup_time,
+        'reports': reports,
+        'insert_rate': _insert_rate(conn),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архив закрытых периодов")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        generate_database(db_path, args.scale, args.seed)
+        conn = database.get_connection(db_path)
+        last_day = conn.execute("SELECT date(MAX(check_in_time), 'unixepoch') FROM attendance").fetchone()[0]
+        last_month = last_day[:7]
+        year, month = map(int, last_month.split('-'))
+        periods = {
+            'последний месяц': (f"{last_month}-01", f"{last_month}-{calendar.monthrange(year, month)[1]:02d}"),
+            'вся история': (FIRST_DAY.isoformat(), last_day),
+        }
+        before = _measure(conn, db_path, os.path.join(workdir, 'backups_before'), periods, args.runs)
+
+        previous = f"{year - (month == 1)}-{(month - 2) % 12 + 1:02d}"
+        summary = archive.archive_period(FIRST_DAY.strftime('%Y-%m'), previous, vacuum=True, conn=conn)
+        if summary is None:
+            raise RuntimeError("архивация не удалась")
+        archive_size = os.path.getsize(os.path.join(workdir, summary['path']))
+        after = _measure(conn, db_path, os.path.join(workdir, 'backups_after'), periods, args.runs)
+        database.close_all_connections()
+
+    print(f"В архив {summary['name']}: отметок {summary['attendance_rows']}, смен {summary['shifts_rows']} "
+          f"за {summary['elapsed']:.1f} с, файл архива {archive_size / 2**20:.1f} МБ")
+    print(f"{'':<28} {'до':>10} {'после':>10}")
+    print(f"{'рабочая база, МБ':<28} {before['db'] / 2**20:10.1f} {after['db'] / 2**20:10.1f}")
+    print(f"{'резервная копия, МБ':<28} {before['backup'] / 2**20:10.1f} {after['backup'] / 2**20:10.1f}")
+    print(f"{'резервная копия, с':<28} {before['backup_time']:10.2f} {after['backup_time']:10.2f}")
+    print(f"{'вставка, отметок/с':<28} {before['insert_rate']:10.0f} {after['insert_rate']:10.0f}")
+    for name in periods:
+        (old_digest, old_time), (new_digest, new_time) = before['reports'][name], after['reports'][name]
+        same = "совпадает" if old_digest == new_digest else "РАЗЛИЧАЕТСЯ"
+        print(f"{'отчёт: ' + name + ', мс':<28} {old_time * 1000:10.1f} {new_time * 1000:10.1f}   {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Журнал изменений (change_log.py): цена записи и скорость чтения дельт.
+
+На синтетической базе (generate_data.py) печатаются:
+- отметок в секунду при вставке по одной в транзакции (как при check-in)
+  с триггерами журнала и без них (триггеры удаляются на время замера);
+- скорость массовой вставки отметок порциями с журналом и без;
+- скорость чтения журнала changes_since() порциями и очистки подтверждённых
+  записей prune_changes();
+- время чтения дельты против полного перечитывания таблицы attendance.
+
+Запуск: python benchmarks/bench_change_log.py [--scale small] [--events 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import change_log  # noqa: E402
+import database  # noqa: E402
+from generate_data import DEFAULT_SEED, SCALES, generate_database  # noqa: E402
+from timestamps import DAY_SECONDS  # noqa: E402
+
+BULK_BATCH = 1000
+
+
+def _triggers(conn):
+    return conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_change_%'"
+                        ).fetchall()
+
+
+def _single_rate(conn, base, events):
+    start = time.perf_counter()
+    for i in range(events):
+        with database.transaction(conn, 'IMMEDIATE'):
+            conn.execute("INSERT INTO attendance (employee_id, check_in_time) VALUES (?, ?)",
+                         (i % 100 + 1, base + i))
+    return events / (time.perf_counter() - start)
+
+
+def _bulk_rate(conn, base, events):
+    rows = [(i % 100 + 1, base + i, base + i + 28800) for i in range(events)]
+    start = time.perf_counter()
+    for offset in range(0, events, BULK_BATCH):
+        with database.transaction(conn):
+            conn.executemany("INSERT INTO attendance (employee_id, check_in_time, check_out_time) VALUES (?, ?, ?)",
+                             rows[offset:offset + BULK_BATCH])
+    return events / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Журнал изменений: запись и чтение")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--events', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        generate_database(db_path, args.scale, args.seed)
+        conn = database.get_connection(db_path)
+        base = conn.execute("SELECT MAX(check_in_time) FROM attendance").fetchone()[0] + DAY_SECONDS
+        cursor = change_log.current_cursor(conn)
+
+        rates = {}
+        triggers = _triggers(conn)
+        with database.transaction(conn):
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        rates['без журнала'] = (_single_rate(conn, base, args.events),
+                                _bulk_rate(conn, base + args.events, args.events * 10))
+        with database.transaction(conn):
+            for _, sql in triggers:
+                conn.execute(sql)
+        base += args.events * 12
+        rates['с журналом'] = (_single_rate(conn, base, args.events),
+                               _bulk_rate(conn, base + args.events, args.events * 10))
+
+        start = time.perf_counter()
+        changes = sum(len(batch) for batch in change_log.changes_since(cursor, conn=conn))
+        read_time = time.perf_counter() - start
+        start = time.perf_counter()
+        full = sum(1 for _ in conn.execute("SELECT * FROM attendance"))
+        full_time = time.perf_counter() - start
+
+        change_log.register_consumer('bench', cursor, conn)
+        change_log.acknowledge('bench', change_log.current_cursor(conn), conn)
+        start = time.perf_counter()
+        pruned = change_log.prune_changes(conn=conn)
+        prune_time = time.perf_counter() - start
+        database.close_all_connections()
+
+    print(f"{'':<14} {'по одной, /с':>13} {'порциями, /с':>13}")
+    for name, (single, bulk) in rates.items():
+        print(f"{name:<14} {single:13.0f} {bulk:13.0f}")
+    print(f"Дельта: {changes} записей за {read_time * 1000:.1f} мс "
+          f"(полное чтение attendance: {full} строк за {full_time * 1000:.1f} мс)")
+    print(f"Очистка подтверждённых: {pruned} записей за {prune_time * 1000:.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Графики вкладки «Отчёты» (charts.py): отрисовка, кэш и сокращение точек.
+
+На синтетической базе (generate_data.py) для каждого графика за
+всю историю печатаются: число дней (точек без сведения в интервалы) и точек
+после сведения, время первой отрисовки, повторного открытия (из кэша) и
+перерисовки после одной новой отметки (пересчёт сводок и новая версия).
+Для сравнения рисуется тот же дневной ряд без сведения.
+
+Запуск: python benchmarks/bench_charts.py [--scale small] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import charts  # noqa: E402
+import database  # noqa: E402
+from generate_data import DEFAULT_SEED, SCALES, generate_database  # noqa: E402
+from timestamps import DAY_SECONDS  # noqa: E402
+
+
+def _median(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Графики: отрисовка и кэш")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # Отдельная копия базы: бенчмарк добавляет отметки
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        generate_database(db_path, args.scale, args.seed)
+        conn = database.get_connection(db_path)
+        start_date, end_date, last = conn.execute(
+            "SELECT date(MIN(check_in_time), 'unixepoch'), date(MAX(check_in_time), 'unixepoch'), "
+            "MAX(check_in_time) FROM attendance"
+        ).fetchone()
+        days = charts.bin_width(start_date, end_date, 1)
+
+        print(f"Период {start_date} – {end_date} ({days} дн.), медиана из {args.runs}")
+        print(f"{'график':<18} {'точек':>6} {'первая, мс':>11} {'кэш, мс':>8} {'после отметки, мс':>18}")
+        for chart in charts.CHART_DATA:
+            cache = charts.ChartCache()
+
+            def cold():
+                cache.clear()
+                return charts.render_chart(chart, start_date, end_date, cache=cache, conn=conn)
+            _, first = _median(cold, args.runs)
+            _, cached = _median(lambda: charts.render_chart(chart, start_date, end_date, cache=cache, conn=conn),
+                                args.runs)
+
+            def changed():
+                with database.transaction(conn):
+                    conn.execute("INSERT INTO attendance (employee_id, check_in_time, check_out_time) "
+                                 "VALUES (1, ?, ?)", (last + DAY_SECONDS // 2, last + DAY_SECONDS))
+                return charts.render_chart(chart, start_date, end_date, cache=cache, conn=conn)
+            _, updated = _median(changed, args.runs)
+            points = len(charts.chart_data(chart, start_date, end_date, conn=conn))
+            print(f"{chart:<18} {points:6d} {first * 1000:11.1f} {cached * 1000:8.2f} {updated * 1000:18.1f}")
+
+        raw = charts.chart_data('daily_headcount', start_date, end_date, max_points=days, conn=conn)
+        _, unbinned = _median(lambda: charts.render_png('daily_headcount', raw), args.runs)
+        binned = charts.chart_data('daily_headcount', start_date, end_date, conn=conn)
+        _, binned_time = _median(lambda: charts.render_png('daily_headcount', binned), args.runs)
+        print(f"Дневной ряд без сведения: {len(raw)} точек, {unbinned * 1000:.1f} мс; "
+              f"со сведением: {len(binned)} точек, {binned_time * 1000:.1f} мс")
+        database.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Бенчмарк колоночной выгрузки против CSV-отчёта.
+
+На синтетической базе (generate_data.py) вся история посещаемости
+выгружается CSV-отчётом (reports.write_attendance_report) и
+columnar_export в Parquet и Feather. Печатаются время выгрузки, размер на
+диске и время чтения обратно в pandas. Затем в базу добавляется день
+отметок и выгрузка повторяется: переписываются только затронутые партиции.
+
+Запуск: python benchmarks/bench_columnar_export.py [--scale small]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import columnar_export  # noqa: E402
+import database  # noqa: E402
+from generate_data import DEFAULT_SEED, FIRST_DAY, SCALES, generate_database  # noqa: E402
+from reports import write_attendance_report  # noqa: E402
+from timestamps import DAY_SECONDS  # noqa: E402
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def _read_back(path, fmt):
+    """Читает партиционированную выгрузку целиком, как это сделал бы BI."""
+    import pyarrow.dataset
+    return pyarrow.dataset.dataset(path, format=fmt, partitioning='hive').to_table().to_pandas()
+
+
+def _add_day(conn):
+    """Добавляет отметки на день после последнего: имитация суток работы."""
+    last = conn.execute("SELECT MAX(check_in_time) FROM attendance").fetchone()[0]
+    day_start = (last // DAY_SECONDS + 1) * DAY_SECONDS
+    with database.transaction(conn):
+        conn.execute('''
+            INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time)
+            SELECT employee_id, shift_id, check_in_time - ? + ?, check_out_time - ? + ?
+            FROM attendance WHERE check_in_time >= ? AND check_in_time < ?
+        ''', (day_start - DAY_SECONDS, day_start, day_start - DAY_SECONDS, day_start,
+              day_start - DAY_SECONDS, day_start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Колоночная выгрузка против CSV")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        generate_database(db_path, args.scale, args.seed)
+        conn = database.get_connection(db_path)
+        end = conn.execute("SELECT date(MAX(check_in_time), 'unixepoch') FROM attendance").fetchone()[0]
+
+        csv_path = os.path.join(workdir, 'attendance.csv')
+        rows, csv_time = _timed(lambda: write_attendance_report(csv_path, FIRST_DAY.isoformat(), end, conn=conn))
+        _, csv_read = _timed(lambda: pd.read_csv(csv_path, parse_dates=["Приход", "Уход"]))
+        print(f"Отметок: {rows}")
+        print(f"{'формат':<9} {'выгрузка, с':>12} {'размер, МБ':>11} {'чтение, с':>10}")
+        print(f"{'csv':<9} {csv_time:12.2f} {_size(csv_path) / 2**20:11.1f} {csv_read:10.2f}")
+
+        for fmt in columnar_export.FORMATS:
+            output = os.path.join(workdir, fmt)
+            summary = columnar_export.export_columnar(output, fmt, conn=conn)
+            if summary is None:
+                raise RuntimeError("выгрузка не удалась (установлен ли pyarrow?)")
+            _, read_time = _timed(lambda: _read_back(os.path.join(output, 'attendance'), fmt))
+            print(f"{fmt:<9} {summary['elapsed']:12.2f} {_size(output) / 2**20:11.1f} {read_time:10.2f}")
+
+        _add_day(conn)
+        output = os.path.join(workdir, 'parquet')
+        summary = columnar_export.export_columnar(output, 'parquet', conn=conn)
+        full = columnar_export.export_columnar(output + '_full', 'parquet', full=True, conn=conn)
+        print(f"\nПосле добавления дня: переписано {summary['written']} партиций из "
+              f"{summary['written'] + summary['unchanged']} за {summary['elapsed']:.2f} с "
+              f"(полная выгрузка {full['elapsed']:.2f} с)")
+        database.close_all_connections()
+        shutil.rmtree(output + '_full')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Бенчмарк вставок: соединение на каждый вызов против пула database.
+
+Запуск: python benchmarks/bench_connection.py [--rows N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER NOT NULL,
+        shift_id INTEGER NOT NULL,
+        check_in_time TEXT NOT NULL,
+        check_out_time TEXT
+    )
+'''
+INSERT = '''INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)'''
+
+
+def _row(i):
+    return (i % 500 + 1, i % 50 + 1, '2023-10-15 09:00', '2023-10-15 18:00')
+
+
+def bench_per_call_connect(db_path, rows):
+    """Старый путь: sqlite3.connect, commit и close на каждую вставку."""
+    start = time.perf_counter()
+    for i in range(rows):
+        conn = sqlite3.connect(db_path)
+        conn.execute(INSERT, _row(i))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_pooled(db_path, rows):
+    """Новый путь: соединение потока из пула, транзакция на каждую вставку."""
+    conn = database.get_connection(db_path)
+    start = time.perf_counter()
+    for i in range(rows):
+        with database.transaction(conn):
+            conn.execute(INSERT, _row(i))
+    elapsed = time.perf_counter() - start
+    database.close_connection(db_path)
+    return elapsed
+
+
+def bench_pooled_single_transaction(db_path, rows):
+    """Пул и все вставки в одной транзакции."""
+    conn = database.get_connection(db_path)
+    start = time.perf_counter()
+    with database.transaction(conn):
+        for i in range(rows):
+            conn.execute(INSERT, _row(i))
+    elapsed = time.perf_counter() - start
+    database.close_connection(db_path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = [
+        ('connect на вызов (до)', bench_per_call_connect),
+        ('пул + транзакция на вставку (после)', bench_pooled),
+        ('пул + одна транзакция', bench_pooled_single_transaction),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (title, func) in enumerate(cases):
+            db_path = os.path.join(tmp, f'bench_{i}.db')
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(SCHEMA)
+            elapsed = func(db_path, args.rows)
+            print(f"{title:40s} {args.rows / elapsed:12.0f} вставок/с ({elapsed:.3f} с)")
+
+
+if __name__ == '__main__':
+    main()
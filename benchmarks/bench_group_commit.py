@@ -0,0 +1,103 @@
+"""Бенчмарк буфера групповой записи отметок.
+
+--threads потоков (терминалов) пишут по --events отметок каждый:
+direct — прежний путь, транзакция на каждую отметку; buffer_wait — через
+AttendanceBuffer с ожиданием COMMIT каждой отметки (как main.add_attendance);
+buffer_async — через буфер без ожидания, с проверкой всех Future в конце.
+Печатается число отметок в секунду и среднее число отметок в транзакции.
+
+Запуск: python benchmarks/bench_group_commit.py [--threads 16] [--events 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from attendance_buffer import AttendanceBuffer  # noqa: E402
+from migrations import migrate  # noqa: E402
+from timestamps import to_epoch, to_epoch_day  # noqa: E402
+
+MODES = ('direct', 'buffer_wait', 'buffer_async')
+INSERT = "INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)"
+CHECK_IN = to_epoch('2024-01-01 09:00')
+
+
+def _prepare(db_path, employees):
+    conn = database.get_connection(db_path)
+    migrate(conn)
+    with database.transaction(conn):
+        conn.executemany("INSERT INTO employees (name, status, department) VALUES (?, 'Основной', 'Склад')",
+                         [(f"Терминалов {i}",) for i in range(employees)])
+        conn.executemany("INSERT INTO shifts (employee_id, shift_date, start_time, end_time) "
+                         "VALUES (?, ?, '09:00', '18:00')",
+                         [(i + 1, to_epoch_day('2024-01-01')) for i in range(employees)])
+    database.close_connection(db_path)
+
+
+def _direct(db_path, thread_index, events):
+    conn = database.get_connection(db_path)
+    for i in range(events):
+        with database.transaction(conn, mode='IMMEDIATE'):
+            conn.execute(INSERT, (thread_index + 1, thread_index + 1, CHECK_IN + i % 60 * 60, None))
+    database.close_connection(db_path)
+
+
+def _buffer_wait(buffer, thread_index, events):
+    for i in range(events):
+        buffer.submit(thread_index + 1, thread_index + 1, CHECK_IN + i % 60 * 60, flush_soon=True).result()
+
+
+def _buffer_async(buffer, thread_index, events):
+    futures = [buffer.submit(thread_index + 1, thread_index + 1, CHECK_IN + i % 60 * 60)
+               for i in range(events)]
+    for future in futures:
+        future.result()
+
+
+def bench_mode(mode, threads, events):
+    """Возвращает (секунды, транзакций)."""
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        _prepare(db_path, threads)
+        buffer = None
+        if mode == 'direct':
+            target, first_arg = _direct, db_path
+        else:
+            buffer = AttendanceBuffer(db_path)
+            target = _buffer_wait if mode == 'buffer_wait' else _buffer_async
+            first_arg = buffer
+        workers = [threading.Thread(target=target, args=(first_arg, index, events)) for index in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        if buffer is not None:
+            buffer.close()
+        database.close_all_connections()
+        return elapsed, buffer.batches if buffer is not None else threads * events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Групповая запись отметок")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--events', type=int, default=500, help="отметок на поток")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    total = args.threads * args.events
+    print(f"{args.threads} потоков × {args.events} отметок")
+    print(f"{'режим':<13} {'с':>7} {'отметок/с':>10} {'в транзакции':>13}")
+    for mode in args.modes:
+        elapsed, transactions = bench_mode(mode, args.threads, args.events)
+        print(f"{mode:<13} {elapsed:7.2f} {total / elapsed:10.0f} {total / transactions:13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Сравнение полных и инкрементальных резервных копий на растущей базе.
+
+База растёт раундами (добавляются отметки посещаемости), после каждого
+раунда снимаются полная копия (backup.create_backup) и инкрементальный
+снимок; сравниваются записанные байты и время.
+
+Запуск: python benchmarks/bench_incremental_backup.py [--rounds N] [--rows N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backup  # noqa: E402
+import database  # noqa: E402
+import incremental_backup  # noqa: E402
+from migrations import migrate  # noqa: E402
+from timestamps import to_epoch, to_epoch_day  # noqa: E402
+
+
+def _grow(conn, rows, offset):
+    """Добавляет отметки с возрастающим временем, как в реальной истории."""
+    start = datetime(2023, 1, 1)
+
+    def row(i):
+        check_in = start + timedelta(seconds=i * 30)
+        return (i % 1000 + 1, i % 1000 + 1, to_epoch(check_in), to_epoch(check_in + timedelta(hours=9)))
+
+    with database.transaction(conn):
+        conn.executemany(
+            "INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)",
+            (row(i) for i in range(offset, offset + rows)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=100000, help="строк посещаемости за раунд")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'irama.db')
+        full_dir = os.path.join(tmp, 'full')
+        store_dir = os.path.join(tmp, 'incremental')
+        conn = database.get_connection(db_path)
+        migrate(conn)
+        with database.transaction(conn):
+            conn.executemany("INSERT INTO employees (name, status, department) VALUES (?, ?, ?)",
+                             ((f"Сотрудник {i}", "Постоянный", f"Отдел {i % 20}") for i in range(1000)))
+            conn.executemany("INSERT INTO shifts (employee_id, shift_date, start_time, end_time) VALUES (?, ?, ?, ?)",
+                             ((i + 1, to_epoch_day("2023-01-01"), "09:00", "18:00") for i in range(1000)))
+
+        total_full = total_incremental = 0
+        print(f"{'раунд':>5} {'размер БД, МБ':>14} {'полная, МБ':>11} {'время':>7} {'инкр., МБ':>10} {'время':>7}")
+        for round_number in range(args.rounds):
+            _grow(conn, args.rows, round_number * args.rows)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            start = time.perf_counter()
+            full_path = backup.create_backup(db_path, full_dir, verify=False)
+            full_time = time.perf_counter() - start
+            full_bytes = os.path.getsize(full_path)
+
+            manifest = incremental_backup.create_snapshot(db_path, store_dir)
+            total_full += full_bytes
+            total_incremental += manifest['bytes_written']
+            print(f"{round_number + 1:>5} {manifest['db_size'] / 2**20:>14.1f} {full_bytes / 2**20:>11.2f} "
+                  f"{full_time:>6.2f}s {manifest['bytes_written'] / 2**20:>10.2f} {manifest['elapsed']:>6.2f}s")
+            # Копии с одинаковой секундой в имени перезаписали бы друг друга
+            time.sleep(1)
+
+        print(f"Итого записано: полные {total_full / 2**20:.1f} МБ, инкрементальные {total_incremental / 2**20:.1f} МБ")
+        store_size = sum(os.path.getsize(os.path.join(root, name))
+                         for root, _, files in os.walk(store_dir) for name in files)
+        print(f"Размер каталогов на диске: полные {total_full / 2**20:.1f} МБ, "
+              f"инкрементальное хранилище {store_size / 2**20:.1f} МБ")
+        database.close_connection(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Бенчмарк вставок посещаемости с журналированием и без него.
+
+Каждая main.add_attendance пишет строку в журнал. Сравниваются режимы:
+off — журнал выключен, sync — прежний FileHandler прямо в потоке
+вставки, queue — log_config.setup_logging (QueueHandler + поток записи),
+queue_json — то же с дополнительным JSON Lines. Для каждого режима
+печатается общее время и задержка одной вставки (медиана и p99).
+
+На быстром локальном диске запись строки в файл дешевле передачи её
+другому потоку под GIL, и sync может оказаться не медленнее queue.
+--disk-delay-ms добавляет задержку к каждой записи в файл и моделирует
+медленное хранилище (сетевой профиль, антивирус), ради которого очередь
+и нужна.
+
+Запуск: python benchmarks/bench_logging.py [--rows 5000] [--runs 3] [--disk-delay-ms 0.5]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import log_config  # noqa: E402
+import main as irama_main  # noqa: E402
+from migrations import migrate  # noqa: E402
+from timestamps import to_epoch_day  # noqa: E402
+
+MODES = ('off', 'sync', 'queue', 'queue_json')
+
+
+def _slow_down(handler, delay):
+    """Добавляет задержку delay секунд к каждой записи обработчика."""
+    if not delay:
+        return
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(delay)
+        emit(record)
+    handler.emit = slow_emit
+
+
+def _enable(mode, workdir, delay=0.0):
+    """Включает режим журналирования; возвращает функцию его отключения."""
+    logger = logging.getLogger('iRama')
+    log_path = os.path.join(workdir, 'irama.log')
+    if mode == 'off':
+        logger.setLevel(logging.CRITICAL)
+        return lambda: logger.setLevel(logging.NOTSET)
+    if mode == 'sync':
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(log_config.LOG_FORMAT, log_config.DATE_FORMAT))
+        _slow_down(handler, delay)
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+        def disable():
+            logger.removeHandler(handler)
+            handler.close()
+            logger.setLevel(logging.NOTSET)
+        return disable
+    listener = log_config.setup_logging(log_path, level=logging.INFO, json_lines=(mode == 'queue_json'),
+                                        slow_log_path=os.path.join(workdir, 'irama_slow.log'))
+    for handler in listener.handlers:
+        _slow_down(handler, delay)
+    return log_config.shutdown_logging
+
+
+def bench_mode(mode, rows, delay=0.0):
+    """Возвращает (общее время с учётом дозаписи журнала, задержки вставок)."""
+    with tempfile.TemporaryDirectory() as workdir:
+        database.DB_PATH = os.path.join(workdir, 'irama.db')
+        conn = database.get_connection()
+        migrate(conn)
+        conn.execute("INSERT INTO employees (name, status, department) VALUES ('Бенчмарков Лог', 'Основной', 'Склад')")
+        conn.execute("INSERT INTO shifts (employee_id, shift_date, start_time, end_time) "
+                     "VALUES (1, ?, '09:00', '18:00')", (to_epoch_day('2024-01-01'),))
+        disable = _enable(mode, workdir, delay)
+        latencies = []
+        try:
+            start = time.perf_counter()
+            for _ in range(rows):
+                call_start = time.perf_counter()
+                irama_main.add_attendance(1, 1, '2024-01-01 09:00', '2024-01-01 18:00')
+                latencies.append(time.perf_counter() - call_start)
+        finally:
+            # Остановка слушателя дописывает очередь: это тоже входит в общее время
+            disable()
+            total = time.perf_counter() - start
+            database.close_all_connections()
+    return total, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Вставки с журналированием и без")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--disk-delay-ms', type=float, default=0.0, help="задержка каждой записи в файл, мс")
+    args = parser.parse_args()
+
+    print(f"{'режим':<11} {'всего, с':>9} {'вставок/с':>10} {'p50, мкс':>9} {'p99, мкс':>9}")
+    for mode in args.modes:
+        totals, latencies = [], []
+        for _ in range(args.runs):
+            total, run_latencies = bench_mode(mode, args.rows, args.disk_delay_ms / 1000)
+            totals.append(total)
+            latencies.extend(run_latencies)
+        latencies.sort()
+        total = statistics.median(totals)
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"{mode:<11} {total:9.3f} {args.rows / total:10.0f} {p50:9.1f} {p99:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
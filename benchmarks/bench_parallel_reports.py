@@ -0,0 +1,103 @@
+"""Масштабирование параллельного отчёта по отделам (parallel_reports.py).
+
+На кэшированной синтетической базе (generate_data.py) отчёт за период
+строится последовательно (reports.write_attendance_report, как
+main.generate_attendance_report) и параллельно с 1, 2, 4 и 8 процессами.
+Печатаются время, ускорение относительно последовательного отчёта и
+сверка: общий файл содержит те же строки, а его байты не зависят от
+числа процессов. Ускорение ограничено числом ядер (печатается).
+
+Запуск: python benchmarks/bench_parallel_reports.py [--scale small] [--workers 1 2 4 8] [--runs 3]
+"""
+import argparse
+import csv
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import database  # noqa: E402
+from generate_data import DEFAULT_SEED, SCALES, generate_database  # noqa: E402
+from migrations import LATEST_VERSION  # noqa: E402
+from parallel_reports import run_parallel_report  # noqa: E402
+from reports import write_attendance_report  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+
+
+def _dataset(scale, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'irama_{scale}_{seed}_v{LATEST_VERSION}.db')
+    if not os.path.exists(path):
+        generate_database(path + '.part', scale, seed)
+        os.replace(path + '.part', path)
+    return path
+
+
+def _rows_digest(path, skip_columns=0):
+    """Хеш отсортированных строк отчёта без заголовка и первых skip_columns столбцов."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        rows = sorted(tuple(row[skip_columns:]) for row in list(csv.reader(file))[1:])
+    return len(rows), hashlib.sha256(repr(rows).encode()).hexdigest()
+
+
+def _file_digest(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование параллельного отчёта")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = _dataset(args.scale, args.seed)
+    conn = database.get_connection(db_path)
+    start_date, end_date = conn.execute(
+        "SELECT date(MIN(check_in_time), 'unixepoch'), date(MAX(check_in_time), 'unixepoch') FROM attendance"
+    ).fetchone()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        sequential_path = os.path.join(workdir, 'sequential.csv')
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            write_attendance_report(sequential_path, start_date, end_date, conn=conn)
+            timings.append(time.perf_counter() - start)
+        sequential = statistics.median(timings)
+        expected = _rows_digest(sequential_path)
+
+        results = []
+        for workers in args.workers:
+            output = os.path.join(workdir, f'parallel_{workers}')
+            timings = []
+            for _ in range(args.runs):
+                summary = run_parallel_report(output, start_date, end_date, workers, db_path)
+                if summary is None:
+                    raise RuntimeError("параллельный отчёт не удался")
+                timings.append(summary['elapsed'])
+            same_rows = _rows_digest(summary['combined'], skip_columns=1) == expected
+            results.append((workers, statistics.median(timings), summary, same_rows,
+                            _file_digest(summary['combined'])))
+        database.close_all_connections()
+
+    print(f"Период {start_date} – {end_date}, строк {expected[0]}, ядер {os.cpu_count()}, медиана из {args.runs}")
+    print(f"{'вариант':<20} {'время, с':>9} {'ускорение':>10}  строки")
+    print(f"{'последовательно':<20} {sequential:9.2f} {1:9.2f}×")
+    digests = {digest for *_, digest in results}
+    for workers, elapsed, summary, same_rows, _ in results:
+        print(f"{f'{workers} процесс(а/ов)':<20} {elapsed:9.2f} {sequential / elapsed:9.2f}×  "
+              f"{'совпадают' if same_rows else 'РАЗЛИЧАЮТСЯ'} ({summary['tasks']} задач)")
+    print(f"Общий файл одинаков при любом числе процессов: {'да' if len(digests) == 1 else 'НЕТ'}")
+
+
+if __name__ == '__main__':
+    main()
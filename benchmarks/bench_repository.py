@@ -0,0 +1,83 @@
+"""Кэш сотрудников (repository.py): чтение по id без кэша и с кэшем.
+
+На синтетической базе (generate_data.py) читаются случайные сотрудники:
+по одному запросом на id (как раньше в gui и employee_table), через
+EmployeeRepository.get и пачками через get_many (один IN-запрос на пачку).
+Печатаются чтений в секунду и счётчики кэша.
+
+Запуск: python benchmarks/bench_repository.py [--scale small] [--lookups 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import database  # noqa: E402
+from generate_data import DEFAULT_SEED, SCALES, generate_database  # noqa: E402
+from migrations import LATEST_VERSION  # noqa: E402
+from models import EMPLOYEE_COLUMNS  # noqa: E402
+from repository import EmployeeRepository  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BATCH = 200
+
+
+def _dataset(scale, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'irama_{scale}_{seed}_v{LATEST_VERSION}.db')
+    if not os.path.exists(path):
+        generate_database(path + '.part', scale, seed)
+        os.replace(path + '.part', path)
+    return path
+
+
+def _rate(func, count):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кэш сотрудников")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    conn = database.get_connection(_dataset(args.scale, args.seed))
+    ids = [row[0] for row in conn.execute("SELECT id FROM employees")]
+    rng = random.Random(args.seed)
+    lookups = [rng.choice(ids) for _ in range(args.lookups)]
+    sql = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees WHERE id = ?"
+
+    def direct():
+        for employee_id in lookups:
+            conn.execute(sql, (employee_id,)).fetchone()
+
+    repository = EmployeeRepository()
+
+    def cached():
+        for employee_id in lookups:
+            repository.get(employee_id, conn)
+
+    batched = EmployeeRepository()
+
+    def many():
+        for start in range(0, len(lookups), BATCH):
+            batched.get_many(lookups[start:start + BATCH], conn)
+
+    print(f"Сотрудников {len(ids)}, чтений {len(lookups)}")
+    print(f"{'запрос на id':<26} {_rate(direct, len(lookups)):12.0f} чтений/с")
+    print(f"{'get (холодный кэш)':<26} {_rate(cached, len(lookups)):12.0f} чтений/с")
+    print(f"{'get (тёплый кэш)':<26} {_rate(cached, len(lookups)):12.0f} чтений/с")
+    print(f"{f'get_many по {BATCH}':<26} {_rate(many, len(lookups)):12.0f} чтений/с")
+    print(f"Счётчики get: {repository.stats()}")
+    database.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Бенчмарк холодного запуска GUI.
+
+Запускает `python -X importtime -c "import gui"` в отдельном процессе
+несколько раз и печатает медиану времени импорта, самые дорогие модули
+и то, какие тяжёлые зависимости загружаются при старте. С --window
+дополнительно замеряется время до первой отрисовки окна (нужен дисплей).
+
+Запуск: python benchmarks/bench_startup.py [--runs 5] [--top 15] [--window] [-o startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Зависимости, которые не должны загружаться до обращения к своей функции
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'tkcalendar', 'plyer', 'openpyxl', 'pyarrow')
+
+WINDOW_SCRIPT = '''
+import time
+start = time.perf_counter()
+import tkinter as tk
+import gui
+root = tk.Tk()
+app = gui.IRamaApp(root)
+root.update()
+print(time.perf_counter() - start)
+app.close()
+'''
+
+
+def _run_importtime(workdir):
+    """Возвращает [(модуль, собственное мкс, накопленное мкс, уровень)] одного запуска."""
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR, IRAMA_PROFILE='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gui'],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def _measure_window(workdir):
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR, IRAMA_PROFILE='0')
+    result = subprocess.run([sys.executable, '-c', WINDOW_SCRIPT], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного запуска iRama GUI")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--window', action='store_true', help="замерить время до первой отрисовки окна")
+    parser.add_argument('-o', '--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    # Рабочий каталог отдельный: импорт gui не трогает irama.log и базу проекта
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [_run_importtime(workdir) for _ in range(args.runs)]
+        window = [_measure_window(workdir) for _ in range(args.runs)] if args.window else []
+
+    totals = [next(cumulative for name, _, cumulative, level in entries if name == 'gui' and level == 0)
+              for entries in runs]
+    last = runs[-1]
+    loaded = {name.split('.')[0] for name, _, _, _ in last}
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    top = sorted(last, key=lambda entry: entry[1], reverse=True)[:args.top]
+
+    print(f"import gui: медиана {statistics.median(totals) / 1000:.1f} мс ({args.runs} запусков)")
+    if window:
+        print(f"до первой отрисовки окна: медиана {statistics.median(window) * 1000:.1f} мс")
+    print(f"тяжёлые зависимости при старте: {', '.join(heavy) if heavy else 'нет'}")
+    print(f"\n{'собств., мс':>12} {'накоп., мс':>11}  модуль")
+    for name, self_us, cumulative_us, _ in top:
+        print(f"{self_us / 1000:12.1f} {cumulative_us / 1000:11.1f}  {name}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'import_ms': [total / 1000 for total in totals],
+                'window_ms': [value * 1000 for value in window],
+                'heavy_modules': heavy,
+                'top': [{'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+                        for name, self_us, cumulative_us, _ in top],
+            }, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
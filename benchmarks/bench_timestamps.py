@@ -0,0 +1,191 @@
+"""Строковые и целочисленные даты: размер базы и время запросов.
+
+Синтетическая база (generate_data.py) строится в текущем формате, затем её
+копия переводится обратно в строковый формат до миграции 7 ('гггг-мм-дд
+чч:мм' и 'гггг-мм-дд' в TEXT). Для обеих печатаются размеры таблиц и
+индексов (dbstat), время типовых запросов по диапазону дат и время самой
+миграции строковой копии. Запросы строкового варианта — те, что были в
+приложении до перехода (BETWEEN по строкам, julianday).
+
+Запуск: python benchmarks/bench_timestamps.py [--scale small] [--runs 5]
+"""
+import argparse
+import calendar
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+from generate_data import DEFAULT_SEED, FIRST_DAY, SCALES, generate_database  # noqa: E402
+from timestamps import period_bounds, to_epoch_day  # noqa: E402
+
+OBJECTS = ['attendance', 'idx_attendance_check_in', 'idx_attendance_employee_check_in',
+           'shifts', 'idx_shifts_employee_date']
+
+_LEGACY_SHIFTS = '''
+    CREATE TABLE shifts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER,
+        shift_date TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE
+    )
+'''
+_LEGACY_ATTENDANCE = '''
+    CREATE TABLE attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER,
+        shift_id INTEGER,
+        check_in_time TEXT,
+        check_out_time TEXT,
+        FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE,
+        FOREIGN KEY (shift_id) REFERENCES shifts (id) ON DELETE CASCADE
+    )
+'''
+
+
+def _make_legacy(path):
+    """Переводит базу в строковый формат схемы версии 6."""
+    conn = database.create_connection(path)
+    conn.execute("PRAGMA foreign_keys = OFF")
+    with database.transaction(conn):
+        migrations._rebuild_table(conn, 'shifts', _LEGACY_SHIFTS,
+                                  ['id', 'employee_id', 'shift_date', 'start_time', 'end_time'],
+                                  {'shift_date': "date(shift_date * 86400, 'unixepoch')"})
+        migrations._rebuild_table(conn, 'attendance', _LEGACY_ATTENDANCE,
+                                  ['id', 'employee_id', 'shift_id', 'check_in_time', 'check_out_time'],
+                                  {'check_in_time': "strftime('%Y-%m-%d %H:%M', check_in_time, 'unixepoch')",
+                                   'check_out_time': "strftime('%Y-%m-%d %H:%M', check_out_time, 'unixepoch')"})
+        migrations._migration_3_indexes(conn)
+        conn.execute("DELETE FROM schema_version WHERE version >= 7")
+    conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _sizes(conn):
+    rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    return dict(rows)
+
+
+def _queries(legacy, month_start, month_end, employee_ids, day):
+    """(имя, SQL, параметры) одинаковых по смыслу запросов для формата."""
+    if legacy:
+        month = (month_start, month_end)
+        return [
+            ("отметки за месяц, COUNT", "SELECT COUNT(*) FROM attendance WHERE check_in_time BETWEEN ? AND ?",
+             [month]),
+            ("отчёт за месяц", "SELECT e.name, a.check_in_time, a.check_out_time FROM attendance a "
+             "JOIN employees e ON a.employee_id = e.id WHERE a.check_in_time BETWEEN ? AND ? "
+             "ORDER BY a.check_in_time, a.id", [month]),
+            ("часы за месяц", "SELECT SUM((julianday(check_out_time) - julianday(check_in_time)) * 24) "
+             "FROM attendance WHERE check_in_time BETWEEN ? AND ?", [month]),
+            ("сотрудник за месяц ×200", "SELECT * FROM attendance WHERE employee_id = ? "
+             "AND check_in_time BETWEEN ? AND ?", [(e, *month) for e in employee_ids]),
+            ("смена на дату ×200", "SELECT * FROM shifts WHERE employee_id = ? AND shift_date = ?",
+             [(e, day) for e in employee_ids]),
+        ]
+    month = period_bounds(month_start, month_end)
+    day_number = to_epoch_day(day)
+    return [
+        ("отметки за месяц, COUNT", "SELECT COUNT(*) FROM attendance WHERE check_in_time >= ? AND check_in_time < ?",
+         [month]),
+        ("отчёт за месяц", "SELECT e.name, strftime('%Y-%m-%d %H:%M', a.check_in_time, 'unixepoch'), "
+         "strftime('%Y-%m-%d %H:%M', a.check_out_time, 'unixepoch') FROM attendance a "
+         "JOIN employees e ON a.employee_id = e.id WHERE a.check_in_time >= ? AND a.check_in_time < ? "
+         "ORDER BY a.check_in_time, a.id", [month]),
+        ("часы за месяц", "SELECT SUM((check_out_time - check_in_time) / 3600.0) "
+         "FROM attendance WHERE check_in_time >= ? AND check_in_time < ?", [month]),
+        ("сотрудник за месяц ×200", "SELECT * FROM attendance WHERE employee_id = ? "
+         "AND check_in_time >= ? AND check_in_time < ?", [(e, *month) for e in employee_ids]),
+        ("смена на дату ×200", "SELECT * FROM shifts WHERE employee_id = ? AND shift_date = ?",
+         [(e, day_number) for e in employee_ids]),
+    ]
+
+
+def _time_queries(conn, queries, runs):
+    results = []
+    for name, sql, param_sets in queries:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for params in param_sets:
+                rows = conn.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - start)
+        plan = ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", param_sets[0]))
+        results.append((name, statistics.median(timings), rows, plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Строковые и целочисленные даты")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--employees', type=int)
+    parser.add_argument('--days', type=int)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        current = os.path.join(workdir, 'integer.db')
+        legacy = os.path.join(workdir, 'text.db')
+        counts = generate_database(current, args.scale, args.seed, args.employees, args.days)
+        shutil.copyfile(current, legacy)
+        _make_legacy(legacy)
+        conn = database.create_connection(current)
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+        conn.close()
+
+        # Миграция строковой копии на рабочей копии, чтобы замеры шли по исходной
+        migrated = os.path.join(workdir, 'migrated.db')
+        shutil.copyfile(legacy, migrated)
+        conn = database.create_connection(migrated)
+        start = time.perf_counter()
+        migrations.migrate(conn)
+        migrate_seconds = time.perf_counter() - start
+        conn.close()
+
+        rng = random.Random(args.seed)
+        employee_ids = [rng.randint(1, counts['employees']) for _ in range(200)]
+        month_start = FIRST_DAY.replace(day=1).isoformat()
+        month_end = FIRST_DAY.replace(day=calendar.monthrange(FIRST_DAY.year, FIRST_DAY.month)[1]).isoformat()
+        day = FIRST_DAY.replace(day=10).isoformat()
+
+        sizes, timings = {}, {}
+        for label, path in (('строки', legacy), ('целые', current)):
+            conn = database.create_connection(path)
+            sizes[label] = (_sizes(conn), os.path.getsize(path))
+            timings[label] = _time_queries(conn, _queries(label == 'строки', month_start, month_end,
+                                                          employee_ids, day), args.runs)
+            conn.close()
+
+    print(f"{'объект':<34} {'строки, КБ':>11} {'целые, КБ':>10} {'изм.':>7}")
+    for name in OBJECTS + ['файл базы']:
+        if name == 'файл базы':
+            old, new = sizes['строки'][1], sizes['целые'][1]
+        else:
+            old, new = sizes['строки'][0].get(name, 0), sizes['целые'][0].get(name, 0)
+        print(f"{name:<34} {old / 1024:11.0f} {new / 1024:10.0f} {(new - old) / old * 100 if old else 0:+6.0f}%")
+    print()
+    print(f"Период {month_start} – {month_end}, медиана из {args.runs}")
+    print(f"{'запрос':<26} {'строки, мс':>11} {'целые, мс':>10} {'ускорение':>10}")
+    for (name, old, old_rows, _), (_, new, new_rows, plan) in zip(timings['строки'], timings['целые']):
+        print(f"{name:<26} {old * 1000:11.2f} {new * 1000:10.2f} {old / new:9.1f}×   {plan}")
+    old_count = timings['строки'][0][2][0][0]
+    new_count = timings['целые'][0][2][0][0]
+    print(f"\nОтметок за период: BETWEEN по строкам {old_count}, по целым границам {new_count} "
+          f"(BETWEEN '…-{month_end[-2:]}' теряет последний день)")
+    print(f"Миграция строковой копии на версию {migrations.LATEST_VERSION}: {migrate_seconds:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Генератор синтетической базы iRama для бенчмарков.
+
+База строится детерминированно из seed: при одинаковых масштабе и seed
+получается одинаковое содержимое, поэтому результаты разных коммитов
+сравнимы. Схема создаётся обычными миграциями.
+
+Масштабы (SCALES): small — 1 тыс. сотрудников, medium — 50 тыс.,
+large — 500 тыс. сотрудников и ~20 млн отметок посещаемости.
+
+Запуск: python benchmarks/generate_data.py small -o bench_small.db [--seed 42]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aggregates  # noqa: E402
+import change_log  # noqa: E402
+import database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from timestamps import to_epoch, to_epoch_day  # noqa: E402
+
+# employees — сотрудники, days — длина истории смен и отметок
+SCALES = {
+    'small': {'employees': 1_000, 'days': 60},
+    'medium': {'employees': 50_000, 'days': 90},
+    'large': {'employees': 500_000, 'days': 60},
+}
+DEFAULT_SEED = 42
+FIRST_DAY = date(2024, 1, 1)
+BATCH_SIZE = 50_000
+
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+            "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров",
+            "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин"]
+MALE_NAMES = ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья",
+              "Кирилл", "Михаил", "Никита", "Иван", "Роман", "Егор", "Павел", "Владимир"]
+FEMALE_NAMES = ["Анастасия", "Мария", "Анна", "Виктория", "Екатерина", "Наталья", "Елена",
+                "Ольга", "Дарья", "Юлия", "Татьяна", "Ирина", "Светлана", "Полина"]
+PATRONYMICS = ["Александров", "Дмитриев", "Сергеев", "Андреев", "Алексеев", "Михайлов",
+               "Иванов", "Николаев", "Владимиров", "Петров", "Юрьев", "Викторов"]
+DEPARTMENTS = ["Отдел продаж", "Склад", "Бухгалтерия", "Производство", "Логистика", "Охрана",
+               "IT-отдел", "Отдел кадров", "Закупки", "Клиентский сервис", "Маркетинг", "Цех №1",
+               "Цех №2", "Контроль качества", "Администрация"]
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Екатеринбург", "Новосибирск", "Нижний Новгород",
+          "Самара", "Ростов-на-Дону", "Уфа", "Краснодар"]
+STATUSES = ["Основной", "Совместитель", "Стажёр", "Временный"]
+# Шаблоны смен и их доли; ночная смена заканчивается на следующий день
+SHIFT_TEMPLATES = [("09:00", "18:00"), ("08:00", "17:00"), ("14:00", "23:00"), ("22:00", "06:00")]
+SHIFT_WEIGHTS = [60, 20, 10, 10]
+ABSENCE_RATE = 0.03
+MISSING_CHECKOUT_RATE = 0.02
+
+
+def _employee(rng):
+    female = rng.random() < 0.5
+    surname = rng.choice(SURNAMES) + ("а" if female else "")
+    name = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+    patronymic = rng.choice(PATRONYMICS) + ("на" if female else "ич")
+    birth = date(1960, 1, 1) + timedelta(days=rng.randrange(16000))
+    return (f"{surname} {name} {patronymic}", rng.choice(STATUSES), rng.choice(DEPARTMENTS),
+            birth.strftime("%d.%m.%Y"), rng.choice(CITIES), f"+79{rng.randrange(10**9):09d}",
+            f"{rng.randrange(1000, 10000)} {rng.randrange(100000, 1000000)}")
+
+
+def _employee_rows(rng, count):
+    return (_employee(rng) for _ in range(count))
+
+
+def _schedule_rows(rng, employees, days):
+    """Смены и отметки: (shift_id, employee_id, дата, начало, конец, приход, уход).
+
+    Дата и отметки — в формате хранения (номер дня и секунды, timestamps.py).
+    """
+    templates = rng.choices(range(len(SHIFT_TEMPLATES)), weights=SHIFT_WEIGHTS, k=employees)
+    # Два выходных в неделю, у каждого сотрудника свои
+    days_off = [rng.randrange(7) for _ in range(employees)]
+    shift_id = 0
+    for day_number in range(days):
+        day = FIRST_DAY + timedelta(days=day_number)
+        weekday = day.weekday()
+        day_text = day.isoformat()
+        day_number = to_epoch_day(day)
+        for employee_index in range(employees):
+            off = days_off[employee_index]
+            if weekday == off or weekday == (off + 1) % 7:
+                continue
+            shift_id += 1
+            start_time, end_time = SHIFT_TEMPLATES[templates[employee_index]]
+            check_in = check_out = None
+            if rng.random() >= ABSENCE_RATE:
+                start = datetime.fromisoformat(f"{day_text} {start_time}")
+                end = datetime.fromisoformat(f"{day_text} {end_time}")
+                if end <= start:
+                    end += timedelta(days=1)
+                check_in = to_epoch(start + timedelta(minutes=round(rng.gauss(-5, 8))))
+                if rng.random() >= MISSING_CHECKOUT_RATE:
+                    check_out = to_epoch(end + timedelta(minutes=rng.randrange(0, 60)))
+            yield shift_id, employee_index + 1, day_number, start_time, end_time, check_in, check_out
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def generate_database(db_path, scale='small', seed=DEFAULT_SEED, employees=None, days=None, progress=print):
+    """Создаёт базу db_path с синтетическими данными; возвращает число строк по таблицам."""
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    config = dict(SCALES[scale])
+    if employees is not None:
+        config['employees'] = employees
+    if days is not None:
+        config['days'] = days
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    conn = database.create_connection(db_path)
+    migrate(conn)
+    # Загрузка в новый файл: при сбое базу проще создать заново
+    conn.execute("PRAGMA synchronous = OFF")
+    counts = {'employees': 0, 'shifts': 0, 'attendance': 0}
+    with database.transaction(conn):
+        for batch in _batches(_employee_rows(rng, config['employees'])):
+            conn.executemany('''INSERT INTO employees (name, status, department, date_of_birth, city,
+                                phone_number, passport_data) VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
+            counts['employees'] += len(batch)
+    for batch in _batches(_schedule_rows(rng, config['employees'], config['days'])):
+        with database.transaction(conn):
+            conn.executemany("INSERT INTO shifts (id, employee_id, shift_date, start_time, end_time) "
+                             "VALUES (?, ?, ?, ?, ?)", (row[:5] for row in batch))
+            attendance = [(row[1], row[0], row[5], row[6]) for row in batch if row[5] is not None]
+            conn.executemany("INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) "
+                             "VALUES (?, ?, ?, ?)", attendance)
+        counts['shifts'] += len(batch)
+        counts['attendance'] += len(attendance)
+        if progress is not None and counts['shifts'] % (BATCH_SIZE * 20) == 0:
+            progress(f"  смен: {counts['shifts']}, отметок: {counts['attendance']}")
+    # Сводные таблицы пересчитываются сразу, чтобы бенчмарки не платили за это
+    aggregates.refresh_aggregates(conn)
+    # Синтетическая история — исходное состояние, а не изменения
+    change_log.truncate_changes(conn)
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    if progress is not None:
+        progress(f"База {db_path} ({scale}, seed={seed}) создана за {time.perf_counter() - start:.1f} с: {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической базы iRama")
+    parser.add_argument('scale', choices=sorted(SCALES))
+    parser.add_argument('-o', '--output', required=True, help="путь к новой базе")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--employees', type=int, help="переопределить число сотрудников")
+    parser.add_argument('--days', type=int, help="переопределить длину истории, дней")
+    args = parser.parse_args()
+    generate_database(args.output, args.scale, args.seed, args.employees, args.days)
+
+
+if __name__ == '__main__':
+    main()
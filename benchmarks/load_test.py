@@ -0,0 +1,277 @@
+"""Нагрузочный тест HTTP-сервиса отметок.
+
+Запускает service.py отдельным процессом на копии синтетической базы
+(generate_data.py, кэш в benchmarks/data/) и гоняет на него --concurrency
+виртуальных терминалов с keep-alive соединениями. Каждый терминал отмечает
+приход и уход своих сотрудников по их сменам и каждые --search-every
+циклов ищет сотрудника. В конце печатаются устойчивая скорость отметок,
+задержки по операциям со стороны клиента и метрики самого сервиса.
+
+После нагрузки --aborted-downloads клиентов начинают выгрузку отчёта за всю
+историю и сбрасывают соединение. Проверяется, что задания выгрузки
+освобождают рабочие потоки БД: очередь сервиса пустеет, и следующий запрос
+обслуживается.
+
+Запуск: python benchmarks/load_test.py [--scale small] [--concurrency 32] [--duration 10] [--workers 4]
+        [--aborted-downloads 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from generate_data import DEFAULT_SEED, SCALES, SURNAMES, generate_database  # noqa: E402
+from migrations import LATEST_VERSION  # noqa: E402
+from timestamps import from_epoch_day  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+STARTUP_TIMEOUT = 30
+# Сколько ждать, пока оборванные выгрузки освободят рабочие потоки, с
+RECOVERY_TIMEOUT = 15
+# Сколько оборванный клиент не читает ответ перед сбросом соединения, с
+STALL_SECONDS = 1
+
+
+def _dataset(scale, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'irama_{scale}_{seed}_v{LATEST_VERSION}.db')
+    if not os.path.exists(path):
+        generate_database(path + '.part', scale, seed)
+        os.replace(path + '.part', path)
+    return path
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _load_plan(db_path, concurrency, seed):
+    """Смены для каждого терминала: [(employee_id, приход, уход)] без открытых приходов."""
+    conn = sqlite3.connect(db_path)
+    try:
+        day = conn.execute("SELECT MAX(shift_date) FROM shifts").fetchone()[0]
+        rows = conn.execute('''
+            SELECT s.employee_id, s.shift_date, s.start_time, s.end_time FROM shifts s
+            WHERE s.shift_date = ? AND NOT EXISTS (
+                SELECT 1 FROM attendance a WHERE a.shift_id = s.id AND a.check_out_time IS NULL)
+        ''', (day,)).fetchall()
+    finally:
+        conn.close()
+    rng = random.Random(seed)
+    rng.shuffle(rows)
+    plans = [[] for _ in range(concurrency)]
+    for index, (employee_id, shift_date, start_time, end_time) in enumerate(rows):
+        day = from_epoch_day(shift_date)
+        start = datetime.fromisoformat(f"{day} {start_time}")
+        end = datetime.fromisoformat(f"{day} {end_time}")
+        if end <= start:
+            end += timedelta(days=1)
+        # Сотрудник закреплён за одним терминалом: приходы не пересекаются
+        plans[index % concurrency].append((employee_id, (start - timedelta(minutes=5)).strftime("%Y-%m-%d %H:%M"),
+                                           end.strftime("%Y-%m-%d %H:%M")))
+    return plans
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length) if length else b''
+    return status, data
+
+
+async def _terminal(port, plan, deadline, search_every, results, rng):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        cycle = 0
+        while time.perf_counter() < deadline and plan:
+            employee_id, check_in, check_out = plan[cycle % len(plan)]
+            operations = [('checkin', 'POST', '/checkin', {'employee_id': employee_id, 'time': check_in}),
+                          ('checkout', 'POST', '/checkout', {'employee_id': employee_id, 'time': check_out})]
+            if search_every and cycle % search_every == 0:
+                operations.append(('search', 'GET', f"/employees?q={quote(rng.choice(SURNAMES))}&limit=20", None))
+            for name, method, path, payload in operations:
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, method, path, payload)
+                results.append((name, status, time.perf_counter() - start, start))
+            cycle += 1
+    finally:
+        writer.close()
+
+
+async def _run_load(port, plans, duration, search_every, seed):
+    results = []
+    deadline = time.perf_counter() + duration
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    await asyncio.gather(*(_terminal(port, plan, deadline, search_every, results, random.Random(rng.random()))
+                           for plan in plans))
+    elapsed = time.perf_counter() - started
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    _, metrics = await _request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    return results, elapsed, json.loads(metrics)
+
+
+async def _abort_download(port, start_date, end_date):
+    """Начинает выгрузку отчёта, перестаёт читать и сбрасывает соединение (RST).
+
+    Маленький буфер приёма и пауза нужны, чтобы сервер успел упереться в окно
+    неотданных порций до обрыва — как при зависшем клиенте.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(f"GET /report?start={start_date}&end={end_date} HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                 .encode('latin-1'))
+    await reader.readuntil(b'\r\n\r\n')
+    await asyncio.sleep(STALL_SECONDS)
+    writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    writer.transport.abort()
+
+
+async def _run_aborts(port, count, start_date, end_date):
+    """Обрывает count выгрузок; возвращает (время до пустой очереди БД или None, задержка /employees/1)."""
+    started = time.perf_counter()
+    await asyncio.gather(*(_abort_download(port, start_date, end_date) for _ in range(count)))
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        recovered = None
+        while time.perf_counter() - started < RECOVERY_TIMEOUT:
+            _, metrics = await _request(reader, writer, 'GET', '/metrics')
+            if json.loads(metrics)['db_pending'] == 0:
+                recovered = time.perf_counter() - started
+                break
+            await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(_request(reader, writer, 'GET', '/employees/1'), RECOVERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            return recovered, None
+        return recovered, (status, time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def _wait_ready(port, process):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"service.py завершился с кодом {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("service.py не запустился")
+
+
+def _percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса отметок")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--concurrency', type=int, default=32, help="число терминалов")
+    parser.add_argument('--duration', type=float, default=10, help="длительность, с")
+    parser.add_argument('--workers', type=int, default=4, help="потоков БД у сервиса")
+    parser.add_argument('--max-pending', type=int, default=256)
+    parser.add_argument('--search-every', type=int, default=10, help="поиск раз в N циклов (0 — без поиска)")
+    parser.add_argument('--aborted-downloads', type=int, default=5,
+                        help="выгрузок отчёта, оборванных клиентом после нагрузки (0 — без проверки)")
+    parser.add_argument('-o', '--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    dataset = _dataset(args.scale, args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        shutil.copyfile(dataset, db_path)
+        plans = _load_plan(db_path, args.concurrency, args.seed)
+        with sqlite3.connect(db_path) as conn:
+            period = conn.execute("SELECT date(MIN(check_in_time), 'unixepoch'), date(MAX(check_in_time), 'unixepoch') "
+                                  "FROM attendance").fetchone()
+        port = _free_port()
+        env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+        process = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'service.py'), '--db', db_path,
+                                    '--port', str(port), '--workers', str(args.workers),
+                                    '--max-pending', str(args.max_pending)], cwd=workdir, env=env)
+        try:
+            _wait_ready(port, process)
+            results, elapsed, metrics = asyncio.run(
+                _run_load(port, plans, args.duration, args.search_every, args.seed))
+            aborts = (asyncio.run(_run_aborts(port, args.aborted_downloads, *period))
+                      if args.aborted_downloads else None)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                # Сервер с зависшим рабочим потоком БД сам не завершится
+                process.kill()
+                process.wait()
+
+    print(f"{args.concurrency} терминалов, {elapsed:.1f} с, потоков БД: {args.workers}")
+    print(f"{'операция':<10} {'всего':>8} {'в сек':>8} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8}  коды")
+    summary = {}
+    for name in ('checkin', 'checkout', 'search'):
+        entries = [entry for entry in results if entry[0] == name]
+        if not entries:
+            continue
+        latencies = sorted(entry[2] for entry in entries)
+        statuses = {}
+        for entry in entries:
+            statuses[entry[1]] = statuses.get(entry[1], 0) + 1
+        ok = sum(count for status, count in statuses.items() if status < 400)
+        summary[name] = {'count': len(entries), 'ok_per_sec': ok / elapsed,
+                         'p50_ms': _percentile(latencies, 0.5), 'p95_ms': _percentile(latencies, 0.95),
+                         'p99_ms': _percentile(latencies, 0.99), 'statuses': statuses}
+        print(f"{name:<10} {len(entries):8d} {ok / elapsed:8.0f} {summary[name]['p50_ms']:8.1f} "
+              f"{summary[name]['p95_ms']:8.1f} {summary[name]['p99_ms']:8.1f}  {statuses}")
+    print(f"Сервер: отклонено по переполнению {metrics['rejected']}, приходов записано "
+          f"{metrics['attendance_written']} в {metrics['attendance_batches']} транзакциях")
+    for route, stats in metrics['routes'].items():
+        print(f"  /{route:<10} p50 {stats['p50_ms']} мс, p99 {stats['p99_ms']} мс, max {stats['max_ms']} мс")
+    if aborts is not None:
+        recovered, probe = aborts
+        print(f"Оборвано выгрузок: {args.aborted_downloads}; очередь БД "
+              + (f"освободилась за {recovered:.2f} с" if recovered is not None else
+                 f"НЕ освободилась за {RECOVERY_TIMEOUT} с")
+              + ("; /employees/1: " + (f"{probe[0]} за {probe[1] * 1000:.1f} мс" if probe else "нет ответа")))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'concurrency': args.concurrency, 'workers': args.workers, 'elapsed': elapsed,
+                       'client': summary, 'server': metrics, 'aborted_downloads': aborts}, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
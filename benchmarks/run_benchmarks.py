@@ -0,0 +1,241 @@
+"""Набор бенчмарков слоя данных iRama с результатами в JSON.
+
+Синтетическая база нужного масштаба строится generate_data.py один раз и
+кэшируется в benchmarks/data/; каждый бенчмарк работает с её свежей
+копией, поэтому записи одного теста не влияют на другие. Замеряются
+настоящие точки входа: main.add_employee, main.add_attendance,
+search.search_employees (поиск в IRamaApp), EmployeeTableModel
+(IRamaApp.load_employees), main.generate_attendance_report,
+backup.create_backup и backup.restore_backup.
+
+Запуск: python benchmarks/run_benchmarks.py --scale small [--only search_employees] [--compare old.json]
+"""
+import argparse
+import calendar
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import attendance_buffer  # noqa: E402
+import backup  # noqa: E402
+import database  # noqa: E402
+import log_config  # noqa: E402
+import main as irama_main  # noqa: E402
+from employee_table import EmployeeTableModel  # noqa: E402
+from generate_data import DEFAULT_SEED, FIRST_DAY, SCALES, generate_database  # noqa: E402
+from migrations import LATEST_VERSION  # noqa: E402
+from search import search_employees  # noqa: E402
+from timestamps import from_epoch_day  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+SEARCH_QUERIES = ["Иванов", "Склад", "+79123", "ivanov", "bdfyjd", "Ив", "Петрова Анна"]
+# Изменение медианы больше чем на столько считается регрессией/улучшением при --compare
+COMPARE_THRESHOLD = 0.10
+
+
+def _dataset(scale, seed):
+    """Путь к кэшированной базе масштаба scale (создаётся при первом запуске)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Версия схемы в имени: после миграции кэш строится заново
+    path = os.path.join(DATA_DIR, f'irama_{scale}_{seed}_v{LATEST_VERSION}.db')
+    if not os.path.exists(path):
+        generate_database(path + '.part', scale, seed)
+        os.replace(path + '.part', path)
+    return path
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_add_employee(conn, rng, count=200):
+    for i in range(count):
+        irama_main.add_employee("Бенчмарков", f"Сотрудник{i}", "Тестович", "Основной", rng.choice(["Склад", "Охрана"]))
+    return count
+
+
+def bench_add_attendance(conn, rng, count=200):
+    max_shift = conn.execute("SELECT MAX(id) FROM shifts").fetchone()[0]
+    shifts = [conn.execute("SELECT id, employee_id, shift_date FROM shifts WHERE id = ?",
+                           (rng.randint(1, max_shift),)).fetchone() for _ in range(count)]
+    start = time.perf_counter()
+    for shift_id, employee_id, shift_date in shifts:
+        day = from_epoch_day(shift_date)
+        irama_main.add_attendance(employee_id, shift_id, f"{day} 09:00", f"{day} 18:00")
+    # Выборка смен не входит в замер
+    return count, time.perf_counter() - start
+
+
+def bench_search(conn, rng):
+    for text in SEARCH_QUERIES:
+        search_employees(text, conn=conn)
+    return len(SEARCH_QUERIES)
+
+
+def bench_load_employees(conn, rng, pages=5):
+    """Первая страница и прокрутка, затем сортировка по ФИО (как в IRamaApp)."""
+    model = EmployeeTableModel(conn)
+    for _ in range(pages):
+        model.next_page()
+    model.set_sort('name')
+    for _ in range(pages):
+        model.next_page()
+    return pages * 2
+
+
+def bench_attendance_report(conn, rng, workdir):
+    output = os.path.join(workdir, 'report.csv')
+    last_day = FIRST_DAY.replace(day=calendar.monthrange(FIRST_DAY.year, FIRST_DAY.month)[1])
+    return irama_main.generate_attendance_report(FIRST_DAY.replace(day=1).isoformat(), last_day.isoformat(),
+                                                 output=output)
+
+
+def bench_create_backup(conn, rng, workdir):
+    path = backup.create_backup(database.DB_PATH, os.path.join(workdir, 'backups'))
+    if path is None:
+        raise RuntimeError("create_backup failed")
+    return 1
+
+
+def bench_restore_backup(conn, rng, workdir, backup_path):
+    if not backup.restore_backup(backup_path, database.DB_PATH):
+        raise RuntimeError("restore_backup failed")
+    return 1
+
+
+# Имя → (функция, число повторов); функции с workdir получают рабочий каталог
+BENCHMARKS = {
+    'add_employee': (bench_add_employee, 3),
+    'add_attendance': (bench_add_attendance, 3),
+    'search_employees': (bench_search, 5),
+    'load_employees': (bench_load_employees, 5),
+    'generate_attendance_report': (bench_attendance_report, 3),
+    'create_backup': (bench_create_backup, 3),
+    'restore_backup': (bench_restore_backup, 3),
+}
+
+
+def _run_one(name, dataset, seed):
+    func, repeat = BENCHMARKS[name]
+    runs = []
+    ops = None
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'irama.db')
+        shutil.copyfile(dataset, db_path)
+        database.DB_PATH = db_path
+        conn = database.get_connection(db_path)
+        extra = {}
+        if name in ('generate_attendance_report', 'create_backup', 'restore_backup'):
+            extra['workdir'] = workdir
+        if name == 'restore_backup':
+            extra['backup_path'] = backup.create_backup(db_path, os.path.join(workdir, 'source'))
+        rng = random.Random(seed)
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = func(conn, rng, **extra)
+                elapsed = time.perf_counter() - start
+                if isinstance(result, tuple):
+                    result, elapsed = result
+                runs.append(elapsed)
+                ops = result
+        finally:
+            # Буфер отметок (main.add_attendance) пишет в базу и журнал во
+            # временном каталоге: закрываем его до удаления каталога
+            attendance_buffer.close_buffer()
+            database.close_all_connections()
+    median = statistics.median(runs)
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': median,
+        'mean': statistics.fmean(runs),
+        'operations': ops,
+        'ops_per_sec': ops / median if ops and median else None,
+    }
+
+
+def compare(current, baseline):
+    """Печатает изменение медиан относительно прошлого результата."""
+    print(f"\nСравнение с {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        ratio = result['median'] / old['median'] if old['median'] else float('inf')
+        mark = ''
+        if ratio > 1 + COMPARE_THRESHOLD:
+            mark = '  ← медленнее'
+        elif ratio < 1 - COMPARE_THRESHOLD:
+            mark = '  ← быстрее'
+        print(f"  {name:<28} {old['median'] * 1000:10.1f} → {result['median'] * 1000:10.1f} мс  ×{ratio:.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки слоя данных iRama")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="запустить только эти бенчмарки")
+    parser.add_argument('-o', '--output', help="файл JSON (по умолчанию benchmarks/results/...)")
+    parser.add_argument('--compare', help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    dataset = _dataset(args.scale, args.seed)
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'scale': args.scale,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'results': {},
+    }
+    # Журнал включён, как в приложении, но пишется во временный каталог
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_config.setup_logging(os.path.join(log_dir, 'irama.log'),
+                                 slow_log_path=os.path.join(log_dir, 'irama_slow.log'))
+        try:
+            for name in args.only or BENCHMARKS:
+                result = _run_one(name, dataset, args.seed)
+                report['results'][name] = result
+                ops = f"{result['ops_per_sec']:10.1f} оп/с" if result['ops_per_sec'] else ''
+                print(f"{name:<28} медиана {result['median'] * 1000:10.1f} мс {ops}")
+        finally:
+            log_config.shutdown_logging()
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{commit or 'nogit'}_{args.scale}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Пакетная загрузка сотрудников, смен и посещаемости из CSV.
+
+Файл читается потоково, порциями по chunk_size строк. Каждая порция
+проверяется целиком (те же правила, что и в IRamaApp), корректные строки
+записываются через executemany в одной транзакции, а отклонённые строки
+с причиной попадают в отдельный CSV, не прерывая загрузку. Смены, кроме
+того, проверяются на пересечения и межсменный отдых (schedule.py).
+
+Запуск: python bulk_import.py attendance turnstile.csv --rejects rejected.csv
+"""
+import argparse
+import csv
+import logging
+import sqlite3
+import time
+from itertools import islice
+
+from database import after_transaction, get_connection, transaction
+from log_config import setup_logging
+from repository import get_repository
+from timestamps import to_epoch, to_epoch_day
+import schedule
+import validators
+
+logger = logging.getLogger('iRama.bulk_import')
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _clean(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _prepare_employee(row):
+    """Возвращает (параметры INSERT, None) или (None, причина отказа)."""
+    surname = _clean(row, 'surname')
+    name = _clean(row, 'name')
+    patronymic = _clean(row, 'patronymic')
+    status = _clean(row, 'status')
+    department = _clean(row, 'department')
+    date_of_birth = _clean(row, 'date_of_birth')
+    phone_number = _clean(row, 'phone_number')
+    if not (surname and name and department and status):
+        return None, "Не заполнены обязательные поля"
+    if not validators.validate_date(date_of_birth):
+        return None, "Некорректный формат даты! Используйте дд.мм.гггг."
+    if not validators.validate_phone(phone_number):
+        return None, "Некорректный номер телефона!"
+    full_name = f"{surname} {name} {patronymic}" if patronymic else f"{surname} {name}"
+    return (full_name, status, department, date_of_birth, _clean(row, 'city'),
+            phone_number, _clean(row, 'passport_data')), None
+
+
+def _prepare_shift(row):
+    employee_id = _clean(row, 'employee_id')
+    shift_date = _clean(row, 'shift_date')
+    start_time = _clean(row, 'start_time')
+    end_time = _clean(row, 'end_time')
+    if not (employee_id and employee_id.isdigit()):
+        return None, "Некорректный employee_id"
+    if not validators.validate_iso_date(shift_date):
+        return None, "Некорректная дата смены (гггг-мм-дд)"
+    if not (validators.validate_time(start_time) and validators.validate_time(end_time)):
+        return None, "Некорректное время смены (чч:мм)"
+    return (int(employee_id), to_epoch_day(shift_date), start_time, end_time), None
+
+
+def _prepare_attendance(row):
+    employee_id = _clean(row, 'employee_id')
+    shift_id = _clean(row, 'shift_id')
+    check_in_time = _clean(row, 'check_in_time')
+    check_out_time = _clean(row, 'check_out_time')
+    if not (employee_id and employee_id.isdigit() and shift_id and shift_id.isdigit()):
+        return None, "Некорректный employee_id или shift_id"
+    if not validators.validate_datetime(check_in_time):
+        return None, "Некорректное время прихода (гггг-мм-дд чч:мм)"
+    check_in = to_epoch(check_in_time)
+    check_out = None
+    if check_out_time is not None:
+        if not validators.validate_datetime(check_out_time):
+            return None, "Некорректное время ухода (гггг-мм-дд чч:мм)"
+        check_out = to_epoch(check_out_time)
+        if check_out < check_in:
+            return None, "Уход раньше прихода"
+    return (int(employee_id), int(shift_id), check_in, check_out), None
+
+
+# Описание поддерживаемых таблиц: подготовка строки и INSERT
+IMPORTERS = {
+    'employees': (
+        _prepare_employee,
+        '''INSERT INTO employees (name, status, department, date_of_birth, city, phone_number, passport_data)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+    ),
+    'shifts': (
+        _prepare_shift,
+        '''INSERT INTO shifts (employee_id, shift_date, start_time, end_time) VALUES (?, ?, ?, ?)''',
+    ),
+    'attendance': (
+        _prepare_attendance,
+        '''INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)''',
+    ),
+}
+
+
+class ImportResult:
+    """Итог загрузки."""
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"ImportResult(inserted={self.inserted}, rejected={self.rejected}, elapsed={self.elapsed:.2f}s)"
+
+
+def validate_batch(kind, rows):
+    """Проверяет порцию строк; возвращает (корректные параметры, [(строка, причина)])."""
+    prepare = IMPORTERS[kind][0]
+    valid, rejected = [], []
+    for row in rows:
+        params, error = prepare(row)
+        if error is None:
+            valid.append((row, params))
+        else:
+            rejected.append((row, error))
+    return valid, rejected
+
+
+def _check_shift_schedule(conn, valid):
+    """Отклоняет смены, пересекающиеся между собой или со сменами в базе."""
+    accepted, conflicts = schedule.filter_roster([params for _, params in valid], conn)
+    rejected = [(valid[index][0], "; ".join(c.message for c in found)) for index, found in conflicts.items()]
+    return [valid[index] for index in accepted], rejected
+
+
+# Проверки порции целиком (после построчной подготовки)
+CHUNK_CHECKS = {
+    'shifts': _check_shift_schedule,
+}
+
+
+def _write_chunk(conn, sql, valid):
+    """Пишет порцию через executemany; при нарушении ограничений — построчно.
+
+    Возвращает список отклонённых базой строк.
+    """
+    try:
+        with transaction(conn):
+            conn.executemany(sql, (params for _, params in valid))
+        return []
+    except sqlite3.IntegrityError:
+        pass
+    # Порция откатилась целиком: находим конкретные строки-нарушители
+    rejected = []
+    with transaction(conn):
+        for row, params in valid:
+            conn.execute("SAVEPOINT bulk_row")
+            try:
+                conn.execute(sql, params)
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK TO bulk_row")
+                rejected.append((row, str(e)))
+            conn.execute("RELEASE bulk_row")
+    return rejected
+
+
+def import_rows(kind, rows, chunk_size=DEFAULT_CHUNK_SIZE, on_reject=None, conn=None):
+    """Загружает итерируемые строки-словари в таблицу kind."""
+    if kind not in IMPORTERS:
+        raise ValueError(f"Неизвестный тип данных: {kind}")
+    sql = IMPORTERS[kind][1]
+    conn = conn or get_connection()
+    result = ImportResult()
+    start = time.perf_counter()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        valid, rejected = validate_batch(kind, chunk)
+        if valid and kind in CHUNK_CHECKS:
+            valid, check_rejected = CHUNK_CHECKS[kind](conn, valid)
+            rejected.extend(check_rejected)
+        if valid:
+            db_rejected = _write_chunk(conn, sql, valid)
+            result.inserted += len(valid) - len(db_rejected)
+            rejected.extend(db_rejected)
+        result.rejected += len(rejected)
+        if on_reject is not None:
+            for row, reason in rejected:
+                on_reject(row, reason)
+    if kind == 'employees' and result.inserted:
+        # Новые имена могли быть закэшированы как отсутствующие; если импорт
+        # идёт внутри транзакции вызывающего, кэш сбрасывается и после неё
+        get_repository().clear()
+        after_transaction(conn, get_repository().clear)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def import_csv(kind, csv_path, rejects_path=None, chunk_size=DEFAULT_CHUNK_SIZE, conn=None):
+    """Потоково загружает CSV-файл; отклонённые строки пишет в rejects_path."""
+    rejects_file = None
+    rejects_writer = None
+
+    def on_reject(row, reason):
+        nonlocal rejects_file, rejects_writer
+        if rejects_path is None:
+            return
+        if rejects_writer is None:
+            rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8')
+            rejects_writer = csv.DictWriter(rejects_file, fieldnames=list(row.keys()) + ['reason'],
+                                            extrasaction='ignore')
+            rejects_writer.writeheader()
+        rejects_writer.writerow({**row, 'reason': reason})
+
+    try:
+        with open(csv_path, newline='', encoding='utf-8-sig') as file:
+            result = import_rows(kind, csv.DictReader(file), chunk_size, on_reject, conn)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+    logger.info(f"Загрузка {kind} из {csv_path}: добавлено {result.inserted}, "
+                f"отклонено {result.rejected} за {result.elapsed:.2f} с",
+                extra={'elapsed_ms': round(result.elapsed * 1000, 1), 'rows': result.inserted,
+                       'rejected': result.rejected})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная загрузка данных iRama из CSV")
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('csv_path')
+    parser.add_argument('--rejects', help="CSV для отклонённых строк")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    setup_logging()
+    result = import_csv(args.kind, args.csv_path, args.rejects, args.chunk_size)
+    print(f"Добавлено: {result.inserted}, отклонено: {result.rejected}, время: {result.elapsed:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""Журнал изменений (change data capture) для выгрузки и синхронизации.
+
+Триггеры на employees, shifts и attendance добавляют в change_log по строке
+на каждое изменение: номер (seq), операция ('I', 'U', 'D'), таблица, id
+строки, время (секунды) и для 'U' — изменённые столбцы через запятую.
+Значения не копируются: потребитель читает актуальную строку по id, а если
+её уже нет — строка удалена (удаление придёт в журнале позже). Каскадные
+удаления смен и отметок вместе с сотрудником попадают в журнал отдельными
+строками.
+
+Записи SQLite идут по одной, поэтому порядок seq совпадает с порядком
+фиксации транзакций, и номер последней прочитанной записи — надёжный
+курсор. Потребители (payroll, BI) регистрируются в change_consumers и
+подтверждают прочитанное; prune_changes() удаляет записи, подтверждённые
+всеми. Курсор старше удалённых записей устарел (CursorExpired): такому
+потребителю нужна полная выгрузка и новый курсор из current_cursor().
+
+Запуск: python change_log.py since 0 [--consumer payroll] [--batch-size 1000] [--db irama.db]
+        python change_log.py register payroll | unregister payroll | ack payroll 1200 | consumers | cursor
+        python change_log.py prune [--older-than-days 90]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from database import get_connection, transaction
+from log_config import setup_logging
+
+logger = logging.getLogger('iRama.change_log')
+
+DEFAULT_BATCH_SIZE = 1000
+# Отслеживаемые таблицы и столбцы, изменения которых попадают в журнал
+CAPTURED_TABLES = {
+    'employees': ('name', 'status', 'department', 'date_of_birth', 'city', 'phone_number', 'passport_data'),
+    'shifts': ('employee_id', 'shift_date', 'start_time', 'end_time'),
+    'attendance': ('employee_id', 'shift_id', 'check_in_time', 'check_out_time'),
+}
+CHANGE_COLUMNS = ('seq', 'op', 'table_name', 'row_id', 'changed_at', 'columns')
+
+
+class CursorExpired(Exception):
+    """Записи после курсора уже удалены из журнала; нужна полная выгрузка."""
+
+
+def create_change_log_schema(conn):
+    """Создаёт журнал, таблицу потребителей и триггеры (вызывается из миграции)."""
+    # AUTOINCREMENT: номера не используются повторно, даже если журнал очищен целиком
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            changed_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            columns TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            name TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL,
+            acknowledged_at INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pruned_through INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO change_log_state (id, pruned_through) VALUES (1, 0)")
+    for table, columns in CAPTURED_TABLES.items():
+        changed = ' OR '.join(f"old.{c} IS NOT new.{c}" for c in columns)
+        names = ' || '.join(f"CASE WHEN old.{c} IS NOT new.{c} THEN '{c},' ELSE '' END" for c in columns)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table} BEGIN "
+                     f"INSERT INTO change_log (op, table_name, row_id) VALUES ('I', '{table}', new.id); END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table} BEGIN "
+                     f"INSERT INTO change_log (op, table_name, row_id) VALUES ('D', '{table}', old.id); END")
+        # Обновление без фактических изменений в журнал не попадает
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE ON {table} "
+                     f"WHEN {changed} BEGIN "
+                     f"INSERT INTO change_log (op, table_name, row_id, columns) "
+                     f"VALUES ('U', '{table}', new.id, rtrim({names}, ',')); END")
+
+
+def current_cursor(conn=None):
+    """Номер последней записи журнала (0, если записей ещё не было)."""
+    conn = conn or get_connection()
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def _pruned_through(conn):
+    return conn.execute("SELECT pruned_through FROM change_log_state WHERE id = 1").fetchone()[0]
+
+
+def changes_since(cursor, batch_size=DEFAULT_BATCH_SIZE, tables=None, conn=None):
+    """Генератор порций изменений после cursor (списков кортежей CHANGE_COLUMNS).
+
+    Читаются записи, сделанные до вызова: при непрерывной записи выгрузка
+    всё равно заканчивается. tables — необязательный список таблиц. Если
+    записи после cursor уже удалены, бросает CursorExpired.
+    """
+    conn = conn or get_connection()
+    end = current_cursor(conn)
+    sql = f"SELECT {', '.join(CHANGE_COLUMNS)} FROM change_log WHERE seq > ? AND seq <= ?"
+    filters = []
+    if tables:
+        unknown = set(tables) - set(CAPTURED_TABLES)
+        if unknown:
+            raise ValueError(f"Таблицы не отслеживаются: {', '.join(sorted(unknown))}")
+        sql += f" AND table_name IN ({', '.join('?' * len(tables))})"
+        filters = list(tables)
+    sql += " ORDER BY seq LIMIT ?"
+    while cursor < end:
+        # Проверка на каждой порции: журнал могут очистить между порциями
+        if cursor < _pruned_through(conn):
+            raise CursorExpired(f"записи до {_pruned_through(conn)} удалены, курсор {cursor} устарел")
+        batch = conn.execute(sql, [cursor, end, *filters, batch_size]).fetchall()
+        if not batch:
+            break
+        yield batch
+        cursor = batch[-1][0]
+
+
+def register_consumer(name, cursor=None, conn=None):
+    """Регистрирует потребителя с курсором (по умолчанию — текущим); возвращает курсор."""
+    conn = conn or get_connection()
+    with transaction(conn, 'IMMEDIATE'):
+        cursor = current_cursor(conn) if cursor is None else cursor
+        if cursor < _pruned_through(conn):
+            raise CursorExpired(f"курсор {cursor} старше удалённых записей")
+        conn.execute('''
+            INSERT INTO change_consumers (name, cursor, acknowledged_at)
+            VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (name) DO UPDATE SET cursor = excluded.cursor, acknowledged_at = excluded.acknowledged_at
+        ''', (name, cursor))
+    logger.info(f"Потребитель изменений {name} зарегистрирован с курсором {cursor}")
+    return cursor
+
+
+def unregister_consumer(name, conn=None):
+    """Удаляет потребителя: его курсор больше не удерживает журнал."""
+    conn = conn or get_connection()
+    with transaction(conn):
+        return conn.execute("DELETE FROM change_consumers WHERE name = ?", (name,)).rowcount > 0
+
+
+def consumer_cursor(name, conn=None):
+    """Подтверждённый курсор потребителя или None, если он не зарегистрирован."""
+    conn = conn or get_connection()
+    row = conn.execute("SELECT cursor FROM change_consumers WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def acknowledge(name, cursor, conn=None):
+    """Подтверждает, что потребитель обработал записи до cursor включительно."""
+    conn = conn or get_connection()
+    with transaction(conn, 'IMMEDIATE'):
+        if cursor > current_cursor(conn):
+            raise ValueError(f"курсор {cursor} больше последней записи журнала")
+        # Курсор только растёт: повторное подтверждение старой порции его не откатит
+        updated = conn.execute('''
+            UPDATE change_consumers SET cursor = MAX(cursor, ?), acknowledged_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE name = ?
+        ''', (cursor, name)).rowcount
+    if not updated:
+        raise KeyError(f"потребитель {name} не зарегистрирован")
+
+
+def list_consumers(conn=None):
+    """[(имя, курсор, время подтверждения, записей после курсора)]."""
+    conn = conn or get_connection()
+    return conn.execute('''
+        SELECT name, cursor, acknowledged_at, (SELECT COUNT(*) FROM change_log WHERE seq > c.cursor)
+        FROM change_consumers c ORDER BY name
+    ''').fetchall()
+
+
+def prune_changes(older_than_days=None, conn=None):
+    """Удаляет записи, подтверждённые всеми потребителями; возвращает их число.
+
+    Без потребителей журнал не очищается. older_than_days дополнительно
+    удаляет записи старше стольких дней, даже неподтверждённые: отставшие
+    потребители получат CursorExpired.
+    """
+    conn = conn or get_connection()
+    start = time.perf_counter()
+    with transaction(conn, 'IMMEDIATE'):
+        through = conn.execute("SELECT MIN(cursor) FROM change_consumers").fetchone()[0] or 0
+        if older_than_days is not None:
+            cutoff = int(time.time()) - older_than_days * 86400
+            old = conn.execute("SELECT MAX(seq) FROM change_log WHERE changed_at < ?", (cutoff,)).fetchone()[0]
+            through = max(through, old or 0)
+        deleted = conn.execute("DELETE FROM change_log WHERE seq <= ?", (through,)).rowcount
+        conn.execute("UPDATE change_log_state SET pruned_through = MAX(pruned_through, ?) WHERE id = 1", (through,))
+    elapsed = time.perf_counter() - start
+    logger.info(f"Журнал изменений очищен до {through}: удалено {deleted}",
+                extra={'elapsed_ms': round(elapsed * 1000, 1), 'rows': deleted})
+    return deleted
+
+
+def truncate_changes(conn=None):
+    """Удаляет весь журнал (после начальной загрузки данных); возвращает число записей."""
+    conn = conn or get_connection()
+    with transaction(conn, 'IMMEDIATE'):
+        through = current_cursor(conn)
+        deleted = conn.execute("DELETE FROM change_log").rowcount
+        conn.execute("UPDATE change_log_state SET pruned_through = ? WHERE id = 1", (through,))
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Журнал изменений iRama")
+    parser.add_argument('--db', help="путь к базе (по умолчанию irama.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    since = commands.add_parser('since', help="изменения после курсора в формате JSON Lines")
+    since.add_argument('cursor', type=int, nargs='?')
+    since.add_argument('--consumer', help="взять курсор потребителя и подтвердить выгруженное")
+    since.add_argument('--table', action='append', choices=sorted(CAPTURED_TABLES))
+    since.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    register = commands.add_parser('register', help="зарегистрировать потребителя")
+    register.add_argument('name')
+    register.add_argument('--cursor', type=int)
+    unregister = commands.add_parser('unregister', help="удалить потребителя")
+    unregister.add_argument('name')
+    ack = commands.add_parser('ack', help="подтвердить обработку до курсора")
+    ack.add_argument('name')
+    ack.add_argument('cursor', type=int)
+    commands.add_parser('consumers', help="список потребителей")
+    prune = commands.add_parser('prune', help="удалить подтверждённые записи")
+    prune.add_argument('--older-than-days', type=int)
+    commands.add_parser('cursor', help="номер последней записи")
+    args = parser.parse_args()
+    setup_logging()
+    conn = get_connection(args.db)
+
+    if args.command == 'since':
+        cursor = args.cursor
+        if args.consumer is not None:
+            cursor = consumer_cursor(args.consumer, conn)
+            if cursor is None:
+                parser.error(f"потребитель {args.consumer} не зарегистрирован")
+        if cursor is None:
+            parser.error("нужен курсор или --consumer")
+        try:
+            for batch in changes_since(cursor, args.batch_size, args.table, conn):
+                for row in batch:
+                    change = dict(zip(CHANGE_COLUMNS, row))
+                    change['columns'] = change['columns'].split(',') if change['columns'] else None
+                    sys.stdout.write(json.dumps(change, ensure_ascii=False) + '\n')
+                sys.stdout.flush()
+                # Подтверждается порция, уже записанная в вывод
+                if args.consumer is not None:
+                    acknowledge(args.consumer, batch[-1][0], conn)
+        except CursorExpired as e:
+            print(f"Курсор устарел: {e}", file=sys.stderr)
+            raise SystemExit(2)
+    elif args.command == 'register':
+        print(register_consumer(args.name, args.cursor, conn))
+    elif args.command == 'unregister':
+        if not unregister_consumer(args.name, conn):
+            parser.error(f"потребитель {args.name} не зарегистрирован")
+    elif args.command == 'ack':
+        acknowledge(args.name, args.cursor, conn)
+    elif args.command == 'consumers':
+        for name, cursor, acknowledged_at, pending in list_consumers(conn):
+            print(f"{name}: курсор {cursor}, не прочитано {pending}")
+    elif args.command == 'prune':
+        print(f"Удалено записей: {prune_changes(args.older_than_days, conn)}")
+    else:
+        print(current_cursor(conn))
+
+
+if __name__ == '__main__':
+    main()
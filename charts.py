@@ -0,0 +1,265 @@
+"""Графики посещаемости для вкладки «Отчёты».
+
+Данные берутся из сводных таблиц (aggregates.py), а не из отметок: ряды уже
+сведены по дням и месяцам, а длинные периоды дополнительно сводятся в
+интервалы по несколько дней, чтобы точек было не больше, чем помещается по
+ширине картинки. Картинка рисуется бэкендом Agg через объектный API
+matplotlib (Figure, без pyplot и его глобального состояния), поэтому её
+можно строить в рабочем потоке DBExecutor, а в поток Tk передаются только
+готовые байты PNG.
+
+Готовые PNG хранятся в ChartCache по ключу (тип графика, фильтры, версия
+сводок). Версия (aggregates.stats_version) растёт при каждом пересчёте
+сводок, так что повторное открытие графика берёт картинку из кэша, пока
+данные не изменились.
+
+Запуск: python charts.py daily_headcount 2025-01-01 2025-12-31 -o chart.png [--department ИТ] [--size 900x400]
+"""
+import argparse
+import io
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from aggregates import refresh_aggregates, stats_version
+from database import get_connection
+from log_config import setup_logging
+from timestamps import from_epoch_day, to_epoch_day
+
+logger = logging.getLogger('iRama.charts')
+
+DEFAULT_SIZE = (900, 400)
+DPI = 100
+# Не больше одной точки ряда на столько пикселей ширины
+PIXELS_PER_POINT = 2
+# Столбцов на графике отделов; остальные отделы суммируются в «Прочие»
+MAX_BARS = 15
+DEFAULT_CACHE_ENTRIES = 64
+
+CHART_TITLES = {
+    'department_hours': "Отработанные часы по отделам",
+    'daily_headcount': "Сотрудников на работе в день",
+    'lateness_trend': "Опоздания, % отработанных смен",
+}
+
+
+def _matplotlib():
+    """Классы Figure и FigureCanvasAgg; matplotlib загружается при первом графике."""
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+    except ImportError:  # графики необязательны
+        raise RuntimeError("Для графиков нужен matplotlib: pip install matplotlib") from None
+    return Figure, FigureCanvasAgg
+
+
+def bin_width(start_date, end_date, max_points):
+    """Число дней в интервале, при котором за период выйдет не больше max_points точек."""
+    days = to_epoch_day(end_date) - to_epoch_day(start_date) + 1
+    return max(1, -(-days // max(1, max_points)))
+
+
+def _department_hours(conn, start_date, end_date, department, max_points):
+    sql = '''
+        SELECT IFNULL(department, '') AS department_name, SUM(hours_worked) AS hours
+        FROM department_monthly_stats
+        WHERE month BETWEEN ? AND ?
+    '''
+    params = [start_date[:7], end_date[:7]]
+    if department is not None:
+        sql += " AND department = ?"
+        params.append(department)
+    sql += " GROUP BY department_name ORDER BY hours DESC, department_name"
+    rows = [(name or "Без отдела", hours) for name, hours in conn.execute(sql, params)]
+    if len(rows) > MAX_BARS:
+        rest = sum(hours for _, hours in rows[MAX_BARS - 1:])
+        rows = rows[:MAX_BARS - 1] + [("Прочие", rest)]
+    return rows
+
+
+# Итоги по дням (из покрывающего индекса, без чтения строк таблицы) сводятся
+# в интервалы по width дней, считая от first
+_DAILY_BINS_SQL = '''
+    SELECT (CAST(strftime('%s', day) AS INTEGER) / 86400 - ?) / ? AS bucket, {value}
+    FROM (SELECT day, {daily} FROM employee_daily_stats WHERE day BETWEEN ? AND ?{department} GROUP BY day)
+    GROUP BY bucket
+'''
+
+
+def _daily_bins(conn, daily, value, start_date, end_date, department, max_points):
+    """[(начало интервала, значение или None, дней в интервале)] для всех интервалов периода."""
+    first = to_epoch_day(start_date)
+    days = to_epoch_day(end_date) - first + 1
+    width = bin_width(start_date, end_date, max_points)
+    params = [first, width, start_date, end_date]
+    if department is not None:
+        params.append(department)
+    sql = _DAILY_BINS_SQL.format(daily=daily, value=value, department=" AND department = ?" if department is not None else "")
+    values = dict(conn.execute(sql, params).fetchall())
+    return [(date.fromisoformat(from_epoch_day(first + bucket * width)), values.get(bucket),
+             min(width, days - bucket * width))
+            for bucket in range(-(-days // width))]
+
+
+def _daily_headcount(conn, start_date, end_date, department, max_points):
+    # Пришедшим считается сотрудник с отработанными часами или отметкой без ухода
+    bins = _daily_bins(conn, "SUM(hours_worked > 0 OR missing_checkouts > 0) AS present", "SUM(present)",
+                       start_date, end_date, department, max_points)
+    # Среднее за день интервала: дни без отметок в сводках отсутствуют и дают ноль
+    return [(day, (total or 0) / days) for day, total, days in bins]
+
+
+def _lateness_trend(conn, start_date, end_date, department, max_points):
+    bins = _daily_bins(conn, "SUM(late_arrivals) AS late, SUM(shifts_attended) AS attended",
+                       "100.0 * SUM(late) / NULLIF(SUM(attended), 0)", start_date, end_date, department, max_points)
+    return [(day, share) for day, share, _ in bins]
+
+
+CHART_DATA = {
+    'department_hours': _department_hours,
+    'daily_headcount': _daily_headcount,
+    'lateness_trend': _lateness_trend,
+}
+
+
+def chart_data(chart, start_date, end_date, department=None, max_points=DEFAULT_SIZE[0] // PIXELS_PER_POINT,
+               conn=None):
+    """Точки графика chart за период ('гггг-мм-дд' включительно) из сводных таблиц."""
+    if chart not in CHART_DATA:
+        raise ValueError(f"Неизвестный график: {chart}")
+    conn = conn or get_connection()
+    return CHART_DATA[chart](conn, start_date, end_date, department, max_points)
+
+
+def render_png(chart, points, size=DEFAULT_SIZE, subtitle=None):
+    """Рисует точки графика в PNG (байты) размером size пикселей."""
+    Figure, FigureCanvasAgg = _matplotlib()
+    figure = Figure(figsize=(size[0] / DPI, size[1] / DPI), dpi=DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    title = CHART_TITLES[chart]
+    axes.set_title(f"{title}\n{subtitle}" if subtitle else title, fontsize=10)
+    if not points:
+        axes.text(0.5, 0.5, "Нет данных за период", ha='center', va='center', transform=axes.transAxes)
+        axes.set_axis_off()
+    elif chart == 'department_hours':
+        labels, hours = zip(*reversed(points))
+        axes.barh(labels, hours, color='#4c72b0')
+        axes.set_xlabel("часы")
+        axes.tick_params(axis='y', labelsize=8)
+    else:
+        days, values = zip(*points)
+        values = [float('nan') if value is None else value for value in values]
+        axes.plot(days, values, color='#4c72b0', linewidth=1)
+        axes.set_ylim(bottom=0)
+        axes.grid(True, alpha=0.3)
+        figure.autofmt_xdate()
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """LRU-кэш готовых PNG по ключу (тип, фильтры, версия сводок)."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """PNG по ключу или None."""
+        with self._lock:
+            png = self._images.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            # Картинки прежних версий тех же графиков больше не понадобятся
+            for old in [old for old in self._images if old[:-1] == key[:-1] and old[-1] != key[-1]]:
+                del self._images[old]
+            self._images[key] = png
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+    def stats(self):
+        """Счётчики кэша: попадания, промахи и число картинок."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'images': len(self._images),
+                    'max_entries': self.max_entries}
+
+
+def cache_key(chart, start_date, end_date, department=None, size=DEFAULT_SIZE, version=None):
+    """Ключ кэша; версия сводок — последний элемент."""
+    return chart, start_date, end_date, department, tuple(size), version
+
+
+_shared_cache = ChartCache()
+
+
+def get_chart_cache():
+    """Общий кэш графиков процесса."""
+    return _shared_cache
+
+
+def render_chart(chart, start_date, end_date, department=None, size=DEFAULT_SIZE, cache=None, conn=None):
+    """Возвращает (версия сводок, PNG) графика; повторный вызов без изменений данных — из кэша.
+
+    Выполняется вне потока Tk: пересчитывает помеченные дни сводок, сверяет
+    версию и рисует картинку только при промахе кэша.
+    """
+    if chart not in CHART_DATA:
+        raise ValueError(f"Неизвестный график: {chart}")
+    conn = conn or get_connection()
+    cache = cache or get_chart_cache()
+    refresh_aggregates(conn)
+    version = stats_version(conn)
+    key = cache_key(chart, start_date, end_date, department, size, version)
+    png = cache.get(key)
+    if png is not None:
+        return version, png
+    points = chart_data(chart, start_date, end_date, department, size[0] // PIXELS_PER_POINT, conn)
+    subtitle = f"{start_date} – {end_date}" + (f", {department}" if department else "")
+    png = render_png(chart, points, size, subtitle)
+    cache.put(key, png)
+    logger.info(f"График {chart} за {start_date} – {end_date}: {len(points)} точек")
+    return version, png
+
+
+def _size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Графики посещаемости iRama")
+    parser.add_argument('chart', choices=sorted(CHART_DATA))
+    parser.add_argument('start_date')
+    parser.add_argument('end_date')
+    parser.add_argument('-o', '--output', required=True, help="файл PNG")
+    parser.add_argument('--department')
+    parser.add_argument('--size', type=_size, default=DEFAULT_SIZE, help="ширина x высота в пикселях")
+    args = parser.parse_args()
+    setup_logging()
+    _, png = render_chart(args.chart, args.start_date, args.end_date, args.department, args.size)
+    with open(args.output, 'wb') as file:
+        file.write(png)
+    print(f"График сохранён: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
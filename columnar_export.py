@@ -0,0 +1,272 @@
+"""Колоночная выгрузка истории посещаемости для BI (Parquet или Feather).
+
+attendance и shifts раскладываются по партициям год/месяц (по check_in_time
+и shift_date) в раскладке Hive: <каталог>/attendance/year=2024/month=01/part.parquet,
+поэтому pyarrow.dataset, DuckDB и Spark читают выгрузку как одну таблицу и
+пропускают ненужные месяцы. employees — один файл. Отдел, статус, город и
+время начала/конца смены записываются категориальными столбцами
+(словарное кодирование в Arrow). Паспортные данные и телефоны не выгружаются.
+
+Для каждой партиции в _manifest.json хранится отпечаток — число строк и
+контрольная сумма строк, посчитанные одним GROUP BY в SQLite без чтения
+данных в pandas. При повторной выгрузке переписываются только партиции с
+изменившимся отпечатком, а партиции опустевших месяцев удаляются. Все
+чтения идут в одной транзакции, поэтому выгрузка согласована. Архивные
+периоды (archive.py) выгружаются вместе с рабочими через представления UNION ALL.
+
+Нужен pyarrow (через него pandas пишет Parquet и Feather).
+
+Запуск: python columnar_export.py export_dir [--format parquet|feather] [--db irama.db] [--full]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import date
+
+import pandas as pd
+
+from archive import source_table
+from database import get_connection, transaction
+from log_config import setup_logging
+from timestamps import DAY_SECONDS, to_epoch_day
+
+try:
+    import pyarrow
+except ImportError:  # выгрузка в колоночные форматы необязательна
+    pyarrow = None
+
+logger = logging.getLogger('iRama.columnar_export')
+
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+MANIFEST_NAME = '_manifest.json'
+# Простые числа для контрольной суммы строк: слагаемые и их сумма остаются в int64
+_PRIME = 2147483647
+_BASE = 1000003
+
+EMPLOYEE_COLUMNS = ('id', 'name', 'status', 'department', 'date_of_birth', 'city')
+CATEGORY_COLUMNS = {
+    'employees': ['status', 'department', 'city'],
+    'shifts': ['start_time', 'end_time'],
+}
+
+
+def _checksum_sql(values):
+    """SQL-выражение контрольной суммы строки.
+
+    Хеш значений (схема Горнера по модулю) умножается на id строки, поэтому
+    правки в разных строках не компенсируют друг друга в сумме.
+    """
+    expression = f"({values[0]}) % {_PRIME}"
+    for value in values[1:]:
+        expression = f"(({expression}) * {_BASE} + ({value})) % {_PRIME}"
+    return f"({expression}) * (id % {_PRIME} + 1) % {_PRIME}"
+
+
+def _minutes_sql(column):
+    # 'чч:мм' → минуты; substr заметно дешевле strftime на миллионах строк
+    return f"IFNULL(substr({column}, 1, 2) * 60 + substr({column}, 4, 2), -1)"
+
+
+# Партиционированные таблицы: столбец партиции (секунды или дни), множитель до
+# секунд, значения для контрольной суммы и выбираемые столбцы
+PARTITIONED = {
+    'attendance': {
+        'column': 'check_in_time',
+        'scale': 1,
+        'checksum': ['employee_id', 'IFNULL(shift_id, -1)', 'check_in_time', 'IFNULL(check_out_time, -1)'],
+        'select': 'id, employee_id, shift_id, check_in_time, check_out_time',
+    },
+    'shifts': {
+        'column': 'shift_date',
+        'scale': DAY_SECONDS,
+        'checksum': ['employee_id', 'shift_date', _minutes_sql('start_time'), _minutes_sql('end_time')],
+        'select': 'id, employee_id, shift_date, start_time, end_time',
+    },
+}
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is not installed")
+
+
+def _month_key(table):
+    spec = PARTITIONED[table]
+    return f"strftime('%Y-%m', {spec['column']} * {spec['scale']}, 'unixepoch')"
+
+
+def partition_fingerprints(conn, table, source=None):
+    """{'гггг-мм': [строк, контрольная сумма]} по месяцам таблицы.
+
+    source — таблица или представление с архивами вместо самой table.
+    """
+    spec = PARTITIONED[table]
+    rows = conn.execute(f'''
+        SELECT {_month_key(table)} AS month, COUNT(*), SUM({_checksum_sql(spec['checksum'])})
+        FROM {source or table} GROUP BY month
+    ''').fetchall()
+    fingerprints = {}
+    for month, count, checksum in rows:
+        if month is None:
+            # NULL или строка, не распознанная миграцией 7: месяц неизвестен
+            logger.warning(f"{table}: {count} строк без корректной даты не выгружены")
+            continue
+        fingerprints[month] = [count, checksum]
+    return fingerprints
+
+
+def _month_bounds(month, scale):
+    """Границы месяца 'гггг-мм' в единицах столбца партиции."""
+    first = date.fromisoformat(f"{month}-01")
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return to_epoch_day(first) * DAY_SECONDS // scale, to_epoch_day(following) * DAY_SECONDS // scale
+
+
+def _read_partition(conn, table, month, source):
+    spec = PARTITIONED[table]
+    start, end = _month_bounds(month, spec['scale'])
+    frame = pd.read_sql_query(
+        f"SELECT {spec['select']} FROM {source} WHERE {spec['column']} >= ? AND {spec['column']} < ? ORDER BY id",
+        conn, params=[start, end])
+    if table == 'attendance':
+        frame['shift_id'] = frame['shift_id'].astype('Int64')
+        for column in ('check_in_time', 'check_out_time'):
+            frame[column] = pd.to_datetime(pd.to_numeric(frame[column], errors='coerce'), unit='s')
+    else:
+        frame['shift_date'] = pd.to_datetime(frame['shift_date'], unit='D').dt.date
+    return _categorize(frame, table)
+
+
+def _read_employees(conn):
+    frame = pd.read_sql_query(f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees ORDER BY id", conn)
+    frame['date_of_birth'] = pd.to_datetime(frame['date_of_birth'], format='%d.%m.%Y', errors='coerce').dt.date
+    return _categorize(frame, 'employees')
+
+
+def _categorize(frame, table):
+    for column in CATEGORY_COLUMNS.get(table, ()):
+        frame[column] = frame[column].astype('category')
+    return frame
+
+
+def _write_frame(frame, path, fmt):
+    """Пишет файл через временный, чтобы читатели не увидели половину партиции."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.part'
+    if fmt == 'parquet':
+        frame.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+    else:
+        frame.to_feather(tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _partition_path(output_dir, table, month, fmt):
+    year, month_number = month.split('-')
+    return os.path.join(output_dir, table, f'year={year}', f'month={month_number}', 'part' + FORMATS[fmt])
+
+
+def _remove_partition(output_dir, table, month, fmt):
+    directory = os.path.dirname(_partition_path(output_dir, table, month, fmt))
+    shutil.rmtree(directory, ignore_errors=True)
+    year_dir = os.path.dirname(directory)
+    if os.path.isdir(year_dir) and not os.listdir(year_dir):
+        os.rmdir(year_dir)
+
+
+def _load_manifest(output_dir, fmt):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    # Выгрузка в другом формате не переиспользуется
+    return manifest if manifest.get('format') == fmt else {}
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.part', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(path + '.part', path)
+
+
+def export_columnar(output_dir, fmt='parquet', full=False, conn=None):
+    """Выгружает attendance, shifts и employees в output_dir.
+
+    full — переписать все партиции, не сверяясь с манифестом. Возвращает
+    сводку {'written', 'unchanged', 'removed', 'rows', 'elapsed'} или None
+    при ошибке.
+    """
+    try:
+        _require_pyarrow()
+        if fmt not in FORMATS:
+            raise ValueError(f"неизвестный формат: {fmt}")
+        start = time.perf_counter()
+        conn = conn or get_connection()
+        os.makedirs(output_dir, exist_ok=True)
+        previous = {} if full else _load_manifest(output_dir, fmt)
+        manifest = {'format': fmt, 'tables': {}}
+        summary = {'written': 0, 'unchanged': 0, 'removed': 0, 'rows': 0}
+        # Архивы присоединяются до транзакции: ATTACH внутри неё запрещён
+        sources = {table: source_table(conn, table) for table in PARTITIONED}
+        with transaction(conn):
+            for table, source in sources.items():
+                old = previous.get('tables', {}).get(table, {})
+                current = partition_fingerprints(conn, table, source)
+                for month, fingerprint in sorted(current.items()):
+                    path = _partition_path(output_dir, table, month, fmt)
+                    if old.get(month) == fingerprint and os.path.exists(path):
+                        summary['unchanged'] += 1
+                        continue
+                    _write_frame(_read_partition(conn, table, month, source), path, fmt)
+                    summary['written'] += 1
+                    summary['rows'] += fingerprint[0]
+                for month in old.keys() - current.keys():
+                    _remove_partition(output_dir, table, month, fmt)
+                    summary['removed'] += 1
+                manifest['tables'][table] = current
+
+            # Сотрудники не партиционируются: файл переписывается, только если изменился
+            employees = _read_employees(conn)
+            digest = str(int(pd.util.hash_pandas_object(employees, index=False).sum()) & 0xFFFFFFFFFFFFFFFF)
+            path = os.path.join(output_dir, 'employees', 'part' + FORMATS[fmt])
+            if previous.get('employees') == digest and os.path.exists(path):
+                summary['unchanged'] += 1
+            else:
+                _write_frame(employees, path, fmt)
+                summary['written'] += 1
+                summary['rows'] += len(employees)
+            manifest['employees'] = digest
+        manifest['exported_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        _save_manifest(output_dir, manifest)
+        summary['elapsed'] = time.perf_counter() - start
+        logger.info(f"Колоночная выгрузка в {output_dir}: переписано партиций {summary['written']}, "
+                    f"без изменений {summary['unchanged']}, удалено {summary['removed']}",
+                    extra={'elapsed_ms': round(summary['elapsed'] * 1000, 1), 'rows': summary['rows']})
+        return summary
+    except Exception as e:
+        logger.error(f"Ошибка колоночной выгрузки: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Колоночная выгрузка iRama для BI")
+    parser.add_argument('output_dir')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    parser.add_argument('--db', help="путь к базе (по умолчанию irama.db)")
+    parser.add_argument('--full', action='store_true', help="переписать все партиции")
+    args = parser.parse_args()
+    setup_logging()
+    conn = get_connection(args.db) if args.db else None
+    summary = export_columnar(args.output_dir, args.format, args.full, conn)
+    if summary is None:
+        raise SystemExit(1)
+    print(f"Переписано партиций: {summary['written']}, без изменений: {summary['unchanged']}, "
+          f"удалено: {summary['removed']}, строк: {summary['rows']}, {summary['elapsed']:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
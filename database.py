@@ -1,82 +1,172 @@
+import os
 import sqlite3
 import logging
-from datetime import datetime
-import shutil
-
-# Настройка логирования
-logging.basicConfig(
-    filename='irama.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-def create_connection():
-    """Создаёт соединение с SQLite."""
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import profiling
+
+logger = logging.getLogger('iRama.database')
+# Пока log_config.setup_logging() не вызван, записи 'iRama' никуда не выводятся
+logging.getLogger('iRama').addHandler(logging.NullHandler())
+
+DB_PATH = 'irama.db'
+
+# Настройки SQLite, применяемые один раз к каждому новому соединению
+PRAGMAS = {
+    'journal_mode': 'WAL',          # читатели не блокируют писателей
+    'synchronous': 'NORMAL',        # в режиме WAL fsync только на checkpoint
+    'cache_size': -20000,           # ~20 МБ страничного кэша
+    'mmap_size': 268435456,         # 256 МБ отображения файла в память
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,           # мс ожидания блокировки вместо ошибки
+}
+# Для соединений только для чтения: режим журнала и внешние ключи задаёт писатель
+READONLY_PRAGMAS = {name: PRAGMAS[name] for name in ('cache_size', 'mmap_size', 'temp_store', 'busy_timeout')}
+
+# Соединения хранятся по одному на поток и на файл базы данных
+_local = threading.local()
+_all_connections = []
+_all_connections_lock = threading.Lock()
+# Отложенные вызовы открытых transaction(): id соединения -> [(функция, аргументы)].
+# Соединения принадлежат своим потокам, поэтому блокировка не нужна
+_pending_callbacks = {}
+
+
+def apply_pragmas(conn, pragmas=None):
+    """Применяет настройки производительности к соединению."""
+    for name, value in (pragmas or PRAGMAS).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def create_connection(db_path=None, pragmas=None, readonly=False):
+    """Создаёт соединение с SQLite.
+
+    readonly=True открывает файл в режиме mode=ro: в WAL такие соединения
+    читают параллельно с писателем и друг с другом.
+    """
     try:
-        conn = sqlite3.connect('irama.db')
-        logging.info("Соединение с SQLite установлено.")
+        db_path = db_path or DB_PATH
+        if readonly:
+            db_path = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+            pragmas = pragmas or READONLY_PRAGMAS
+        # isolation_level=None: транзакциями управляет transaction()
+        # factory: учёт времени запросов и журнал медленных запросов (profiling.py)
+        conn = sqlite3.connect(db_path, isolation_level=None, uri=readonly,
+                               factory=profiling.connection_factory())
+        apply_pragmas(conn, pragmas)
+        logger.info("Соединение с SQLite установлено.")
         return conn
     except sqlite3.Error as e:
-        logging.error(f"Ошибка подключения к SQLite: {e}")
+        logger.error(f"Ошибка подключения к SQLite: {e}")
         return None
 
-def create_tables():
-    """Создаёт таблицы в базе данных."""
-    conn = create_connection()
+
+def get_connection(db_path=None):
+    """Возвращает переиспользуемое соединение текущего потока."""
+    db_path = db_path or DB_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = create_connection(db_path)
+        if conn is None:
+            raise sqlite3.OperationalError(f"Не удалось подключиться к {db_path}")
+        connections[db_path] = conn
+        with _all_connections_lock:
+            _all_connections.append(conn)
+    return conn
+
+
+def close_connection(db_path=None):
+    """Закрывает соединение текущего потока."""
+    db_path = db_path or DB_PATH
+    connections = getattr(_local, 'connections', {})
+    conn = connections.pop(db_path, None)
     if conn is not None:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS departments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS employees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                status TEXT NOT NULL,
-                department_id INTEGER,
-                FOREIGN KEY (department_id) REFERENCES departments(id) ON DELETE SET NULL
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS shifts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                shift_date DATE NOT NULL,
-                start_time TIME NOT NULL,
-                end_time TIME NOT NULL,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                shift_id INTEGER NOT NULL,
-                check_in_time DATETIME NOT NULL,
-                check_out_time DATETIME,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
-                FOREIGN KEY (shift_id) REFERENCES shifts(id) ON DELETE CASCADE
-            )
-        ''')
-        conn.commit()
+        with _all_connections_lock:
+            if conn in _all_connections:
+                _all_connections.remove(conn)
         conn.close()
-        logging.info("Таблицы успешно созданы.")
+
+
+def close_all_connections():
+    """Закрывает все соединения пула (вызывается при завершении работы)."""
+    with _all_connections_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Соединение другого потока: SQLite не даёт закрыть его отсюда
+            pass
+    _local.connections = {}
+
+
+@contextmanager
+def transaction(conn=None, mode='DEFERRED'):
+    """Контекст транзакции: COMMIT при успехе, ROLLBACK при исключении.
+
+    Вложенные вызовы выполняются в рамках внешней транзакции.
+    """
+    conn = conn or get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute(f"BEGIN {mode}")
+    _pending_callbacks[id(conn)] = callbacks = []
+    try:
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+    finally:
+        del _pending_callbacks[id(conn)]
+        for callback, args in callbacks:
+            callback(*args)
+
+
+def after_transaction(conn, callback, *args):
+    """Вызывает callback(*args) после COMMIT или ROLLBACK внешней transaction() на conn.
+
+    Вне transaction() вызывает сразу. Нужен, например, кэшу: сброс до
+    COMMIT внешней транзакции другие потоки успели бы заполнить старыми данными.
+    """
+    callbacks = _pending_callbacks.get(id(conn))
+    if callbacks is None:
+        callback(*args)
     else:
-        logging.error("Не удалось создать таблицы, так как соединение не установлено.")
+        callbacks.append((callback, args))
+
+
+def create_tables():
+    """Создаёт таблицы в базе данных (применяет миграции схемы)."""
+    from migrations import migrate  # migrations импортирует database
+    try:
+        version = migrate(get_connection())
+        logger.info(f"Таблицы успешно созданы, версия схемы: {version}.")
+    except sqlite3.Error as e:
+        logger.error(f"Не удалось создать таблицы: {e}")
 
 def backup_database():
     """Создаёт резервную копию базы данных."""
-    try:
-        backup_filename = f"irama_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        shutil.copy2('irama.db', backup_filename)
-        logging.info(f"Резервная копия создана: {backup_filename}")
-    except Exception as e:
-        logging.error(f"Ошибка при создании резервной копии: {e}")
+    from backup import create_backup  # backup импортирует database
+    backup_path = create_backup()
+    if backup_path:
+        logger.info(f"Резервная копия создана: {backup_path}")
+    else:
+        logger.error("Ошибка при создании резервной копии.")
+    return backup_path
 
 if __name__ == "__main__":
+    from log_config import setup_logging
+    setup_logging()
     create_tables()  # Создание таблиц при запуске
-    backup_database()  # Создание резервной копии
\ No newline at end of file
+    backup_database()  # Создание резервной копии
@@ -0,0 +1,187 @@
+"""Фоновое выполнение запросов к базе данных для GUI и HTTP-сервиса.
+
+DBExecutor держит пул рабочих потоков; у каждого потока своё соединение из
+пула database.get_connection(). Задания упорядочены по приоритету
+(интерактивный поиск раньше отчётов), результаты возвращаются в поток Tk
+через очередь, которую опрашивает root.after, — Tk не потокобезопасен.
+Без Tk вместо опроса передаётся wakeup: рабочий поток вызывает его после
+каждого результата (service.py так будит цикл asyncio).
+"""
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+
+from database import close_connection, get_connection
+
+logger = logging.getLogger('iRama.db_worker')
+
+# Приоритеты заданий: меньше — раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_REPORT = 2
+
+DEFAULT_WORKERS = 2
+POLL_INTERVAL_MS = 20
+
+
+class JobCancelled(Exception):
+    """Задание отменено до завершения."""
+
+
+class ExecutorBusy(Exception):
+    """В очереди уже max_pending заданий; новое не принято."""
+
+
+class Job:
+    """Задание для DBExecutor; func(conn, *args, **kwargs) выполняется в рабочем потоке."""
+
+    def __init__(self, func, args, kwargs, priority, callback, errback):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.callback = callback
+        self.errback = errback
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Отменяет задание; выполняющийся запрос прерывается через interrupt()."""
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def _run(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise JobCancelled()
+            self._conn = conn
+        try:
+            return self.func(conn, *self.args, **self.kwargs)
+        except sqlite3.OperationalError as e:
+            if self.cancelled and 'interrupt' in str(e):
+                raise JobCancelled() from e
+            raise
+        finally:
+            with self._lock:
+                self._conn = None
+
+
+class DBExecutor:
+    """Пул потоков для запросов SQLite с доставкой результатов в поток Tk."""
+
+    def __init__(self, root=None, workers=DEFAULT_WORKERS, on_busy_change=None, wakeup=None,
+                 max_pending=None):
+        self.root = root
+        self.on_busy_change = on_busy_change
+        self.wakeup = wakeup
+        self.max_pending = max_pending
+        self._jobs = queue.PriorityQueue()
+        self._results = queue.Queue()
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"irama-db-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        if root is not None:
+            self._poll_job = root.after(POLL_INTERVAL_MS, self._poll)
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    @property
+    def pending(self):
+        """Число поставленных и ещё не завершённых заданий."""
+        return self._pending
+
+    def submit(self, func, *args, priority=PRIORITY_NORMAL, callback=None, errback=None, **kwargs):
+        """Ставит func(conn, *args, **kwargs) в очередь; возвращает Job.
+
+        callback(result) и errback(exception) вызываются в потоке Tk (или там,
+        где вызывается process_results). Если задано max_pending и очередь
+        заполнена, бросает ExecutorBusy.
+        """
+        if self._stopped:
+            raise RuntimeError("DBExecutor остановлен")
+        job = Job(func, args, kwargs, priority, callback, errback)
+        self._change_pending(+1, self.max_pending)
+        self._jobs.put((priority, next(self._sequence), job))
+        return job
+
+    def _change_pending(self, delta, limit=None):
+        with self._pending_lock:
+            # Проверка предела и увеличение счётчика под одной блокировкой:
+            # иначе одновременные submit могли бы вместе превысить max_pending
+            if limit is not None and self._pending >= limit:
+                raise ExecutorBusy(f"в очереди {self._pending} заданий")
+            was_busy = self._pending > 0
+            self._pending += delta
+            now_busy = self._pending > 0
+        if was_busy != now_busy:
+            self._results.put(('busy', now_busy, None))
+
+    def _worker(self):
+        while True:
+            _, _, job = self._jobs.get()
+            if job is None:
+                break
+            try:
+                result = job._run(get_connection())
+                self._results.put(('done', job, result))
+            except JobCancelled:
+                self._results.put(('cancelled', job, None))
+            except Exception as e:
+                logger.error(f"Ошибка фонового запроса к БД: {e}")
+                self._results.put(('error', job, e))
+            finally:
+                self._change_pending(-1)
+            if self.wakeup is not None:
+                self.wakeup()
+        close_connection()
+
+    def process_results(self):
+        """Доставляет готовые результаты; вызывается в потоке Tk."""
+        while True:
+            try:
+                kind, job, value = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'busy':
+                if self.on_busy_change is not None:
+                    self.on_busy_change(job)
+            elif kind == 'done' and not job.cancelled and job.callback is not None:
+                job.callback(value)
+            elif kind == 'error' and job.errback is not None:
+                job.errback(value)
+
+    def _poll(self):
+        self.process_results()
+        if not self._stopped:
+            self._poll_job = self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def shutdown(self, wait=True):
+        """Останавливает рабочие потоки после выполнения уже поставленных заданий."""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self.root is not None:
+            try:
+                self.root.after_cancel(self._poll_job)
+            except Exception:
+                pass
+        for _ in self._threads:
+            # Сигнал остановки идёт последним среди заданий с любым приоритетом
+            self._jobs.put((float('inf'), next(self._sequence), None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,270 @@
+"""Виртуализированная таблица сотрудников для IRamaApp.
+
+EmployeeTableModel читает сотрудников страницами с keyset-пагинацией
+(WHERE (ключ сортировки, id) > последнего загруженного), поэтому стоимость
+очередной страницы не зависит от её номера. VirtualEmployeeTree подгружает
+следующую страницу при прокрутке к концу списка и после изменений
+обновляет только затронутые строки Treeview. Если передан DBExecutor,
+запросы выполняются в его рабочих потоках, а не в потоке Tk.
+"""
+from bisect import bisect_left
+
+from database import get_connection
+from db_worker import PRIORITY_INTERACTIVE
+from models import EMPLOYEE_COLUMNS
+from repository import get_repository
+
+PAGE_SIZE = 200
+# Доля прокрутки, после которой подгружается следующая страница
+PREFETCH_THRESHOLD = 0.9
+
+_SELECT_COLUMNS = ', '.join(EMPLOYEE_COLUMNS)
+
+
+class EmployeeTableModel:
+    """Страничное чтение сотрудников с сортировкой на стороне SQLite."""
+
+    def __init__(self, conn=None, page_size=PAGE_SIZE):
+        self.conn = conn
+        self.page_size = page_size
+        self.sort_column = 'id'
+        self.descending = False
+        self.reset()
+
+    def _conn(self):
+        return self.conn or get_connection()
+
+    def reset(self):
+        """Сбрасывает загруженный диапазон к началу списка."""
+        self.last_key = None
+        self.exhausted = False
+
+    def set_sort(self, column, descending=None):
+        """Меняет сортировку; повторный выбор того же столбца меняет направление."""
+        if column not in EMPLOYEE_COLUMNS:
+            raise ValueError(f"Неизвестный столбец: {column}")
+        if descending is None:
+            descending = not self.descending if column == self.sort_column else False
+        self.sort_column = column
+        self.descending = descending
+        self.reset()
+
+    def sort_key(self, row):
+        """Ключ сортировки строки, согласованный с ORDER BY запроса.
+
+        Для столбца — (есть ли значение, значение, id): как и в SQLite,
+        NULL меньше любого значения.
+        """
+        employee_id = row[0]
+        if self.sort_column == 'id':
+            return (employee_id,)
+        value = row[EMPLOYEE_COLUMNS.index(self.sort_column)]
+        return (value is not None, '' if value is None else value, employee_id)
+
+    def fetch_page(self, after_key, sort_column, descending):
+        """Читает страницу после ключа after_key; состояние модели не меняет.
+
+        Параметры передаются явно, чтобы запрос можно было выполнить
+        в рабочем потоке, пока поток Tk меняет сортировку.
+        """
+        direction = 'DESC' if descending else 'ASC'
+        op = '<' if descending else '>'
+        if sort_column == 'id':
+            where, params = (f"id {op} ?", list(after_key)) if after_key is not None else ('1', [])
+            return self._select(where, f"id {direction}", params, self.page_size)
+        # Сортировка по самому столбцу идёт по индексу. NULL несравним в row
+        # values, поэтому строки с NULL (первые при ASC, последние при DESC)
+        # читаются отдельным запросом по тому же индексу
+        segments = [(f"{sort_column} IS NULL", f"id {direction}"),
+                    (f"{sort_column} IS NOT NULL", f"{sort_column} {direction}, id {direction}")]
+        if descending:
+            segments.reverse()
+        params = []
+        if after_key is not None:
+            has_value, value, employee_id = after_key
+            # Страница продолжает сегмент, в котором стоит after_key
+            if has_value:
+                segments = segments[0 if descending else 1:]
+                extra, params = f"({sort_column}, id) {op} (?, ?)", [value, employee_id]
+            else:
+                segments = segments[1 if descending else 0:]
+                extra, params = f"id {op} ?", [employee_id]
+            segments[0] = (f"{segments[0][0]} AND {extra}", segments[0][1])
+        rows = []
+        for where, order_by in segments:
+            rows += self._select(where, order_by, params, self.page_size - len(rows))
+            if len(rows) == self.page_size:
+                break
+            params = []
+        return rows
+
+    def _select(self, where, order_by, params, limit):
+        return self._conn().execute(
+            f"SELECT {_SELECT_COLUMNS} FROM employees WHERE {where} ORDER BY {order_by} LIMIT ?", [*params, limit]
+        ).fetchall()
+
+    def advance(self, rows):
+        """Сдвигает загруженный диапазон на полученную страницу."""
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_key = self.sort_key(rows[-1])
+
+    def next_page(self):
+        """Возвращает следующую страницу строк (пустой список в конце)."""
+        if self.exhausted:
+            return []
+        rows = self.fetch_page(self.last_key, self.sort_column, self.descending)
+        self.advance(rows)
+        return rows
+
+    def fetch_row(self, employee_id):
+        """Читает одну строку сотрудника по id (None, если удалена)."""
+        return get_repository().get(employee_id, self._conn())
+
+    def in_loaded_range(self, row):
+        """Попадает ли строка в уже загруженную часть списка."""
+        if self.exhausted:
+            return True
+        if self.last_key is None:
+            return False
+        key = self.sort_key(row)
+        return key > self.last_key if self.descending else key < self.last_key
+
+
+class VirtualEmployeeTree:
+    """Связывает ttk.Treeview с EmployeeTableModel."""
+
+    def __init__(self, tree, model, scrollbar=None, headings=None, executor=None):
+        self.tree = tree
+        self.model = model
+        self.scrollbar = scrollbar
+        self.executor = executor
+        # Ключи сортировки загруженных строк в порядке отображения
+        self._keys = []
+        self._paging = True
+        self._load_pending = False
+        # Номер «поколения» содержимого: ответы на устаревшие запросы отбрасываются
+        self._generation = 0
+        tree.configure(yscrollcommand=self._on_scroll)
+        if scrollbar is not None:
+            scrollbar.configure(command=tree.yview)
+        for column, db_column in zip(tree["columns"], EMPLOYEE_COLUMNS):
+            tree.heading(column, text=(headings or {}).get(column, column),
+                         command=lambda c=db_column: self.sort_by(c))
+
+    def _run(self, func, callback, *args):
+        """Выполняет func(*args) в фоне (если есть executor) и передаёт результат в callback."""
+        generation = self._generation
+
+        def deliver(result):
+            if generation == self._generation:
+                callback(result)
+
+        if self.executor is None:
+            deliver(func(*args))
+        else:
+            self.executor.submit(lambda conn: func(*args), priority=PRIORITY_INTERACTIVE, callback=deliver)
+
+    def _clear(self):
+        self._generation += 1
+        self._keys = []
+        self.tree.delete(*self.tree.get_children())
+
+    def reload(self):
+        """Показывает список с начала в текущей сортировке."""
+        self.model.reset()
+        self._paging = True
+        self._load_pending = False
+        self._clear()
+        self.load_more()
+
+    def show_rows(self, rows):
+        """Показывает готовый набор строк (результаты поиска) без подгрузки."""
+        self._paging = False
+        self._clear()
+        for row in rows:
+            self.tree.insert("", "end", iid=str(row[0]), values=row)
+
+    def load_more(self):
+        """Добавляет в конец следующую страницу."""
+        if not self._paging:
+            self._load_pending = False
+            return
+        if self.model.exhausted:
+            self._load_pending = False
+            return
+        self._load_pending = True
+        self._run(self.model.fetch_page, self._append_page,
+                  self.model.last_key, self.model.sort_column, self.model.descending)
+
+    def _append_page(self, rows):
+        self._load_pending = False
+        self.model.advance(rows)
+        for row in rows:
+            iid = str(row[0])
+            if self.tree.exists(iid):
+                continue
+            self.tree.insert("", "end", iid=iid, values=row)
+            self._keys.append(self.model.sort_key(row))
+
+    def sort_by(self, column):
+        """Сортировка по щелчку на заголовке столбца."""
+        self.model.set_sort(column)
+        self.reload()
+
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if (self._paging and not self._load_pending and not self.model.exhausted
+                and float(last) >= PREFETCH_THRESHOLD):
+            self._load_pending = True
+            self.tree.after_idle(self.load_more)
+
+    def _insert_sorted(self, row):
+        key = self.model.sort_key(row)
+        if self.model.descending:
+            # Ключи убывают: ищем позицию по инвертированному порядку
+            index = len(self._keys) - bisect_left(self._keys[::-1], key)
+        else:
+            index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self.tree.insert("", index, iid=str(row[0]), values=row)
+
+    def _remove(self, iid):
+        if self.tree.exists(iid):
+            if self._paging:
+                del self._keys[self.tree.index(iid)]
+            self.tree.delete(iid)
+
+    def row_added(self, employee_id):
+        """Показывает новую строку, если она попадает в загруженный диапазон."""
+        if self._paging:
+            self._run(self.model.fetch_row, self._apply_added, employee_id)
+
+    def _apply_added(self, row):
+        if row is not None and self._paging and self.model.in_loaded_range(row):
+            self._insert_sorted(row)
+
+    def row_updated(self, employee_id):
+        """Обновляет одну строку; при смене ключа сортировки переставляет её."""
+        self._run(self.model.fetch_row, lambda row: self._apply_updated(str(employee_id), row), employee_id)
+
+    def _apply_updated(self, iid, row):
+        if row is None:
+            self._remove(iid)
+            return
+        if not self._paging:
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=row)
+            return
+        if self.tree.exists(iid) and self._keys[self.tree.index(iid)] == self.model.sort_key(row):
+            self.tree.item(iid, values=row)
+            return
+        self._remove(iid)
+        if self.model.in_loaded_range(row):
+            self._insert_sorted(row)
+
+    def row_removed(self, employee_id):
+        """Убирает удалённую строку без перезагрузки таблицы."""
+        self._remove(str(employee_id))
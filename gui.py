@@ -1,62 +1,59 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 import logging
-import csv
-import shutil
-import pandas as pd
-import matplotlib.pyplot as plt
-from plyer import notification
-import re
-from tkcalendar import Calendar  # Импорт календаря
-
-# Логирование
-logging.basicConfig(filename='irama.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Подключение к базе данных
-conn = sqlite3.connect("irama.db")
-cursor = conn.cursor()
-
-# Удаление и создание таблицы employees с новыми столбцами
-cursor.execute("DROP TABLE IF EXISTS employees")
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS employees (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        status TEXT,
-        department TEXT,
-        date_of_birth TEXT,
-        city TEXT,
-        phone_number TEXT,
-        passport_data TEXT
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS shifts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER,
-        shift_date TEXT,
-        start_time TEXT,
-        end_time TEXT,
-        FOREIGN KEY (employee_id) REFERENCES employees (id)
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS attendance (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id INTEGER,
-        shift_id INTEGER,
-        check_in_time TEXT,
-        check_out_time TEXT,
-        FOREIGN KEY (employee_id) REFERENCES employees (id),
-        FOREIGN KEY (shift_id) REFERENCES shifts (id)
-    )
-''')
-
-conn.commit()
+import calendar
+import base64
+from database import close_all_connections
+from log_config import setup_logging, shutdown_logging
+import validators
+from migrations import migrate
+from search import search_employees
+from employee_table import EmployeeTableModel, VirtualEmployeeTree
+from db_worker import DBExecutor, PRIORITY_INTERACTIVE, PRIORITY_REPORT
+from aggregates import department_monthly
+from repository import get_repository
+import charts
+
+# Задержка поиска после последнего нажатия клавиши и предел строк в выдаче
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_RESULT_LIMIT = 500
+# Размер графиков на вкладке «Отчёты», пикселей
+CHART_SIZE = (900, 360)
+
+logger = logging.getLogger('iRama.gui')
+
+# Запросы, которые IRamaApp выполняет в рабочих потоках DBExecutor
+
+# Поля формы сотрудника в порядке кортежа values
+EMPLOYEE_FORM_FIELDS = ('name', 'status', 'department', 'date_of_birth', 'city', 'phone_number', 'passport_data')
+
+def db_insert_employee(conn, values):
+    """Добавляет сотрудника; возвращает его id."""
+    return get_repository().add(conn, **dict(zip(EMPLOYEE_FORM_FIELDS, values)))
+
+def db_update_employee(conn, employee_id, values):
+    """Обновляет данные сотрудника."""
+    return get_repository().update(employee_id, conn, **dict(zip(EMPLOYEE_FORM_FIELDS, values)))
+
+def db_delete_employee(conn, employee_id):
+    """Удаляет сотрудника."""
+    return get_repository().delete(employee_id, conn)
+
+# pandas загружается только при первом обращении к табелю, а не при запуске
+def db_employee_summary(conn, start_date, end_date):
+    """Табельные итоги сотрудников с русскими заголовками столбцов."""
+    import analytics
+    return analytics.employee_summary(start_date, end_date, conn=conn).rename(columns=analytics.SUMMARY_COLUMNS)
+
+def db_export_timesheet(conn, path, start_date, end_date):
+    """Сохраняет табель в XLSX или CSV."""
+    import analytics
+    return analytics.export_report(path, start_date, end_date, conn=conn)
+
+def db_render_chart(conn, chart, start_date, end_date, size):
+    """(версия сводок, PNG) графика; рисуется в рабочем потоке, повтор — из кэша."""
+    return charts.render_chart(chart, start_date, end_date, size=size, conn=conn)
 
 class DatePicker:
     """Всплывающий календарь для выбора даты."""
@@ -67,6 +64,8 @@ class DatePicker:
 
     def show_calendar(self):
         """Открывает календарь для выбора даты."""
+        from tkcalendar import Calendar  # Загружается при первом открытии календаря
+
         def set_date():
             selected_date = cal.get_date()
             self.entry_widget.delete(0, tk.END)
@@ -100,31 +99,78 @@ class IRamaApp:
         screen_height = self.root.winfo_screenheight()
         self.root.geometry(f"{screen_width}x{screen_height}")
 
-        # Вкладки
+        # Строка состояния с индикатором фоновых запросов
+        self.status_bar = tk.Frame(root)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.busy_label = tk.Label(self.status_bar, text="")
+        self.busy_label.pack(side=tk.LEFT, padx=10)
+        self.busy_progress = ttk.Progressbar(self.status_bar, mode="indeterminate", length=120)
+
+        # Все запросы к БД выполняются вне потока Tk
+        self.db = DBExecutor(root, on_busy_change=self.set_busy)
+
+        # Вкладки; содержимое строится при первом выборе вкладки
         self.tab_control = ttk.Notebook(root)
-        
-        # Вкладка "Сотрудники"
-        self.tab_employees = ttk.Frame(self.tab_control)
-        self.tab_control.add(self.tab_employees, text="Сотрудники")
-        self.setup_employees_tab()
-        
-        # Вкладка "Смены"
-        self.tab_shifts = ttk.Frame(self.tab_control)
-        self.tab_control.add(self.tab_shifts, text="Смены")
-        self.setup_shifts_tab()
-        
-        # Вкладка "Посещаемость"
-        self.tab_attendance = ttk.Frame(self.tab_control)
-        self.tab_control.add(self.tab_attendance, text="Посещаемость")
-        self.setup_attendance_tab()
-        
-        # Вкладка "Отчёты"
-        self.tab_reports = ttk.Frame(self.tab_control)
-        self.tab_control.add(self.tab_reports, text="Отчёты")
-        self.setup_reports_tab()
+        self._tab_builders = {}
+        self.tab_employees = self._add_tab("Сотрудники", self.setup_employees_tab)
+        self.tab_shifts = self._add_tab("Смены", self.setup_shifts_tab)
+        self.tab_attendance = self._add_tab("Посещаемость", self.setup_attendance_tab)
+        self.tab_reports = self._add_tab("Отчёты", self.setup_reports_tab)
+        self.tab_control.bind("<<NotebookTabChanged>>", self.build_selected_tab)
+        # Вкладка «Сотрудники» открыта при запуске — строим сразу
+        self.build_selected_tab()
         
         self.tab_control.pack(expand=1, fill="both")
 
+        # Данные загружаются после того, как окно показано
+        self._data_load_started = False
+        self.root.bind("<Map>", self._on_map, add="+")
+
+    def _add_tab(self, text, builder):
+        frame = ttk.Frame(self.tab_control)
+        self.tab_control.add(frame, text=text)
+        self._tab_builders[str(frame)] = builder
+        return frame
+
+    def build_selected_tab(self, event=None):
+        """Строит содержимое выбранной вкладки, если оно ещё не построено."""
+        builder = self._tab_builders.pop(self.tab_control.select(), None)
+        if builder is not None:
+            builder()
+
+    def _on_map(self, event):
+        if event.widget is self.root and not self._data_load_started:
+            self._data_load_started = True
+            self.root.after_idle(self.start_data_load)
+
+    def start_data_load(self):
+        """Приводит схему к актуальной версии и загружает первую страницу сотрудников."""
+        self.db.submit(migrate, priority=PRIORITY_INTERACTIVE,
+                       callback=lambda version: self.load_employees(),
+                       errback=self.show_db_error)
+
+    def set_busy(self, busy):
+        """Показывает или скрывает индикатор выполнения запросов."""
+        if busy:
+            self.busy_label.config(text="Загрузка данных…")
+            self.busy_progress.pack(side=tk.LEFT)
+            self.busy_progress.start(10)
+            self.root.config(cursor="watch")
+        else:
+            self.busy_progress.stop()
+            self.busy_progress.pack_forget()
+            self.busy_label.config(text="")
+            self.root.config(cursor="")
+
+    def show_db_error(self, error):
+        """Сообщает об ошибке фонового запроса."""
+        messagebox.showerror("Ошибка базы данных", str(error))
+
+    def close(self):
+        """Останавливает фоновые запросы и закрывает окно."""
+        self.db.shutdown()
+        self.root.destroy()
+
     def setup_employees_tab(self):
         """Настройка вкладки 'Сотрудники'."""
         # Поиск сотрудника
@@ -133,7 +179,10 @@ class IRamaApp:
         
         self.search_entry = tk.Entry(self.tab_employees, width=40)
         self.search_entry.pack(pady=5)
-        self.search_entry.bind("<KeyRelease>", self.search_employee)
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+        self._search_job = None
+        self._search_query = None
+        self._last_search_text = None
         
         # Кнопки управления
         self.buttons_frame = tk.Frame(self.tab_employees)
@@ -158,30 +207,52 @@ class IRamaApp:
         self.tree.heading("Город", text="Город")
         self.tree.heading("Телефон", text="Телефон")
         self.tree.heading("Паспорт", text="Паспорт")
+        self.tree_scrollbar = ttk.Scrollbar(self.tab_employees, orient=tk.VERTICAL)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
         self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Загрузка данных
-        self.load_employees()
 
-    def load_employees(self):
-        """Загружает сотрудников в таблицу."""
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        
-        cursor.execute("SELECT * FROM employees")
-        for row in cursor.fetchall():
-            self.tree.insert("", "end", values=row)
+        # Страничная подгрузка при прокрутке и сортировка щелчком по заголовку
+        self.employee_view = VirtualEmployeeTree(
+            self.tree, EmployeeTableModel(), self.tree_scrollbar,
+            headings={column: self.tree.heading(column, "text") for column in self.tree["columns"]},
+            executor=self.db,
+        )
 
-    def search_employee(self, event):
-        """Поиск сотрудника по имени, отделу или статусу."""
+    def load_employees(self):
+        """Загружает первую страницу сотрудников в таблицу."""
+        self._last_search_text = None
+        self.employee_view.reload()
+
+    def schedule_search(self, event=None):
+        """Откладывает поиск до паузы в наборе, отменяя предыдущий запрос."""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.search_employee)
+
+    def search_employee(self, event=None):
+        """Поиск сотрудника по имени, отделу, статусу, городу или телефону."""
+        self._search_job = None
         search_text = self.search_entry.get()
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        
-        cursor.execute("SELECT * FROM employees WHERE name LIKE ? OR department LIKE ? OR status LIKE ?",
-                       ('%' + search_text + '%', '%' + search_text + '%', '%' + search_text + '%'))
-        for row in cursor.fetchall():
-            self.tree.insert("", "end", values=row)
+        if search_text == self._last_search_text:
+            return  # Текст не изменился (стрелки, Shift и т.п.)
+        self._last_search_text = search_text
+
+        # Устаревший поиск больше не нужен: отменяем его, даже если он уже выполняется
+        if self._search_query is not None:
+            self._search_query.cancel()
+            self._search_query = None
+        if not search_text.strip():
+            self.employee_view.reload()
+            return
+
+        def show_results(rows):
+            self._search_query = None
+            self.employee_view.show_rows(rows)
+
+        self._search_query = self.db.submit(
+            lambda conn: search_employees(search_text, limit=SEARCH_RESULT_LIMIT, conn=conn),
+            priority=PRIORITY_INTERACTIVE, callback=show_results, errback=self.show_db_error,
+        )
 
     def add_employee(self):
         """Добавляет нового сотрудника."""
@@ -205,14 +276,15 @@ class IRamaApp:
                     return
 
                 full_name = f"{surname} {name} {patronymic}" if patronymic else f"{surname} {name}"
-                cursor.execute("""
-                    INSERT INTO employees (name, status, department, date_of_birth, city, phone_number, passport_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (full_name, status, department, date_of_birth, city, phone_number, passport_data))
-                conn.commit()
-                logging.info(f"Добавлен новый сотрудник: {full_name}, отдел: {department}, статус: {status}")
-                self.load_employees()
-                add_window.destroy()
+
+                def on_saved(employee_id):
+                    logger.info(f"Добавлен новый сотрудник: {full_name}, отдел: {department}, статус: {status}")
+                    self.employee_view.row_added(employee_id)
+                    add_window.destroy()
+
+                self.db.submit(db_insert_employee,
+                               (full_name, status, department, date_of_birth, city, phone_number, passport_data),
+                               callback=on_saved, errback=self.show_db_error)
             else:
                 messagebox.showwarning("Ошибка", "Заполните обязательные поля!")
 
@@ -271,8 +343,17 @@ class IRamaApp:
             return
 
         employee_id = self.tree.item(selected_item, "values")[0]
-        cursor.execute("SELECT * FROM employees WHERE id = ?", (employee_id,))
-        employee_data = cursor.fetchone()
+        self.db.submit(lambda conn: get_repository().get(employee_id, conn),
+                       priority=PRIORITY_INTERACTIVE,
+                       callback=lambda row: self.open_edit_window(employee_id, row),
+                       errback=self.show_db_error)
+
+    def open_edit_window(self, employee_id, employee_data):
+        """Открывает окно редактирования с данными сотрудника."""
+        if employee_data is None:
+            messagebox.showwarning("Ошибка", "Сотрудник не найден, возможно, он уже удалён.")
+            self.employee_view.row_removed(employee_id)
+            return
 
         def save_edited_employee():
             surname = entry_surname.get()
@@ -294,15 +375,15 @@ class IRamaApp:
                     return
 
                 full_name = f"{surname} {name} {patronymic}" if patronymic else f"{surname} {name}"
-                cursor.execute("""
-                    UPDATE employees
-                    SET name = ?, status = ?, department = ?, date_of_birth = ?, city = ?, phone_number = ?, passport_data = ?
-                    WHERE id = ?
-                """, (full_name, status, department, date_of_birth, city, phone_number, passport_data, employee_id))
-                conn.commit()
-                logging.info(f"Сотрудник {full_name} успешно обновлён.")
-                self.load_employees()
-                edit_window.destroy()
+
+                def on_saved(result):
+                    logger.info(f"Сотрудник {full_name} успешно обновлён.")
+                    self.employee_view.row_updated(employee_id)
+                    edit_window.destroy()
+
+                self.db.submit(db_update_employee, employee_id,
+                               (full_name, status, department, date_of_birth, city, phone_number, passport_data),
+                               callback=on_saved, errback=self.show_db_error)
             else:
                 messagebox.showwarning("Ошибка", "Заполните обязательные поля!")
 
@@ -373,23 +454,19 @@ class IRamaApp:
         employee_id = self.tree.item(selected_item, "values")[0]
         confirm = messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить этого сотрудника?")
         if confirm:
-            cursor.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
-            conn.commit()
-            self.load_employees()
-            logging.info(f"Сотрудник с ID {employee_id} удалён.")
+            def on_deleted(result):
+                self.employee_view.row_removed(employee_id)
+                logger.info(f"Сотрудник с ID {employee_id} удалён.")
+
+            self.db.submit(db_delete_employee, employee_id, callback=on_deleted, errback=self.show_db_error)
 
     def validate_date(self, date_str):
         """Проверяет, соответствует ли строка формату даты дд.мм.гггг."""
-        try:
-            datetime.strptime(date_str, '%d.%m.%Y')
-            return True
-        except ValueError:
-            return False
+        return validators.validate_date(date_str)
 
     def validate_phone(self, phone):
         """Проверяет, соответствует ли номер телефона формату."""
-        pattern = r'^\+?\d{10,15}$'  # Пример: +79161234567 или 89161234567
-        return re.match(pattern, phone) is not None
+        return validators.validate_phone(phone)
 
     def setup_shifts_tab(self):
         """Настройка вкладки 'Смены'."""
@@ -400,10 +477,156 @@ class IRamaApp:
         pass  # Реализуйте эту функцию, если нужно
 
     def setup_reports_tab(self):
-        """Настройка вкладки 'Отчёты'."""
-        pass  # Реализуйте эту функцию, если нужно
+        """Настройка вкладки 'Отчёты': месячные итоги отделов из сводных таблиц."""
+        self.reports_frame = tk.Frame(self.tab_reports)
+        self.reports_frame.pack(pady=10)
+
+        current_month = datetime.now().strftime("%Y-%m")
+        tk.Label(self.reports_frame, text="С месяца (гггг-мм):").grid(row=0, column=0, padx=5)
+        self.report_start_entry = tk.Entry(self.reports_frame, width=10)
+        self.report_start_entry.insert(0, current_month[:4] + "-01")
+        self.report_start_entry.grid(row=0, column=1, padx=5)
+        tk.Label(self.reports_frame, text="по:").grid(row=0, column=2, padx=5)
+        self.report_end_entry = tk.Entry(self.reports_frame, width=10)
+        self.report_end_entry.insert(0, current_month)
+        self.report_end_entry.grid(row=0, column=3, padx=5)
+        self.report_button = tk.Button(self.reports_frame, text="Итоги отделов", command=self.load_department_summary)
+        self.report_button.grid(row=0, column=4, padx=10)
+        self.timesheet_button = tk.Button(self.reports_frame, text="Итоги сотрудников", command=self.load_employee_summary)
+        self.timesheet_button.grid(row=0, column=5, padx=10)
+        self.export_button = tk.Button(self.reports_frame, text="Экспорт табеля…", command=self.export_timesheet)
+        self.export_button.grid(row=0, column=6, padx=10)
+        self.chart_names = {title: chart for chart, title in charts.CHART_TITLES.items()}
+        self.chart_combo = ttk.Combobox(self.reports_frame, values=list(self.chart_names), state="readonly", width=32)
+        self.chart_combo.current(0)
+        self.chart_combo.grid(row=1, column=0, columnspan=4, padx=5, pady=5, sticky="we")
+        self.chart_button = tk.Button(self.reports_frame, text="График", command=self.show_chart)
+        self.chart_button.grid(row=1, column=4, padx=10, pady=5)
+
+        # График под таблицей; картинку рисует рабочий поток, Tk только показывает PNG
+        self.chart_label = tk.Label(self.tab_reports)
+        self.chart_label.pack(side=tk.BOTTOM, pady=5)
+        self._chart_image = None
+        self._chart_job = None
+        self._chart_version = None
+
+        self.report_tree = ttk.Treeview(self.tab_reports, show="headings")
+        self.report_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def _report_months(self):
+        """Возвращает выбранные месяцы (начало, конец) или None при ошибке ввода."""
+        start_month = self.report_start_entry.get().strip()
+        end_month = self.report_end_entry.get().strip()
+        for value in (start_month, end_month):
+            try:
+                datetime.strptime(value, "%Y-%m")
+            except ValueError:
+                messagebox.showerror("Ошибка", "Месяц должен быть в формате гггг-мм")
+                return None
+        return start_month, end_month
+
+    def _report_dates(self):
+        """Возвращает период (первый день, последний день) по выбранным месяцам."""
+        months = self._report_months()
+        if months is None:
+            return None
+        start_month, end_month = months
+        year, month = map(int, end_month.split("-"))
+        return f"{start_month}-01", f"{end_month}-{calendar.monthrange(year, month)[1]:02d}"
+
+    def _show_report(self, columns, rows):
+        self.report_tree.delete(*self.report_tree.get_children())
+        self.report_tree["columns"] = columns
+        for column in columns:
+            self.report_tree.heading(column, text=column)
+        for row in rows:
+            self.report_tree.insert("", "end", values=row)
+
+    def load_department_summary(self):
+        """Загружает итоги отделов за выбранные месяцы из сводных таблиц."""
+        months = self._report_months()
+        if months is None:
+            return
+
+        def show_summary(rows):
+            columns = ("Отдел", "Месяц", "Сотрудников", "Часы", "Опоздания", "Без ухода",
+                       "Смен", "Отработано смен", "Покрытие")
+            self._show_report(columns, [
+                (department or "—", month, employees, hours, late, missing, scheduled, attended,
+                 f"{attended / scheduled:.0%}" if scheduled else "—")
+                for department, month, employees, hours, late, missing, scheduled, attended in rows
+            ])
+
+        self.db.submit(lambda conn: department_monthly(*months, conn=conn),
+                       priority=PRIORITY_REPORT, callback=show_summary, errback=self.show_db_error)
+
+    def load_employee_summary(self):
+        """Загружает табельные итоги сотрудников за выбранные месяцы."""
+        period = self._report_dates()
+        if period is None:
+            return
+
+        def show_summary(summary):
+            self._show_report(tuple(summary.columns), summary.itertuples(index=False, name=None))
+
+        self.db.submit(db_employee_summary, *period,
+                       priority=PRIORITY_REPORT, callback=show_summary, errback=self.show_db_error)
+
+    def show_chart(self):
+        """Показывает выбранный график за выбранные месяцы.
+
+        Картинка последней известной версии данных показывается сразу из кэша;
+        фоновое задание пересчитывает сводки и перерисовывает график, только
+        если данные изменились.
+        """
+        period = self._report_dates()
+        if period is None:
+            return
+        chart = self.chart_names[self.chart_combo.get()]
+        cached = charts.get_chart_cache().get(charts.cache_key(chart, *period, size=CHART_SIZE,
+                                                               version=self._chart_version))
+        if cached is not None:
+            self._display_chart(cached)
+        if self._chart_job is not None:
+            self._chart_job.cancel()
+
+        def on_rendered(result):
+            self._chart_version, png = result
+            if png is not cached:
+                self._display_chart(png)
+
+        self._chart_job = self.db.submit(db_render_chart, chart, *period, CHART_SIZE,
+                                         priority=PRIORITY_REPORT, callback=on_rendered, errback=self.show_db_error)
+
+    def _display_chart(self, png):
+        # Ссылка на PhotoImage хранится, иначе картинку удалит сборщик мусора
+        self._chart_image = tk.PhotoImage(data=base64.b64encode(png))
+        self.chart_label.config(image=self._chart_image)
+
+    def export_timesheet(self):
+        """Сохраняет табель за выбранные месяцы в XLSX или CSV."""
+        period = self._report_dates()
+        if period is None:
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")],
+            initialfile=f"tabel_{period[0]}_{period[1]}.xlsx",
+        )
+        if not path:
+            return
+        self.db.submit(db_export_timesheet, path, *period,
+                       priority=PRIORITY_REPORT,
+                       callback=lambda count: messagebox.showinfo("Готово", f"Табель сохранён: {path}"),
+                       errback=self.show_db_error)
 
 if __name__ == "__main__":
+    setup_logging()
     root = tk.Tk()
     app = IRamaApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.protocol("WM_DELETE_WINDOW", app.close)
+    try:
+        root.mainloop()
+    finally:
+        close_all_connections()
+        shutdown_logging()
\ No newline at end of file
@@ -10,7 +10,18 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Модули, которые iRama никогда не использует; тяжёлые зависимости, нужные
+    # отдельным функциям (pandas, matplotlib, tkcalendar), импортируются лениво и остаются
+    excludes=[
+        'IPython', 'jupyter_client', 'jupyter_core', 'notebook', 'ipykernel', 'zmq', 'tornado',
+        'pytest', '_pytest', 'sphinx', 'docutils', 'pydoc_data', 'lib2to3', 'test', 'tkinter.test',
+        'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'wx', 'gi',
+        'matplotlib.backends.backend_qtagg', 'matplotlib.backends.backend_qt5agg',
+        'matplotlib.backends.backend_webagg', 'matplotlib.backends.backend_gtk3agg',
+        'matplotlib.backends.backend_wxagg', 'matplotlib.backends.backend_pdf',
+        'matplotlib.backends.backend_svg', 'matplotlib.backends.backend_pgf',
+        'scipy', 'numba', 'sqlalchemy', 'psycopg2', 'pymysql', 'xlrd', 'tables',
+    ],
     noarchive=False,
     optimize=0,
 )
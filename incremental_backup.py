@@ -0,0 +1,230 @@
+"""Инкрементальные резервные копии с дедупликацией по блокам страниц.
+
+Снимок базы делится на блоки по CHUNK_PAGES страниц SQLite (по умолчанию —
+постранично); каждый блок хранится один раз в хранилище, адресуемом по
+SHA-256. Хранилище — отдельный файл SQLite (backups/incremental/chunks.db):
+миллионы блоков по 4 КБ в виде отдельных файлов обходились бы слишком дорого.
+Для каждого снимка пишется небольшой манифест со списком хешей блоков,
+поэтому при почти неизменной истории посещаемости новый снимок добавляет
+только изменившиеся страницы, а восстановить можно любой снимок.
+
+Запуск: python incremental_backup.py create | list | restore ID | prune --keep N
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import database
+from backup import BACKUP_DIR, copy_database, restore_backup
+from database import create_connection
+from log_config import setup_logging
+
+logger = logging.getLogger('iRama.incremental_backup')
+
+STORE_DIR = os.path.join(BACKUP_DIR, 'incremental')
+CHUNK_PAGES = 1
+COMPRESS_LEVEL = 1
+
+
+def _open_store(store_dir):
+    """Открывает хранилище блоков: digest → сжатые данные."""
+    store = sqlite3.connect(os.path.join(store_dir, 'chunks.db'), isolation_level=None)
+    # Пишет только процесс резервного копирования: WAL здесь лишь оставлял бы крупный -wal
+    store.execute("PRAGMA journal_mode = DELETE")
+    # Обычная rowid-таблица: WITHOUT ROWID неэффективна для строк размером со страницу
+    store.execute("CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, digest BLOB NOT NULL UNIQUE, data BLOB NOT NULL)")
+    return store
+
+
+def _snapshots_dir(store_dir):
+    return os.path.join(store_dir, 'snapshots')
+
+
+def _write_atomic(path, data):
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _take_snapshot_copy(db_path, directory):
+    """Снимает согласованную копию работающей базы во временный файл."""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    os.close(fd)
+    src = create_connection(db_path)
+    if src is None:
+        raise sqlite3.OperationalError(f"cannot open {db_path}")
+    dst = sqlite3.connect(tmp_path)
+    try:
+        copy_database(src, dst)
+        dst.execute("PRAGMA journal_mode = DELETE")
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    return tmp_path, page_size
+
+
+def create_snapshot(db_path=None, store_dir=STORE_DIR, chunk_pages=CHUNK_PAGES):
+    """Создаёт инкрементальный снимок; возвращает манифест (dict) или None."""
+    db_path = db_path or database.DB_PATH
+    try:
+        os.makedirs(_snapshots_dir(store_dir), exist_ok=True)
+        start = time.perf_counter()
+        tmp_path, page_size = _take_snapshot_copy(db_path, store_dir)
+        chunk_size = page_size * chunk_pages
+        chunks = []
+        new_chunks = 0
+        bytes_written = 0
+        store = _open_store(store_dir)
+        try:
+            store.execute("BEGIN")
+            with open(tmp_path, 'rb') as file:
+                while True:
+                    data = file.read(chunk_size)
+                    if not data:
+                        break
+                    digest = hashlib.sha256(data).digest()
+                    chunks.append(digest.hex())
+                    if store.execute("SELECT 1 FROM chunks WHERE digest = ?", (digest,)).fetchone() is None:
+                        payload = zlib.compress(data, COMPRESS_LEVEL)
+                        store.execute("INSERT INTO chunks (digest, data) VALUES (?, ?)", (digest, payload))
+                        new_chunks += 1
+                        bytes_written += len(payload)
+            # Блоки фиксируются до записи манифеста, который на них ссылается
+            store.execute("COMMIT")
+            db_size = os.path.getsize(tmp_path)
+        finally:
+            if store.in_transaction:
+                store.execute("ROLLBACK")
+            store.close()
+            os.remove(tmp_path)
+
+        snapshot_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        manifest = {
+            'id': snapshot_id,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'db_size': db_size,
+            'page_size': page_size,
+            'chunk_size': chunk_size,
+            'chunks': chunks,
+        }
+        manifest_data = json.dumps(manifest).encode('utf-8')
+        _write_atomic(os.path.join(_snapshots_dir(store_dir), f'{snapshot_id}.json'), manifest_data)
+        bytes_written += len(manifest_data)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Incremental snapshot {snapshot_id}: {new_chunks}/{len(chunks)} new chunks, "
+                    f"{bytes_written} bytes written in {elapsed:.2f}s",
+                    extra={'elapsed_ms': round(elapsed * 1000, 1), 'bytes_written': bytes_written})
+        return {**manifest, 'new_chunks': new_chunks, 'bytes_written': bytes_written, 'elapsed': elapsed}
+    except Exception as e:
+        logger.error(f"Incremental snapshot failed: {str(e)}")
+        return None
+
+
+def list_snapshots(store_dir=STORE_DIR):
+    """Возвращает id снимков, от старых к новым."""
+    directory = _snapshots_dir(store_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+
+
+def load_manifest(snapshot_id, store_dir=STORE_DIR):
+    with open(os.path.join(_snapshots_dir(store_dir), f'{snapshot_id}.json'), encoding='utf-8') as file:
+        return json.load(file)
+
+
+def materialize_snapshot(snapshot_id, target_path, store_dir=STORE_DIR):
+    """Собирает файл базы снимка из блоков, проверяя их хеши."""
+    manifest = load_manifest(snapshot_id, store_dir)
+    store = _open_store(store_dir)
+    try:
+        with open(target_path, 'wb') as target:
+            for digest in manifest['chunks']:
+                row = store.execute("SELECT data FROM chunks WHERE digest = ?", (bytes.fromhex(digest),)).fetchone()
+                if row is None:
+                    raise ValueError(f"chunk {digest} is missing")
+                data = zlib.decompress(row[0])
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError(f"chunk {digest} is corrupted")
+                target.write(data)
+    finally:
+        store.close()
+    if os.path.getsize(target_path) != manifest['db_size']:
+        raise ValueError("restored size does not match the manifest")
+    return target_path
+
+
+def restore_snapshot(snapshot_id, db_path=None, store_dir=STORE_DIR):
+    """Восстанавливает рабочую базу из снимка (с проверкой целостности)."""
+    db_path = db_path or database.DB_PATH
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    try:
+        materialize_snapshot(snapshot_id, tmp_path, store_dir)
+        return restore_backup(tmp_path, db_path)
+    except Exception as e:
+        logger.error(f"Snapshot restore failed: {str(e)}")
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+def prune_snapshots(keep_last, store_dir=STORE_DIR):
+    """Оставляет keep_last новых снимков и удаляет блоки, на которые никто не ссылается."""
+    snapshots = list_snapshots(store_dir)
+    removed = snapshots[:-keep_last] if keep_last > 0 else snapshots[:-1]
+    for snapshot_id in removed:
+        os.remove(os.path.join(_snapshots_dir(store_dir), f'{snapshot_id}.json'))
+    live = set()
+    for snapshot_id in list_snapshots(store_dir):
+        live.update(bytes.fromhex(digest) for digest in load_manifest(snapshot_id, store_dir)['chunks'])
+    store = _open_store(store_dir)
+    try:
+        unused = [row[0] for row in store.execute("SELECT digest FROM chunks") if row[0] not in live]
+        store.execute("BEGIN")
+        store.executemany("DELETE FROM chunks WHERE digest = ?", ((digest,) for digest in unused))
+        store.execute("COMMIT")
+    finally:
+        store.close()
+    logger.info(f"Pruned {len(removed)} snapshots, freed {len(unused)} chunks")
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental iRama backups")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create')
+    subparsers.add_parser('list')
+    restore_parser = subparsers.add_parser('restore')
+    restore_parser.add_argument('snapshot_id')
+    prune_parser = subparsers.add_parser('prune')
+    prune_parser.add_argument('--keep', type=int, required=True)
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.command == 'create':
+        manifest = create_snapshot()
+        if manifest is None:
+            raise SystemExit(1)
+        print(f"{manifest['id']}: {manifest['new_chunks']}/{len(manifest['chunks'])} new chunks, "
+              f"{manifest['bytes_written']} bytes")
+    elif args.command == 'list':
+        for snapshot_id in list_snapshots():
+            print(snapshot_id)
+    elif args.command == 'restore':
+        raise SystemExit(0 if restore_snapshot(args.snapshot_id) else 1)
+    elif args.command == 'prune':
+        prune_snapshots(args.keep)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Централизованная настройка журналов iRama.
+
+Все модули пишут в логгеры иерархии 'iRama' ('iRama.database',
+'iRama.backup' и т.д.). setup_logging() вешает на 'iRama' QueueHandler: вызов
+logger.info() только кладёт запись в очередь, а в файлы её пишет поток
+QueueListener, поэтому запись на диск не задерживает вставки. Поток
+просыпается раз в FLUSH_INTERVAL и пишет накопившееся пачкой: будить его на
+каждую запись дороже, чем сама запись. Файлы — UTF-8
+с ротацией по размеру (или по времени, если задан rotate_when); журнал
+медленных запросов 'iRama.slow' пишется в отдельный файл. По желанию
+(json_lines=True или IRAMA_LOG_JSON=1) дублируется JSON Lines со всеми
+дополнительными полями записи, например elapsed_ms и rows.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+LOG_PATH = 'irama.log'
+SLOW_LOG_PATH = 'irama_slow.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+SLOW_LOGGER = 'iRama.slow'
+# Как часто поток записи забирает очередь, с
+FLUSH_INTERVAL = 0.02
+
+# Атрибуты, которые есть у любой LogRecord; остальные пришли через extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Запись журнала как одна JSON-строка с полями из extra."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text or record.exc_info:
+            entry['exception'] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ThreadQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler для очереди внутри процесса.
+
+    Стандартный prepare форматирует и копирует запись, чтобы её можно было
+    передать в другой процесс; здесь достаточно зафиксировать текст сообщения,
+    чтобы последующие изменения аргументов не попали в журнал.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _BatchingListener(logging.handlers.QueueListener):
+    """QueueListener, забирающий очередь пачками раз в FLUSH_INTERVAL."""
+
+    def __init__(self, log_queue, *handlers, respect_handler_level=False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self._wake = threading.Event()
+
+    def enqueue_sentinel(self):
+        super().enqueue_sentinel()
+        self._wake.set()
+
+    def _monitor(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            while True:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    return
+                self.handle(record)
+
+
+class _NameFilter(logging.Filter):
+    """Пропускает (или, при exclude, отбрасывает) записи одного логгера."""
+
+    def __init__(self, name, exclude=False):
+        super().__init__()
+        self.logger_name = name
+        self.exclude = exclude
+
+    def filter(self, record):
+        return (record.name == self.logger_name) != self.exclude
+
+
+def _file_handler(path, rotate_when, max_bytes, backup_count):
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count,
+                                                         encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8', delay=True)
+
+
+def setup_logging(log_path=LOG_PATH, level=None, json_lines=None, rotate_when=None,
+                  max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, slow_log_path=SLOW_LOG_PATH):
+    """Настраивает журналы 'iRama' один раз на процесс; повторные вызовы ничего не меняют.
+
+    rotate_when — интервал TimedRotatingFileHandler ('midnight', 'H', ...);
+    без него файлы ротируются по размеру max_bytes.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+        if level is None:
+            level = os.environ.get('IRAMA_LOG_LEVEL', 'INFO').upper()
+        if json_lines is None:
+            json_lines = os.environ.get('IRAMA_LOG_JSON', '0') == '1'
+
+        text_formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+        main_handler = _file_handler(log_path, rotate_when, max_bytes, backup_count)
+        main_handler.setFormatter(text_formatter)
+        main_handler.addFilter(_NameFilter(SLOW_LOGGER, exclude=True))
+        slow_handler = _file_handler(slow_log_path, rotate_when, max_bytes, backup_count)
+        slow_handler.setFormatter(text_formatter)
+        slow_handler.addFilter(_NameFilter(SLOW_LOGGER))
+        handlers = [main_handler, slow_handler]
+        if json_lines:
+            json_handler = _file_handler(os.path.splitext(log_path)[0] + '.jsonl', rotate_when,
+                                         max_bytes, backup_count)
+            json_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(json_handler)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _ThreadQueueHandler(log_queue)
+        logger = logging.getLogger('iRama')
+        logger.setLevel(level)
+        logger.addHandler(_queue_handler)
+        # Записи 'iRama' не дублируются обработчиками корневого логгера
+        logger.propagate = False
+        _listener = _BatchingListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging():
+    """Дописывает очередь в файлы и останавливает поток записи."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logger = logging.getLogger('iRama')
+        logger.removeHandler(_queue_handler)
+        logger.propagate = True
+        _listener = None
+        _queue_handler = None
+
+
+atexit.register(shutdown_logging)
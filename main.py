@@ -1,91 +1,84 @@
 import sqlite3
-from database import create_connection, backup_database
-from models import Employee, Shift, Attendance
-import csv
+from database import transaction, backup_database, create_tables
+from reports import write_attendance_report
+from parallel_reports import run_parallel_report
+from schedule import check_shift
+from attendance_buffer import get_buffer
+from log_config import setup_logging
+from timestamps import to_epoch_day
+from repository import get_repository
 import logging
 
-# Настройка логирования
-logging.basicConfig(
-    filename='irama.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+logger = logging.getLogger('iRama.main')
 
 def add_employee(surname, name, patronymic, status, department):
     """Добавляет сотрудника в базу данных."""
     try:
         full_name = f"{surname} {name} {patronymic}" if patronymic else f"{surname} {name}"
-        with create_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO employees (name, status, department) VALUES (?, ?, ?)''',
-                           (full_name, status, department))
-            conn.commit()
-            logging.info(f"Сотрудник {full_name} успешно добавлен.")
+        get_repository().add(name=full_name, status=status, department=department)
+        logger.info(f"Сотрудник {full_name} успешно добавлен.")
     except sqlite3.IntegrityError:
-        logging.error("Ошибка: Сотрудник с таким именем уже существует.")
+        logger.error("Ошибка: Сотрудник с таким именем уже существует.")
     except Exception as e:
-        logging.error(f"Ошибка при добавлении сотрудника: {e}")
+        logger.error(f"Ошибка при добавлении сотрудника: {e}")
 
 def delete_employee(employee_id):
     """Удаляет сотрудника из базы данных."""
     try:
-        with create_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''DELETE FROM employees WHERE id = ?''', (employee_id,))
-            conn.commit()
-            logging.info(f"Сотрудник с ID {employee_id} успешно удалён.")
+        get_repository().delete(employee_id)
+        logger.info(f"Сотрудник с ID {employee_id} успешно удалён.")
     except Exception as e:
-        logging.error(f"Ошибка при удалении сотрудника: {e}")
+        logger.error(f"Ошибка при удалении сотрудника: {e}")
 
 def add_shift(employee_id, shift_date, start_time, end_time):
     """Добавляет смену в базу данных."""
     try:
-        with create_connection() as conn:
+        with transaction(mode='IMMEDIATE') as conn:
+            check_shift(conn, employee_id, shift_date, start_time, end_time)
             cursor = conn.cursor()
             cursor.execute('''INSERT INTO shifts (employee_id, shift_date, start_time, end_time) VALUES (?, ?, ?, ?)''',
-                           (employee_id, shift_date, start_time, end_time))
-            conn.commit()
-            logging.info(f"Смена для сотрудника {employee_id} успешно добавлена.")
+                           (employee_id, to_epoch_day(shift_date), start_time, end_time))
+        logger.info(f"Смена для сотрудника {employee_id} успешно добавлена.")
     except Exception as e:
-        logging.error(f"Ошибка при добавлении смены: {e}")
+        logger.error(f"Ошибка при добавлении смены: {e}")
 
-def add_attendance(employee_id, shift_id, check_in_time, check_out_time=None):
-    """Добавляет запись о посещаемости."""
+def add_attendance(employee_id, shift_id, check_in_time, check_out_time=None, wait=True):
+    """Добавляет запись о посещаемости через буфер групповой записи.
+
+    С wait=False не ждёт COMMIT и возвращает Future с id записи.
+    """
     try:
-        with create_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)''',
-                           (employee_id, shift_id, check_in_time, check_out_time))
-            conn.commit()
-            logging.info(f"Запись о посещаемости для сотрудника {employee_id} успешно добавлена.")
+        future = get_buffer().submit(employee_id, shift_id, check_in_time, check_out_time, flush_soon=wait)
+        if not wait:
+            return future
+        attendance_id = future.result()
+        logger.info(f"Запись о посещаемости для сотрудника {employee_id} успешно добавлена.")
+        return attendance_id
     except Exception as e:
-        logging.error(f"Ошибка при добавлении посещаемости: {e}")
+        logger.error(f"Ошибка при добавлении посещаемости: {e}")
 
-def generate_attendance_report(start_date, end_date):
+def generate_attendance_report(start_date, end_date, output="attendance_report.csv",
+                               department=None, employee_id=None, progress=None):
     """Генерирует отчёт по посещаемости за указанный период."""
     try:
-        with create_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT e.name, a.check_in_time, a.check_out_time
-                FROM attendance a
-                JOIN employees e ON a.employee_id = e.id
-                WHERE a.check_in_time BETWEEN ? AND ?
-            ''', (start_date, end_date))
-            data = cursor.fetchall()
-
-            # Сохранение в CSV
-            with open("attendance_report.csv", "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["Сотрудник", "Приход", "Уход"])
-                writer.writerows(data)
-            logging.info("Отчёт сохранён в attendance_report.csv")
+        rows = write_attendance_report(output, start_date, end_date, department=department,
+                                       employee_id=employee_id, progress=progress)
+        logger.info(f"Отчёт сохранён в {output}")
+        return rows
     except Exception as e:
-        logging.error(f"Ошибка: {e}")
+        logger.error(f"Ошибка: {e}")
+
+def generate_department_reports(start_date, end_date, output_dir="reports", workers=None):
+    """Генерирует отчёты по отделам и общий отчёт параллельно в нескольких процессах."""
+    summary = run_parallel_report(output_dir, start_date, end_date, workers)
+    if summary is not None:
+        logger.info(f"Отчёты по отделам сохранены в {output_dir}")
+    return summary
 
 if __name__ == "__main__":
+    setup_logging()
     # Пример использования функций
+    create_tables()  # Приводим схему к актуальной версии
     backup_database()  # Создаём резервную копию перед началом работы
     add_employee('Иванов', 'Иван', 'Иванович', 'Основной', 'Отдел продаж')
     add_shift(1, '2023-10-15', '09:00', '18:00')
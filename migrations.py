@@ -0,0 +1,388 @@
+"""Версионные миграции схемы базы данных iRama.
+
+Текущая версия хранится в таблице schema_version. При запуске выполняется
+один запрос MAX(version); шаги из MIGRATIONS применяются по порядку, каждый
+в своей транзакции, только если они ещё не применены.
+
+Запуск: python migrations.py [--check]
+"""
+import argparse
+import logging
+import sqlite3
+from datetime import datetime
+
+from aggregates import create_aggregate_schema, mark_all_dirty
+from archive import create_archive_schema
+from attendance_buffer import create_journal_schema
+from change_log import create_change_log_schema
+from database import PRAGMAS, get_connection, transaction
+from log_config import setup_logging
+from timestamps import to_epoch, to_epoch_day
+
+logger = logging.getLogger('iRama.migrations')
+
+EMPLOYEE_COLUMNS = {
+    'department': 'TEXT',
+    'date_of_birth': 'TEXT',
+    'city': 'TEXT',
+    'phone_number': 'TEXT',
+    'passport_data': 'TEXT',
+}
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _rebuild_table(conn, table, create_sql, columns, expressions=None):
+    """Пересоздаёт таблицу по новому описанию, сохраняя строки и счётчик id.
+
+    expressions — {столбец: SQL-выражение} для значений, которые нужно
+    преобразовать при копировании.
+    """
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    existing = _columns(conn, table)
+    copied = [c for c in columns if c in existing]
+    expressions = expressions or {}
+    values = ', '.join(expressions.get(c, c) for c in copied)
+    conn.execute(create_sql.replace(f"CREATE TABLE {table} ", f"CREATE TABLE {table}_new ", 1))
+    conn.execute(f"INSERT INTO {table}_new ({', '.join(copied)}) SELECT {values} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    if seq is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq[0], table))
+
+
+def _migration_1_baseline(conn):
+    """Базовая схема; сводит employees из database.py и gui.py к одному виду."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS departments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            status TEXT,
+            department TEXT,
+            date_of_birth TEXT,
+            city TEXT,
+            phone_number TEXT,
+            passport_data TEXT
+        )
+    ''')
+    # Старая нормализованная схема (department_id): добавляем недостающие
+    # столбцы и переносим название отдела, department_id не удаляем
+    existing = _columns(conn, 'employees')
+    for column, column_type in EMPLOYEE_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE employees ADD COLUMN {column} {column_type}")
+    if 'department_id' in existing:
+        conn.execute('''
+            UPDATE employees
+            SET department = (SELECT d.name FROM departments d WHERE d.id = employees.department_id)
+            WHERE department IS NULL AND department_id IS NOT NULL
+        ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_date TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_id INTEGER,
+            check_in_time TEXT,
+            check_out_time TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees (id),
+            FOREIGN KEY (shift_id) REFERENCES shifts (id)
+        )
+    ''')
+
+
+def _migration_2_cascade_foreign_keys(conn):
+    """Каскадное удаление смен и посещаемости вместе с сотрудником."""
+    _rebuild_table(conn, 'shifts', '''
+        CREATE TABLE shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_date TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE
+        )
+    ''', ['id', 'employee_id', 'shift_date', 'start_time', 'end_time'])
+    _rebuild_table(conn, 'attendance', '''
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_id INTEGER,
+            check_in_time TEXT,
+            check_out_time TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE,
+            FOREIGN KEY (shift_id) REFERENCES shifts (id) ON DELETE CASCADE
+        )
+    ''', ['id', 'employee_id', 'shift_id', 'check_in_time', 'check_out_time'])
+
+
+def _migration_3_indexes(conn):
+    """Индексы под запросы отчётов, поиска и каскадных удалений."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_check_in ON attendance (check_in_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_employee_check_in ON attendance (employee_id, check_in_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_shift ON attendance (shift_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_shifts_employee_date ON shifts (employee_id, shift_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_department ON employees (department)")
+
+
+def _migration_4_employee_search(conn):
+    """Полнотекстовый индекс FTS5 (триграммы) по сотрудникам и триггеры синхронизации."""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+                name, department, status, city, phone_number,
+                content='employees', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # Сборка SQLite без FTS5 или без триграмм: поиск работает через LIKE
+        logger.warning(f"Индекс поиска не создан: {e}")
+        return
+    # Триггеры создаются по одному: executescript завершил бы транзакцию миграции
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_insert AFTER INSERT ON employees BEGIN
+            INSERT INTO employees_fts (rowid, name, department, status, city, phone_number)
+            VALUES (new.id, new.name, new.department, new.status, new.city, new.phone_number);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_delete AFTER DELETE ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name, department, status, city, phone_number)
+            VALUES ('delete', old.id, old.name, old.department, old.status, old.city, old.phone_number);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_update
+        AFTER UPDATE OF name, department, status, city, phone_number ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name, department, status, city, phone_number)
+            VALUES ('delete', old.id, old.name, old.department, old.status, old.city, old.phone_number);
+            INSERT INTO employees_fts (rowid, name, department, status, city, phone_number)
+            VALUES (new.id, new.name, new.department, new.status, new.city, new.phone_number);
+        END
+    ''')
+    conn.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+
+
+def _migration_5_attendance_aggregates(conn):
+    create_aggregate_schema(conn)
+    # Пересчёт накопленной истории выполнится при первом чтении сводок
+    mark_all_dirty(conn)
+
+
+def _migration_6_attendance_journal(conn):
+    create_journal_schema(conn)
+
+
+# Форматы, в которых даты попадали в базу до перехода на целые числа
+_LEGACY_FORMATS = ('%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y')
+
+
+def _parse_legacy(value):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        pass
+    for fmt in _LEGACY_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _legacy_converter(convert):
+    """SQL-функция перевода старой строки; нераспознанное значение остаётся как есть."""
+    def legacy(value):
+        if not isinstance(value, str):
+            return value if value is None else int(value)
+        parsed = _parse_legacy(value)
+        return value if parsed is None else convert(parsed)
+    return legacy
+
+
+def _migration_7_integer_timestamps(conn):
+    """Отметки времени — секунды эпохи, даты смен — номера дней (см. timestamps.py)."""
+    conn.create_function('legacy_epoch', 1, _legacy_converter(to_epoch), deterministic=True)
+    conn.create_function('legacy_epoch_day', 1, _legacy_converter(to_epoch_day), deterministic=True)
+    _rebuild_table(conn, 'shifts', '''
+        CREATE TABLE shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_date INTEGER,
+            start_time TEXT,
+            end_time TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE
+        )
+    ''', ['id', 'employee_id', 'shift_date', 'start_time', 'end_time'],
+        {'shift_date': 'legacy_epoch_day(shift_date)'})
+    _rebuild_table(conn, 'attendance', '''
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            shift_id INTEGER,
+            check_in_time INTEGER,
+            check_out_time INTEGER,
+            FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE,
+            FOREIGN KEY (shift_id) REFERENCES shifts (id) ON DELETE CASCADE
+        )
+    ''', ['id', 'employee_id', 'shift_id', 'check_in_time', 'check_out_time'],
+        {'check_in_time': 'legacy_epoch(check_in_time)', 'check_out_time': 'legacy_epoch(check_out_time)'})
+    # Вместе со старыми таблицами удалены их индексы и триггеры сводок; сводки
+    # пересчитываются при первом чтении (миграция 5 на строковых датах их не заполнит)
+    _migration_3_indexes(conn)
+    create_aggregate_schema(conn)
+    mark_all_dirty(conn)
+    for table, column in (('shifts', 'shift_date'), ('attendance', 'check_in_time'),
+                          ('attendance', 'check_out_time')):
+        left = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE typeof({column}) NOT IN ('integer', 'null')"
+                            ).fetchone()[0]
+        if left:
+            logger.warning(f"{table}.{column}: не распознано значений — {left}, они оставлены строками")
+
+
+def _migration_8_archive_periods(conn):
+    create_archive_schema(conn)
+
+
+def _migration_9_chart_support(conn):
+    # Индекс по day заменяется покрывающим (его первый столбец — тоже day)
+    conn.execute("DROP INDEX IF EXISTS idx_employee_daily_stats_day")
+    # Схема сводок создаётся с IF NOT EXISTS: повторный вызов добавит только новое
+    create_aggregate_schema(conn)
+
+
+def _migration_10_change_log(conn):
+    # Журнал начинается с пустого: существующие строки потребители берут полной выгрузкой
+    create_change_log_schema(conn)
+
+
+def _migration_11_employee_sort_indexes(conn):
+    """Индексы под сортировку таблицы сотрудников по любому столбцу (employee_table.py)."""
+    # idx_employees_department уже создан миграцией 3
+    for column in ('name', 'status', 'department', 'date_of_birth', 'city', 'phone_number', 'passport_data'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_employees_{column} ON employees ({column})")
+
+
+# Упорядоченный список шагов: (версия, описание, функция)
+MIGRATIONS = [
+    (1, "Базовая схема", _migration_1_baseline),
+    (2, "Каскадные внешние ключи", _migration_2_cascade_foreign_keys),
+    (3, "Индексы", _migration_3_indexes),
+    (4, "Полнотекстовый поиск сотрудников", _migration_4_employee_search),
+    (5, "Сводные таблицы посещаемости", _migration_5_attendance_aggregates),
+    (6, "Журнал буфера отметок", _migration_6_attendance_journal),
+    (7, "Целочисленные даты и отметки времени", _migration_7_integer_timestamps),
+    (8, "Реестр архивных периодов", _migration_8_archive_periods),
+    (9, "Версия сводных таблиц и индекс для графиков", _migration_9_chart_support),
+    (10, "Журнал изменений", _migration_10_change_log),
+    (11, "Индексы для сортировки сотрудников", _migration_11_employee_sort_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Возвращает текущую версию схемы (0 для новой базы)."""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(conn=None):
+    """Применяет недостающие миграции; возвращает итоговую версию схемы."""
+    conn = conn or get_connection()
+    version = get_schema_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+
+    # Пересборка таблиц требует отключённых внешних ключей (вне транзакции)
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+        ''')
+        for step_version, description, step in MIGRATIONS:
+            with transaction(conn, 'IMMEDIATE'):
+                # Повторная проверка под блокировкой: другой процесс мог успеть
+                if get_schema_version(conn) >= step_version:
+                    continue
+                step(conn)
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                             (step_version, description))
+                logger.info(f"Применена миграция {step_version}: {description}")
+        version = get_schema_version(conn)
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            logger.warning(f"Найдено строк с нарушением внешних ключей: {len(violations)}")
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {PRAGMAS['foreign_keys']}")
+    return version
+
+
+# Запросы приложения и индексы, которые они должны использовать
+EXPECTED_QUERY_PLANS = [
+    ("SELECT e.name, a.check_in_time, a.check_out_time FROM attendance a "
+     "JOIN employees e ON a.employee_id = e.id WHERE a.check_in_time >= ? AND a.check_in_time < ?",
+     (1696118400, 1698796800), 'idx_attendance_check_in'),
+    ("SELECT * FROM attendance WHERE employee_id = ? AND check_in_time >= ? AND check_in_time < ?",
+     (1, 1696118400, 1698796800), 'idx_attendance_employee_check_in'),
+    ("SELECT * FROM shifts WHERE employee_id = ? AND shift_date = ?",
+     (1, 19645), 'idx_shifts_employee_date'),
+    ("SELECT * FROM employees WHERE department = ?",
+     ('Отдел продаж',), 'idx_employees_department'),
+]
+
+
+def check_query_plans(conn=None):
+    """Проверяет через EXPLAIN QUERY PLAN, что запросы используют индексы.
+
+    Возвращает список (запрос, план, ожидаемый индекс, используется ли он).
+    """
+    conn = conn or get_connection()
+    results = []
+    for sql, params, index in EXPECTED_QUERY_PLANS:
+        plan = ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+        results.append((sql, plan, index, index in plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы iRama")
+    parser.add_argument('--check', action='store_true', help="проверить планы запросов")
+    args = parser.parse_args()
+    setup_logging()
+    version = migrate()
+    print(f"Версия схемы: {version}")
+    if args.check:
+        failed = 0
+        for sql, plan, index, ok in check_query_plans():
+            print(f"{'OK  ' if ok else 'FAIL'} {index}: {plan}")
+            failed += not ok
+        raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
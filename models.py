@@ -1,13 +1,14 @@
 import sqlite3
 import logging
+from database import transaction
+from schedule import check_shift
+from attendance_buffer import get_buffer
+from timestamps import to_epoch_day
 
-# Настройка логирования
-logging.basicConfig(
-    filename='irama.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+logger = logging.getLogger('iRama.models')
+
+# Столбцы employees в порядке отображения в таблице сотрудников
+EMPLOYEE_COLUMNS = ('id', 'name', 'status', 'department', 'date_of_birth', 'city', 'phone_number', 'passport_data')
 
 class Employee:
     def __init__(self, surname, name, patronymic, status, department):
@@ -16,19 +17,14 @@ class Employee:
         self.department = department
 
     def save(self):
+        from repository import get_repository  # repository импортирует models
         try:
-            conn = sqlite3.connect('irama.db')
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO employees (name, status, department) VALUES (?, ?, ?)''',
-                           (self.full_name, self.status, self.department))
-            conn.commit()
-            logging.info(f"Сотрудник {self.full_name} успешно добавлен.")
+            self.id = get_repository().add(name=self.full_name, status=self.status, department=self.department)
+            logger.info(f"Сотрудник {self.full_name} успешно добавлен.")
         except sqlite3.IntegrityError:
-            logging.error("Ошибка: Сотрудник с таким именем уже существует.")
+            logger.error("Ошибка: Сотрудник с таким именем уже существует.")
         except Exception as e:
-            logging.error(f"Ошибка при добавлении сотрудника: {e}")
-        finally:
-            conn.close()
+            logger.error(f"Ошибка при добавлении сотрудника: {e}")
 
 class Shift:
     def __init__(self, employee_id, shift_date, start_time, end_time):
@@ -39,16 +35,15 @@ class Shift:
 
     def save(self):
         try:
-            conn = sqlite3.connect('irama.db')
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO shifts (employee_id, shift_date, start_time, end_time) VALUES (?, ?, ?, ?)''',
-                           (self.employee_id, self.shift_date, self.start_time, self.end_time))
-            conn.commit()
-            logging.info(f"Смена для сотрудника {self.employee_id} успешно добавлена.")
+            # IMMEDIATE: между проверкой графика и вставкой никто не добавит смену
+            with transaction(mode='IMMEDIATE') as conn:
+                check_shift(conn, self.employee_id, self.shift_date, self.start_time, self.end_time)
+                cursor = conn.cursor()
+                cursor.execute('''INSERT INTO shifts (employee_id, shift_date, start_time, end_time) VALUES (?, ?, ?, ?)''',
+                               (self.employee_id, to_epoch_day(self.shift_date), self.start_time, self.end_time))
+            logger.info(f"Смена для сотрудника {self.employee_id} успешно добавлена.")
         except Exception as e:
-            logging.error(f"Ошибка при добавлении смены: {e}")
-        finally:
-            conn.close()
+            logger.error(f"Ошибка при добавлении смены: {e}")
 
 class Attendance:
     def __init__(self, employee_id, shift_id, check_in_time, check_out_time=None):
@@ -57,15 +52,15 @@ class Attendance:
         self.check_in_time = check_in_time
         self.check_out_time = check_out_time
 
-    def save(self):
+    def save(self, wait=True):
+        """Сохраняет отметку через буфер групповой записи; с wait=False возвращает Future."""
         try:
-            conn = sqlite3.connect('irama.db')
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO attendance (employee_id, shift_id, check_in_time, check_out_time) VALUES (?, ?, ?, ?)''',
-                           (self.employee_id, self.shift_id, self.check_in_time, self.check_out_time))
-            conn.commit()
-            logging.info(f"Запись о посещаемости для сотрудника {self.employee_id} успешно добавлена.")
+            future = get_buffer().submit(self.employee_id, self.shift_id, self.check_in_time,
+                                         self.check_out_time, flush_soon=wait)
+            if not wait:
+                return future
+            self.id = future.result()
+            logger.info(f"Запись о посещаемости для сотрудника {self.employee_id} успешно добавлена.")
+            return self.id
         except Exception as e:
-            logging.error(f"Ошибка при добавлении посещаемости: {e}")
-        finally:
-            conn.close()
\ No newline at end of file
+            logger.error(f"Ошибка при добавлении посещаемости: {e}")
\ No newline at end of file
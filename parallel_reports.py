@@ -0,0 +1,171 @@
+"""Параллельная генерация отчёта по посещаемости по отделам.
+
+Период делится на месяцы, сотрудники — по отделам; каждая пара (отдел,
+месяц) — задача для пула процессов. Процесс открывает своё соединение
+только для чтения (mode=ro, в WAL не мешает писателю) и пишет строки в
+промежуточный CSV-файл. Главный процесс склеивает куски побайтно: файл на
+каждый отдел и общий файл. Порядок строк детерминирован и не зависит от
+числа процессов: отделы по алфавиту (без отдела — последним), внутри
+отдела — по времени прихода и id, как в reports.write_attendance_report.
+
+Запуск: python parallel_reports.py 2025-01-01 2025-01-31 -o reports_dir [--workers 4] [--db irama.db]
+"""
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from database import DB_PATH, create_connection, get_connection
+from log_config import setup_logging
+from reports import NO_DEPARTMENT, iter_attendance_batches
+
+logger = logging.getLogger('iRama.parallel_reports')
+
+PARALLEL_REPORT_HEADER = ["Отдел", "Сотрудник", "Приход", "Уход"]
+COMBINED_NAME = 'attendance_all.csv'
+NO_DEPARTMENT_LABEL = "Без отдела"
+PARTS_DIR = '.parts'
+
+# Соединение процесса пула (по одному на процесс)
+_worker_conn = None
+
+
+def _init_worker(db_path):
+    global _worker_conn
+    # Статистику запросов процесс сохраняет сам при выходе (profiling
+    # регистрирует save_stats в atexit, процессы spawn его выполняют):
+    # save_stats сливает её с файлом под блокировкой, данные других не теряются
+    _worker_conn = create_connection(db_path, readonly=True)
+    if _worker_conn is None:
+        raise sqlite3.OperationalError(f"Не удалось открыть {db_path} для чтения")
+
+
+def _write_slice(department, start_date, end_date, path):
+    """Задача пула: пишет строки отдела за период в path; возвращает их число."""
+    label = NO_DEPARTMENT_LABEL if department == NO_DEPARTMENT else department
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        for batch in iter_attendance_batches(start_date, end_date, department=department, conn=_worker_conn):
+            writer.writerows((label, *row) for row in batch)
+            rows += len(batch)
+    return rows
+
+
+def month_slices(start_date, end_date):
+    """Делит период [start_date, end_date] на куски по календарным месяцам."""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    slices = []
+    while start <= end:
+        following = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        last = min(end, following - timedelta(days=1))
+        slices.append((start.isoformat(), last.isoformat()))
+        start = following
+    return slices
+
+
+def list_departments(conn):
+    """Отделы с сотрудниками: [(отдел, сотрудников)] по алфавиту, без отдела — последним."""
+    rows = conn.execute('''
+        SELECT IFNULL(department, '') AS department_name, COUNT(*) FROM employees GROUP BY department_name
+    ''').fetchall()
+    return sorted(rows, key=lambda row: (row[0] == NO_DEPARTMENT, row[0]))
+
+
+def _file_name(department, index):
+    label = NO_DEPARTMENT_LABEL if department == NO_DEPARTMENT else department
+    safe = re.sub(r'[^\w.-]+', '_', label).strip('_.') or 'department'
+    # Номер сохраняет порядок и различает отделы с одинаковым безопасным именем
+    return f"attendance_{index:03d}_{safe}.csv"
+
+
+def _concat(output_path, parts):
+    """Пишет заголовок и куски без заголовков в output_path через временный файл."""
+    tmp_path = output_path + '.part'
+    with open(tmp_path, 'wb') as output:
+        output.write((','.join(PARALLEL_REPORT_HEADER) + '\r\n').encode('utf-8-sig'))
+        for part in parts:
+            with open(part, 'rb') as file:
+                shutil.copyfileobj(file, output, 1024 * 1024)
+    os.replace(tmp_path, output_path)
+
+
+def run_parallel_report(output_dir, start_date, end_date, workers=None, db_path=None):
+    """Строит отчёт за период в output_dir: по файлу на отдел и общий файл.
+
+    workers — число процессов (по умолчанию по числу ядер). Возвращает
+    сводку {'files', 'combined', 'rows', 'tasks', 'elapsed'} или None при ошибке.
+    """
+    parts_dir = os.path.join(output_dir, PARTS_DIR)
+    try:
+        start = time.perf_counter()
+        db_path = os.path.abspath(db_path or DB_PATH)
+        workers = workers or os.cpu_count() or 1
+        departments = list_departments(get_connection(db_path))
+        slices = month_slices(start_date, end_date)
+        os.makedirs(parts_dir, exist_ok=True)
+
+        tasks = {}
+        for index, (department, _) in enumerate(departments):
+            for number, (slice_start, slice_end) in enumerate(slices):
+                tasks[(index, number)] = (department, slice_start, slice_end,
+                                          os.path.join(parts_dir, f"{index:03d}_{number:03d}.csv"))
+        # Крупные отделы — первыми, чтобы процессы заканчивали примерно вместе
+        size = {index: employees for index, (_, employees) in enumerate(departments)}
+        order = sorted(tasks, key=lambda key: (-size[key[0]], key))
+
+        # spawn: одинаково в Linux и Windows и без копирования потоков родителя
+        context = multiprocessing.get_context('spawn')
+        rows = 0
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(db_path,)) as pool:
+            futures = [pool.submit(_write_slice, *tasks[key]) for key in order]
+            for future in futures:
+                rows += future.result()
+
+        files = {}
+        for index, (department, _) in enumerate(departments):
+            path = os.path.join(output_dir, _file_name(department, index))
+            _concat(path, [tasks[(index, number)][3] for number in range(len(slices))])
+            files[department or NO_DEPARTMENT_LABEL] = path
+        combined = os.path.join(output_dir, COMBINED_NAME)
+        _concat(combined, [tasks[key][3] for key in sorted(tasks)])
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Параллельный отчёт за {start_date} – {end_date}: {rows} строк, {len(tasks)} задач, "
+                    f"процессов {workers}", extra={'elapsed_ms': round(elapsed * 1000, 1), 'rows': rows})
+        return {'files': files, 'combined': combined, 'rows': rows, 'tasks': len(tasks), 'elapsed': elapsed}
+    except Exception as e:
+        logger.error(f"Ошибка параллельного отчёта: {e}")
+        return None
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный отчёт по посещаемости по отделам")
+    parser.add_argument('start_date')
+    parser.add_argument('end_date')
+    parser.add_argument('-o', '--output', default='reports', help="каталог отчётов")
+    parser.add_argument('--workers', type=int, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--db', help="путь к базе (по умолчанию irama.db)")
+    args = parser.parse_args()
+    setup_logging()
+    summary = run_parallel_report(args.output, args.start_date, args.end_date, args.workers, args.db)
+    if summary is None:
+        raise SystemExit(1)
+    print(f"Строк: {summary['rows']}, отделов: {len(summary['files'])}, задач: {summary['tasks']}, "
+          f"{summary['elapsed']:.2f} с -> {summary['combined']}")
+
+
+if __name__ == '__main__':
+    # Для собранного PyInstaller exe: дочерние процессы spawn запускают тот же файл
+    multiprocessing.freeze_support()
+    main()
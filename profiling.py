@@ -0,0 +1,401 @@
+"""Профилирование SQL-запросов iRama.
+
+database.create_connection открывает соединения с фабрикой
+ProfilingConnection: каждый запрос учитывается со временем выполнения
+(включая выборку строк), числом строк и вызвавшей функцией проекта.
+Для каждого текста запроса копится гистограмма длительностей; запросы
+дольше SLOW_QUERY_MS пишутся в логгер 'iRama.slow', который log_config
+выводит в отдельный журнал irama_slow.log.
+Статистика сохраняется в irama_profile.json при выходе из программы.
+
+set_trace_callback сообщает только текст запроса, без длительности и
+числа строк, поэтому учёт ведётся в обёртках курсора.
+
+Отключение: переменная окружения IRAMA_PROFILE=0.
+Запуск: python profiling.py top [-n 20] [--sort total|mean|max|count] | reset
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from log_config import setup_logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PROFILE_ENABLED = os.environ.get('IRAMA_PROFILE', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('IRAMA_SLOW_QUERY_MS', '100'))
+PROFILE_PATH = 'irama_profile.json'
+# Верхние границы корзин гистограммы, мс (последняя — всё, что дольше)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+MAX_CALLERS = 10
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_PROJECT_DIR, name) for name in ('profiling.py', 'database.py')}
+_WHITESPACE = re.compile(r'\s+')
+
+slow_logger = logging.getLogger('iRama.slow')
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Текст запроса без лишних пробелов — ключ статистики."""
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _caller():
+    """Ближайший кадр проекта в стеке вызовов: (файл, функция, строка)."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename not in _SKIP_FILES:
+            if filename.startswith(_PROJECT_DIR):
+                return filename, code.co_name, frame.f_lineno
+            if fallback is None:
+                fallback = (filename, code.co_name, frame.f_lineno)
+        frame = frame.f_back
+    return fallback or ('?', '?', 0)
+
+
+def format_caller(caller):
+    """«модуль:функция:строка» для отчётов."""
+    filename, name, lineno = caller
+    return f"{os.path.basename(filename)}:{name}:{lineno}"
+
+
+class StatementStats:
+    """Накопленная статистика одного текста запроса."""
+    __slots__ = ('count', 'total', 'max', 'rows', 'histogram', 'callers')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.callers = {}
+
+    def add(self, elapsed, rows, caller):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += max(rows, 0)
+        self.histogram[bisect_left(HISTOGRAM_BOUNDS_MS, elapsed * 1000)] += 1
+        if caller in self.callers or len(self.callers) < MAX_CALLERS:
+            self.callers[caller] = self.callers.get(caller, 0) + 1
+
+    def to_dict(self):
+        callers = {}
+        for caller, count in self.callers.items():
+            name = format_caller(caller)
+            callers[name] = callers.get(name, 0) + count
+        return {'count': self.count, 'total': self.total, 'max': self.max, 'rows': self.rows,
+                'histogram': list(self.histogram), 'callers': callers}
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(sql, elapsed, rows, caller):
+    """Учитывает выполненный запрос."""
+    key = normalize_sql(sql)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = StatementStats()
+        stats.add(elapsed, rows, caller)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        # Параметры не пишутся: в них бывают персональные данные
+        caller_name = format_caller(caller)
+        slow_logger.warning(f"{elapsed * 1000:.1f} мс, строк: {rows}, {caller_name}: {key}",
+                            extra={'elapsed_ms': round(elapsed * 1000, 1), 'rows': rows,
+                                   'caller': caller_name, 'sql': key})
+
+
+def set_slow_query_threshold(ms):
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = ms
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Курсор, замеряющий выполнение и выборку строк запроса."""
+
+    _pending = None  # [sql, затраченное время, строк, caller] для незавершённой выборки
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            record(*pending)
+
+    def _started(self, sql, caller, elapsed):
+        if self.description is None:
+            # Не SELECT: запрос выполнен полностью
+            record(sql, elapsed, self.rowcount, caller)
+        else:
+            self._pending = [sql, elapsed, 0, caller]
+
+    def _fetched(self, elapsed, rows, done):
+        pending = self._pending
+        if pending is not None:
+            pending[1] += elapsed
+            pending[2] += rows
+            if done:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        caller = _caller()
+        start = perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            record(sql, perf_counter() - start, 0, caller)
+            raise
+        self._started(sql, caller, perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        caller = _caller()
+        start = perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            record(sql, perf_counter() - start, self.rowcount, caller)
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        caller = _caller()
+        start = perf_counter()
+        try:
+            super().executescript(sql_script)
+        finally:
+            record(sql_script, perf_counter() - start, -1, caller)
+        return self
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._fetched(perf_counter() - start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(perf_counter() - start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._fetched(perf_counter() - start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(perf_counter() - start, 0, True)
+            raise
+        self._fetched(perf_counter() - start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Выборка прервана (fetchone() без дочитывания): учитываем то, что есть
+        self._finish()
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого — ProfilingCursor."""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    # Методы соединения в C обходят переопределения курсора, поэтому идут через cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory():
+    """Фабрика для sqlite3.connect с учётом IRAMA_PROFILE."""
+    return ProfilingConnection if PROFILE_ENABLED else sqlite3.Connection
+
+
+def snapshot():
+    """Копия текущей статистики: {текст запроса: dict}."""
+    with _stats_lock:
+        return {sql: stats.to_dict() for sql, stats in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+@contextmanager
+def _locked(path):
+    """Исключительная блокировка файла статистики между процессами.
+
+    Блокируется соседний файл path.lock; его не удаляем, иначе два процесса
+    могли бы держать блокировки разных файлов с одним именем.
+    """
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def save_stats(path=PROFILE_PATH):
+    """Сохраняет статистику, добавляя её к ранее сохранённой в path."""
+    current = snapshot()
+    if not current:
+        return None
+    # Чтение, слияние и запись — под блокировкой: процессы, завершающиеся
+    # одновременно, иначе теряли бы статистику друг друга
+    with _locked(path):
+        _merge_into(path, current)
+    reset_stats()
+    return path
+
+
+def _merge_into(path, current):
+    merged = load_stats(path) if os.path.exists(path) else {}
+    for sql, stats in current.items():
+        old = merged.get(sql)
+        if old is None:
+            merged[sql] = stats
+            continue
+        old['count'] += stats['count']
+        old['total'] += stats['total']
+        old['max'] = max(old['max'], stats['max'])
+        old['rows'] += stats['rows']
+        old['histogram'] = [a + b for a, b in zip(old['histogram'], stats['histogram'])]
+        for caller, count in stats['callers'].items():
+            old['callers'][caller] = old['callers'].get(caller, 0) + count
+    # Свой временный файл у каждого процесса, в том же каталоге, чтобы os.replace был атомарным
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.part',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(merged, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_stats(path=PROFILE_PATH):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+_SORT_KEYS = {
+    'total': lambda item: item[1]['total'],
+    'mean': lambda item: item[1]['total'] / item[1]['count'],
+    'max': lambda item: item[1]['max'],
+    'count': lambda item: item[1]['count'],
+}
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN запроса (параметры подставляются как NULL)."""
+    try:
+        rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count('?')).fetchall()
+    except sqlite3.Error as e:
+        return [f"(план недоступен: {e})"]
+    return [row[3] for row in rows]
+
+
+def format_top(stats, conn=None, limit=20, sort='total'):
+    """Текстовый отчёт по limit самым затратным запросам."""
+    lines = []
+    labels = [f"≤{bound:g}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]:g}"]
+    ranked = sorted(stats.items(), key=_SORT_KEYS[sort], reverse=True)[:limit]
+    for rank, (sql, item) in enumerate(ranked, 1):
+        mean_ms = item['total'] / item['count'] * 1000
+        lines.append(f"#{rank} всего {item['total'] * 1000:.1f} мс, вызовов {item['count']}, "
+                     f"среднее {mean_ms:.2f} мс, макс. {item['max'] * 1000:.1f} мс, строк {item['rows']}")
+        lines.append(f"    {sql}")
+        histogram = ', '.join(f"{label}: {count}" for label, count in zip(labels, item['histogram']) if count)
+        lines.append(f"    мс → вызовы: {histogram}")
+        callers = sorted(item['callers'].items(), key=lambda pair: pair[1], reverse=True)
+        lines.append("    вызовы из: " + ', '.join(f"{caller} ({count})" for caller, count in callers))
+        if conn is not None:
+            for step in explain(conn, sql):
+                lines.append(f"    план: {step}")
+    return '\n'.join(lines)
+
+
+if PROFILE_ENABLED:
+    atexit.register(save_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статистика SQL-запросов iRama")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    top_parser = subparsers.add_parser('top')
+    top_parser.add_argument('-n', type=int, default=20)
+    top_parser.add_argument('--sort', choices=sorted(_SORT_KEYS), default='total')
+    top_parser.add_argument('--stats', default=PROFILE_PATH)
+    top_parser.add_argument('--db', help="база для EXPLAIN QUERY PLAN (по умолчанию irama.db)")
+    reset_parser = subparsers.add_parser('reset')
+    reset_parser.add_argument('--stats', default=PROFILE_PATH)
+    args = parser.parse_args()
+    setup_logging()
+
+    if args.command == 'reset':
+        with _locked(args.stats):
+            if os.path.exists(args.stats):
+                os.remove(args.stats)
+        return
+    if not os.path.exists(args.stats):
+        raise SystemExit(f"Нет статистики: {args.stats}")
+    from database import DB_PATH
+    conn = sqlite3.connect(f"file:{args.db or DB_PATH}?mode=ro", uri=True)
+    try:
+        print(format_top(load_stats(args.stats), conn, args.n, args.sort))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Потоковая генерация отчётов по посещаемости.
+
+Строки читаются из курсора порциями фиксированного размера и сразу
+записываются в CSV, поэтому расход памяти не зависит от длины периода.
+Периоды, перенесённые в архив, читаются через archive.source_table.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import time
+
+from archive import source_table
+from database import get_connection
+from timestamps import period_bounds
+
+logger = logging.getLogger('iRama.reports')
+
+REPORT_HEADER = ["Сотрудник", "Приход", "Уход"]
+DEFAULT_BATCH_SIZE = 5000
+# Значение department для сотрудников без отдела (NULL или пустая строка)
+NO_DEPARTMENT = ''
+
+
+def _build_query(start_date, end_date, department=None, employee_id=None, table='attendance'):
+    """Запрос отчёта за период, конечная дата включительно (см. timestamps.period_bounds)."""
+    sql = f'''
+        SELECT e.name, strftime('%Y-%m-%d %H:%M', a.check_in_time, 'unixepoch'),
+               strftime('%Y-%m-%d %H:%M', a.check_out_time, 'unixepoch')
+        FROM {table} a
+        JOIN employees e ON a.employee_id = e.id
+        WHERE a.check_in_time >= ? AND a.check_in_time < ?
+    '''
+    params = list(period_bounds(start_date, end_date))
+    if department == NO_DEPARTMENT:
+        sql += " AND IFNULL(e.department, '') = ''"
+    elif department is not None:
+        sql += " AND e.department = ?"
+        params.append(department)
+    if employee_id is not None:
+        sql += " AND a.employee_id = ?"
+        params.append(employee_id)
+    sql += " ORDER BY a.check_in_time, a.id"
+    return sql, params
+
+
+def iter_attendance_batches(start_date, end_date, department=None, employee_id=None,
+                            batch_size=DEFAULT_BATCH_SIZE, conn=None):
+    """Генератор порций строк отчёта (списков кортежей) по batch_size штук."""
+    conn = conn or get_connection()
+    table = source_table(conn, 'attendance', *period_bounds(start_date, end_date))
+    sql, params = _build_query(start_date, end_date, department, employee_id, table)
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        cursor.close()
+
+
+def _open_output(output, compress):
+    """Возвращает (текстовый поток, функция закрытия) для пути или файла."""
+    if isinstance(output, (str, os.PathLike)):
+        if compress:
+            stream = gzip.open(output, 'wt', newline='', encoding='utf-8-sig')
+        else:
+            stream = open(output, 'w', newline='', encoding='utf-8-sig')
+        return stream, stream.close
+    if compress:
+        # Файловый объект открыт в двоичном режиме: сжимаем поверх него
+        gz = gzip.GzipFile(fileobj=output, mode='wb')
+        stream = io.TextIOWrapper(gz, encoding='utf-8-sig', newline='')
+
+        def close():
+            stream.flush()
+            stream.detach()
+            gz.close()
+        return stream, close
+    return output, output.flush
+
+
+def write_attendance_report(output, start_date, end_date, department=None, employee_id=None,
+                            compress=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, conn=None):
+    """Записывает отчёт в путь или файловый объект; возвращает число строк.
+
+    compress=None включает gzip для путей с расширением .gz.
+    progress(rows_written) вызывается после каждой записанной порции.
+    """
+    if compress is None:
+        compress = isinstance(output, (str, os.PathLike)) and os.fspath(output).endswith('.gz')
+    start = time.perf_counter()
+    stream, close = _open_output(output, compress)
+    rows_written = 0
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(REPORT_HEADER)
+        for batch in iter_attendance_batches(start_date, end_date, department, employee_id,
+                                             batch_size, conn):
+            writer.writerows(batch)
+            rows_written += len(batch)
+            if progress is not None:
+                progress(rows_written)
+    finally:
+        close()
+    logger.info(f"Отчёт по посещаемости: {rows_written} строк за {start_date} – {end_date}",
+                extra={'elapsed_ms': round((time.perf_counter() - start) * 1000, 1), 'rows': rows_written})
+    return rows_written
@@ -0,0 +1,239 @@
+"""Доступ к сотрудникам через общий LRU-кэш.
+
+EmployeeRepository — единая точка чтения и записи employees в процессе.
+Строки (в порядке models.EMPLOYEE_COLUMNS) кэшируются по id, результаты
+поиска по имени — по нормализованному имени (регистр, ё/е и лишние пробелы
+не различаются). Размер кэша ограничен, дольше всех не запрашиваемые записи
+вытесняются. add/update/delete сбрасывают ровно затронутые ключи: id,
+старое и новое имя — сразу и ещё раз после COMMIT (или ROLLBACK) внешней
+транзакции, если запись идёт внутри неё. Чтения внутри транзакции
+кэш не пополняют: они могут видеть ещё не зафиксированные строки.
+
+Кэш не видит изменений, сделанных в обход репозитория (другим процессом
+или прямым SQL): после них нужен clear().
+"""
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from database import after_transaction, get_connection, transaction
+from models import EMPLOYEE_COLUMNS
+
+logger = logging.getLogger('iRama.repository')
+
+DEFAULT_MAX_SIZE = 10000
+# Не больше стольких параметров в одном запросе (ограничение старых сборок SQLite)
+MAX_VARIABLES = 999
+
+_SELECT_COLUMNS = ', '.join(EMPLOYEE_COLUMNS)
+_WRITABLE_COLUMNS = EMPLOYEE_COLUMNS[1:]
+
+
+def normalize_name(name):
+    """Ключ имени: нижний регистр, ё → е, пробелы схлопнуты."""
+    return ' '.join((name or '').split()).lower().replace('ё', 'е')
+
+
+def _name_match(key):
+    """Выражение MATCH индекса employees_fts для кандидатов с ключом имени key или None.
+
+    Триграммы не различают регистр, но различают «е» и «ё», поэтому из
+    каждого слова берётся самый длинный кусок без «е»; куски короче трёх
+    символов триграммам не подходят.
+    """
+    terms = []
+    for word in key.split():
+        piece = max(word.split('е'), key=len)
+        if len(piece) >= 3:
+            terms.append('name : "' + piece.replace('"', '""') + '"')
+    return ' AND '.join(terms) or None
+
+
+def _committed(conn, version):
+    """Версия кэша для результата чтения через conn или None внутри транзакции."""
+    return None if conn.in_transaction else version
+
+
+class EmployeeRepository:
+    """Чтение и запись сотрудников с кэшем по id и по имени."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+        # Меняется при каждой инвалидации: результат запроса, начатого до
+        # записи, не попадёт в кэш после неё
+        self._version = 0
+
+    def _conn(self, conn):
+        return conn or get_connection()
+
+    def _lookup(self, cache, key):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                self.hits += 1
+                return True, cache[key]
+            self.misses += 1
+            return False, self._version
+
+    def _store(self, cache, key, value, version):
+        # version=None: строка прочитана внутри транзакции и может быть ещё не
+        # зафиксирована — общий кэш её не получает
+        with self._lock:
+            if version != self._version:
+                return
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+
+    def _invalidate(self, employee_ids=(), names=()):
+        with self._lock:
+            self._version += 1
+            for employee_id in employee_ids:
+                self._rows.pop(employee_id, None)
+            for name in names:
+                self._names.pop(normalize_name(name), None)
+
+    def get(self, employee_id, conn=None):
+        """Строка сотрудника по id или None."""
+        employee_id = int(employee_id)
+        found, value = self._lookup(self._rows, employee_id)
+        if found:
+            return value
+        conn = self._conn(conn)
+        row = conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees WHERE id = ?", (employee_id,)).fetchone()
+        if row is not None:
+            self._store(self._rows, employee_id, row, _committed(conn, value))
+        return row
+
+    def get_many(self, employee_ids, conn=None):
+        """{id: строка} для найденных id; промахи читаются одним запросом IN (...)."""
+        result, missing = {}, []
+        with self._lock:
+            version = self._version
+            for employee_id in dict.fromkeys(int(i) for i in employee_ids):
+                if employee_id in self._rows:
+                    self._rows.move_to_end(employee_id)
+                    result[employee_id] = self._rows[employee_id]
+                    self.hits += 1
+                else:
+                    missing.append(employee_id)
+                    self.misses += 1
+        conn = self._conn(conn)
+        version = _committed(conn, version)
+        for start in range(0, len(missing), MAX_VARIABLES):
+            chunk = missing[start:start + MAX_VARIABLES]
+            rows = conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees "
+                                f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            for row in rows:
+                result[row[0]] = row
+                self._store(self._rows, row[0], row, version)
+        return result
+
+    def find_by_name(self, name, conn=None):
+        """Сотрудники с таким же именем после нормализации (список строк по id)."""
+        key = normalize_name(name)
+        found, value = self._lookup(self._names, key)
+        if found:
+            return list(value)
+        # SQLite lower() не знает кириллицы: кандидатов отбирает индекс поиска,
+        # а совпадение проверяет нормализация Python
+        conn = self._conn(conn)
+        rows = [row for row in self._name_candidates(conn, key) if normalize_name(row[1]) == key]
+        value = _committed(conn, value)
+        self._store(self._names, key, tuple(rows), value)
+        for row in rows:
+            self._store(self._rows, row[0], row, value)
+        return rows
+
+    def _name_candidates(self, conn, key):
+        match = _name_match(key)
+        if match is not None:
+            try:
+                return conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees WHERE id IN "
+                                    "(SELECT rowid FROM employees_fts WHERE employees_fts MATCH ?) ORDER BY id",
+                                    (match,)).fetchall()
+            except sqlite3.OperationalError:
+                pass  # сборка SQLite без FTS5: индекс поиска не создан (миграция 4)
+        return conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees ORDER BY id").fetchall()
+
+    def _invalidate_after(self, conn, employee_ids, names):
+        """Сбрасывает ключи сейчас и после конца внешней транзакции conn.
+
+        Второй сброс отбрасывает то, что другие потоки (или сама транзакция)
+        успели закэшировать до её COMMIT или ROLLBACK.
+        """
+        self._invalidate(employee_ids, names)
+        after_transaction(conn, self._invalidate, employee_ids, names)
+
+    def add(self, conn=None, **fields):
+        """Добавляет сотрудника (поля — столбцы employees); возвращает id."""
+        columns = [column for column in _WRITABLE_COLUMNS if column in fields]
+        with transaction(conn) as conn:
+            cursor = conn.execute(f"INSERT INTO employees ({', '.join(columns)}) "
+                                  f"VALUES ({', '.join('?' * len(columns))})",
+                                  [fields[column] for column in columns])
+            # Новое имя могло быть закэшировано как «не найдено» или со старым списком тёзок
+            self._invalidate_after(conn, [cursor.lastrowid], [fields.get('name')])
+        return cursor.lastrowid
+
+    def update(self, employee_id, conn=None, **fields):
+        """Обновляет переданные поля сотрудника; возвращает True, если он найден."""
+        employee_id = int(employee_id)
+        columns = [column for column in _WRITABLE_COLUMNS if column in fields]
+        with transaction(conn) as conn:
+            old = conn.execute("SELECT name FROM employees WHERE id = ?", (employee_id,)).fetchone()
+            if old is not None and columns:
+                conn.execute(f"UPDATE employees SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                             [fields[column] for column in columns] + [employee_id])
+            self._invalidate_after(conn, [employee_id], [old[0] if old else None, fields.get('name')])
+        return old is not None
+
+    def delete(self, employee_id, conn=None):
+        """Удаляет сотрудника (смены и отметки — каскадом); возвращает True, если он был."""
+        employee_id = int(employee_id)
+        with transaction(conn) as conn:
+            old = conn.execute("SELECT name FROM employees WHERE id = ?", (employee_id,)).fetchone()
+            conn.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
+            self._invalidate_after(conn, [employee_id], [old[0] if old else None])
+        return old is not None
+
+    def clear(self):
+        """Сбрасывает кэш целиком (после изменений в обход репозитория)."""
+        with self._lock:
+            self._version += 1
+            self._rows.clear()
+            self._names.clear()
+        logger.debug("Кэш сотрудников сброшен")
+
+    def stats(self):
+        """Счётчики кэша: попадания, промахи, доля попаданий и размер."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'rows': len(self._rows),
+                'names': len(self._names),
+                'max_size': self.max_size,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_repository():
+    """Общий репозиторий процесса."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EmployeeRepository()
+        return _shared
@@ -0,0 +1,245 @@
+"""Проверка графика смен: пересечения, некорректные смены и межсменный отдых.
+
+Смены каждого сотрудника хранятся в ScheduleIndex отсортированными по
+началу. Смена не длиннее MAX_SHIFT_HOURS, поэтому для новой смены
+достаточно бинарным поиском взять окно соседей (начало ± длина смены +
+отдых), а не сравнивать её со всеми. Проверка графика на месяц — это
+проход по сменам в порядке начала: O(n log n) плюс число найденных
+конфликтов. Смена с end_time раньше start_time заканчивается на
+следующий день.
+
+Запуск: python schedule.py roster.csv
+"""
+import argparse
+import csv
+import json
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from database import get_connection
+from log_config import setup_logging
+from timestamps import from_epoch_day, to_epoch_day
+import validators
+
+# Минимальный отдых между сменами одного сотрудника
+MIN_REST_HOURS = 12
+# Верхняя граница длины смены (время задаётся как чч:мм, поэтому не больше суток)
+MAX_SHIFT_HOURS = 24
+
+OVERLAP = 'overlap'
+REST = 'rest'
+INVALID = 'invalid'
+
+
+class ShiftInterval:
+    """Смена как интервал [start, end); ref — id смены в базе или номер строки графика."""
+    __slots__ = ('employee_id', 'start', 'end', 'ref', 'existing')
+
+    def __init__(self, employee_id, start, end, ref=None, existing=False):
+        self.employee_id = employee_id
+        self.start = start
+        self.end = end
+        self.ref = ref
+        self.existing = existing
+
+    def __repr__(self):
+        return f"ShiftInterval({self.employee_id}, {self.start:%Y-%m-%d %H:%M} – {self.end:%Y-%m-%d %H:%M})"
+
+
+class ScheduleConflict:
+    """Найденная проблема графика: kind — OVERLAP, REST или INVALID."""
+
+    def __init__(self, kind, employee_id, ref, other=None, message=""):
+        self.kind = kind
+        self.employee_id = employee_id
+        self.ref = ref
+        self.other = other
+        self.message = message
+
+    def __repr__(self):
+        return f"ScheduleConflict({self.kind}, employee={self.employee_id}, ref={self.ref}: {self.message})"
+
+
+class ScheduleConflictError(ValueError):
+    """Смена не может быть добавлена: график нарушен."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__("; ".join(conflict.message for conflict in conflicts))
+
+
+def shift_bounds(shift_date, start_time, end_time):
+    """Возвращает (начало, конец) смены; ValueError для некорректной смены.
+
+    shift_date — 'гггг-мм-дд' или номер дня, как он хранится в базе.
+    """
+    if isinstance(shift_date, int):
+        shift_date = from_epoch_day(shift_date)
+    if not validators.validate_iso_date(shift_date):
+        raise ValueError(f"некорректная дата смены: {shift_date}")
+    if not (validators.validate_time(start_time) and validators.validate_time(end_time)):
+        raise ValueError(f"некорректное время смены: {start_time}–{end_time}")
+    start = datetime.fromisoformat(f"{shift_date} {start_time}")
+    end = datetime.fromisoformat(f"{shift_date} {end_time}")
+    if end == start:
+        raise ValueError(f"смена нулевой длины: {shift_date} {start_time}–{end_time}")
+    if end < start:
+        # Ночная смена: заканчивается на следующий день
+        end += timedelta(days=1)
+    return start, end
+
+
+def _describe(interval):
+    if interval.existing:
+        return f"смена #{interval.ref} {interval.start:%d.%m %H:%M}–{interval.end:%H:%M}"
+    return f"смена {interval.start:%d.%m %H:%M}–{interval.end:%H:%M}"
+
+
+class ScheduleIndex:
+    """Смены по сотрудникам, отсортированные по началу."""
+
+    def __init__(self, min_rest_hours=MIN_REST_HOURS):
+        self.min_rest = timedelta(hours=min_rest_hours)
+        self._window = timedelta(hours=MAX_SHIFT_HOURS) + self.min_rest
+        # employee_id -> (список начал, список интервалов) в одном порядке
+        self._employees = {}
+
+    def add(self, interval):
+        starts, intervals = self._employees.setdefault(interval.employee_id, ([], []))
+        index = bisect_left(starts, interval.start)
+        starts.insert(index, interval.start)
+        intervals.insert(index, interval)
+
+    def neighbours(self, interval):
+        """Смены сотрудника, которые могут пересекаться с interval или стоять ближе отдыха."""
+        starts, intervals = self._employees.get(interval.employee_id, ((), ()))
+        low = bisect_left(starts, interval.start - self._window)
+        high = bisect_left(starts, interval.end + self.min_rest)
+        return intervals[low:high]
+
+    def conflicts_with(self, interval):
+        """Конфликты interval с уже добавленными сменами."""
+        conflicts = []
+        for other in self.neighbours(interval):
+            if other.start < interval.end and interval.start < other.end:
+                conflicts.append(ScheduleConflict(
+                    OVERLAP, interval.employee_id, interval.ref, other.ref,
+                    f"Сотрудник {interval.employee_id}: {_describe(interval)} пересекается с {_describe(other)}",
+                ))
+                continue
+            gap = interval.start - other.end if other.end <= interval.start else other.start - interval.end
+            if gap < self.min_rest:
+                conflicts.append(ScheduleConflict(
+                    REST, interval.employee_id, interval.ref, other.ref,
+                    f"Сотрудник {interval.employee_id}: между {_describe(other)} и {_describe(interval)} "
+                    f"отдых {gap.total_seconds() / 3600:.1f} ч < {self.min_rest.total_seconds() / 3600:.0f} ч",
+                ))
+        return conflicts
+
+    def load(self, conn, employee_ids, start_date, end_date):
+        """Добавляет смены сотрудников из базы с датой в [start_date, end_date]."""
+        rows = conn.execute(
+            '''SELECT id, employee_id, shift_date, start_time, end_time FROM shifts
+               WHERE employee_id IN (SELECT value FROM json_each(?)) AND shift_date BETWEEN ? AND ?''',
+            (json.dumps(sorted(employee_ids)), to_epoch_day(start_date), to_epoch_day(end_date)),
+        )
+        for shift_id, employee_id, shift_date, start_time, end_time in rows:
+            try:
+                start, end = shift_bounds(shift_date, start_time, end_time)
+            except ValueError:
+                continue  # Старые некорректные записи не мешают проверке новых
+            self.add(ShiftInterval(employee_id, start, end, shift_id, existing=True))
+
+
+def _prepare_roster(shifts):
+    """Разбирает график; возвращает (интервалы, конфликты INVALID)."""
+    intervals, invalid = [], []
+    for ref, (employee_id, shift_date, start_time, end_time) in enumerate(shifts):
+        try:
+            start, end = shift_bounds(shift_date, start_time, end_time)
+        except ValueError as e:
+            invalid.append(ScheduleConflict(INVALID, employee_id, ref, message=f"Сотрудник {employee_id}: {e}"))
+            continue
+        intervals.append(ShiftInterval(employee_id, start, end, ref))
+    intervals.sort(key=lambda interval: interval.start)
+    return intervals, invalid
+
+
+def _load_index(intervals, conn, min_rest_hours):
+    index = ScheduleIndex(min_rest_hours)
+    if conn is not None and intervals:
+        # Соседи — как в neighbours(): смена из базы начинается не раньше чем за
+        # MAX_SHIFT_HOURS + отдых до первой новой и не позже отдыха после последней
+        index.load(conn, {interval.employee_id for interval in intervals},
+                   (min(i.start for i in intervals) - index._window).date().isoformat(),
+                   (max(i.end for i in intervals) + index.min_rest).date().isoformat())
+    return index
+
+
+def validate_roster(shifts, conn=None, check_existing=True, min_rest_hours=MIN_REST_HOURS):
+    """Проверяет график целиком и возвращает все конфликты.
+
+    shifts — последовательность (employee_id, shift_date, start_time, end_time);
+    ref в конфликтах — номер смены в shifts. При check_existing смены
+    сравниваются и с уже сохранёнными в базе (other — их id).
+    """
+    intervals, conflicts = _prepare_roster(shifts)
+    if check_existing:
+        conn = conn or get_connection()
+    index = _load_index(intervals, conn if check_existing else None, min_rest_hours)
+    for interval in intervals:
+        conflicts.extend(index.conflicts_with(interval))
+        index.add(interval)
+    return conflicts
+
+
+def filter_roster(shifts, conn=None, min_rest_hours=MIN_REST_HOURS):
+    """Делит график на допустимые смены и отклонённые.
+
+    Смены принимаются в порядке начала; конфликтующая смена отклоняется и
+    не учитывается при проверке следующих. Возвращает (номера принятых,
+    {номер: [конфликты]}).
+    """
+    intervals, invalid = _prepare_roster(shifts)
+    rejected = {}
+    for conflict in invalid:
+        rejected.setdefault(conflict.ref, []).append(conflict)
+    index = _load_index(intervals, conn or get_connection(), min_rest_hours)
+    accepted = []
+    for interval in intervals:
+        conflicts = index.conflicts_with(interval)
+        if conflicts:
+            rejected[interval.ref] = conflicts
+        else:
+            index.add(interval)
+            accepted.append(interval.ref)
+    return sorted(accepted), rejected
+
+
+def check_shift(conn, employee_id, shift_date, start_time, end_time, min_rest_hours=MIN_REST_HOURS):
+    """Проверяет одну новую смену; ScheduleConflictError при нарушениях."""
+    conflicts = validate_roster([(employee_id, shift_date, start_time, end_time)], conn,
+                                min_rest_hours=min_rest_hours)
+    if conflicts:
+        raise ScheduleConflictError(conflicts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка графика смен iRama")
+    parser.add_argument('csv_path', help="CSV со столбцами employee_id, shift_date, start_time, end_time")
+    parser.add_argument('--min-rest', type=float, default=MIN_REST_HOURS, help="минимальный отдых, ч")
+    parser.add_argument('--no-existing', action='store_true', help="не сравнивать со сменами в базе")
+    args = parser.parse_args()
+    setup_logging()
+    with open(args.csv_path, newline='', encoding='utf-8-sig') as file:
+        shifts = [(int(row['employee_id']), row['shift_date'].strip(), row['start_time'].strip(),
+                   row['end_time'].strip()) for row in csv.DictReader(file)]
+    conflicts = validate_roster(shifts, check_existing=not args.no_existing, min_rest_hours=args.min_rest)
+    for conflict in sorted(conflicts, key=lambda c: c.ref):
+        print(f"строка {conflict.ref + 2}: {conflict.message}")
+    print(f"Смен: {len(shifts)}, конфликтов: {len(conflicts)}")
+    raise SystemExit(1 if conflicts else 0)
+
+
+if __name__ == '__main__':
+    main()
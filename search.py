@@ -0,0 +1,120 @@
+"""Поиск сотрудников по индексу FTS5 (триграммы).
+
+Триграммный токенизатор даёт поиск по подстроке без полного просмотра
+таблицы. Запрос дополнительно расширяется транслитерацией (ivanov → иванов)
+и исправлением раскладки клавиатуры (bdfyjd → иванов).
+"""
+import sqlite3
+
+from database import get_connection
+from models import EMPLOYEE_COLUMNS
+
+DEFAULT_LIMIT = 200
+SEARCH_COLUMNS = ('name', 'department', 'status', 'city', 'phone_number')
+_SELECT_COLUMNS = ', '.join(EMPLOYEE_COLUMNS)
+
+# Латиница → кириллица, сначала многобуквенные сочетания
+_TRANSLIT = [
+    ('shch', 'щ'), ('sch', 'щ'), ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'), ('ch', 'ч'),
+    ('sh', 'ш'), ('yu', 'ю'), ('ya', 'я'), ('yo', 'ё'), ('ye', 'е'),
+    ('a', 'а'), ('b', 'б'), ('v', 'в'), ('g', 'г'), ('d', 'д'), ('e', 'е'), ('z', 'з'),
+    ('i', 'и'), ('y', 'й'), ('k', 'к'), ('l', 'л'), ('m', 'м'), ('n', 'н'), ('o', 'о'),
+    ('p', 'п'), ('r', 'р'), ('s', 'с'), ('t', 'т'), ('u', 'у'), ('f', 'ф'), ('h', 'х'),
+    ('c', 'ц'), ('w', 'в'), ('x', 'кс'), ('j', 'дж'), ('q', 'к'),
+]
+
+# Кириллица → латиница (для данных, введённых латиницей)
+_CYR_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+}
+
+# Текст, набранный в английской раскладке вместо русской
+_LAYOUT = str.maketrans(
+    "qwertyuiop[]asdfghjkl;'zxcvbnm,.`",
+    "йцукенгшщзхъфывапролджэячсмитьбюё",
+)
+
+
+def _transliterate(text):
+    result = []
+    i = 0
+    while i < len(text):
+        for latin, cyrillic in _TRANSLIT:
+            if text.startswith(latin, i):
+                result.append(cyrillic)
+                i += len(latin)
+                break
+        else:
+            result.append(text[i])
+            i += 1
+    return ''.join(result)
+
+
+def query_variants(text):
+    """Возвращает варианты запроса: исходный, транслит, исправленная раскладка."""
+    text = text.strip().lower()
+    if not text:
+        return []
+    variants = [text]
+    if text.isascii():
+        variants.append(_transliterate(text))
+        variants.append(text.translate(_LAYOUT))
+    else:
+        variants.append(''.join(_CYR_TO_LAT.get(ch, ch) for ch in text))
+    if 'ё' in text:
+        variants.append(text.replace('ё', 'е'))
+    # Порядок сохраняем, дубликаты убираем
+    return list(dict.fromkeys(variants))
+
+
+def _fts_available(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'").fetchone()
+    return row is not None
+
+
+def _match_expression(variants):
+    # Каждый вариант — отдельная фраза; кавычки внутри удваиваются
+    return ' OR '.join('"{}"'.format(v.replace('"', '""')) for v in variants)
+
+
+def search_employees(text, limit=DEFAULT_LIMIT, conn=None):
+    """Ищет сотрудников по ФИО, отделу, статусу, городу и телефону.
+
+    Возвращает не более limit строк таблицы employees.
+    """
+    conn = conn or get_connection()
+    variants = query_variants(text)
+    if not variants:
+        return conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    # Триграммам нужно не меньше трёх символов; короткие запросы ищем по началу
+    fts_variants = [v for v in variants if len(v) >= 3]
+    if fts_variants and _fts_available(conn):
+        try:
+            return conn.execute(f'''
+                SELECT {', '.join('e.' + c for c in EMPLOYEE_COLUMNS)}
+                FROM employees_fts f
+                JOIN employees e ON e.id = f.rowid
+                WHERE employees_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (_match_expression(fts_variants), limit)).fetchall()
+        except sqlite3.OperationalError:
+            pass
+
+    pattern_sql = ' OR '.join(f"{column} LIKE ?" for column in SEARCH_COLUMNS)
+    conditions, params = [], []
+    # LIKE в SQLite не различает регистр только для ASCII — добавляем «Иванов» к «иванов»
+    like_variants = list(dict.fromkeys(v for variant in variants for v in (variant, variant.capitalize())))
+    for variant in like_variants:
+        # Короткий запрос — по началу слова, длинный без FTS — по подстроке
+        pattern = f"{variant}%" if len(variant) < 3 else f"%{variant}%"
+        conditions.append(f"({pattern_sql})")
+        params.extend([pattern] * len(SEARCH_COLUMNS))
+    params.append(limit)
+    return conn.execute(f"SELECT {_SELECT_COLUMNS} FROM employees WHERE {' OR '.join(conditions)} ORDER BY id LIMIT ?",
+                        params).fetchall()
@@ -0,0 +1,605 @@
+"""HTTP-сервис отметок для турникетов и терминалов.
+
+Сервер на asyncio без сторонних зависимостей (HTTP/1.1, keep-alive).
+Запросы к базе выполняет DBExecutor с ограниченной очередью: при
+переполнении клиент сразу получает 503 с Retry-After, а не ждёт в
+бесконечной очереди. Отметки идут с интерактивным приоритетом, отчёты — с
+приоритетом отчётов, поэтому выгрузка не задерживает турникеты. Приходы
+пишет AttendanceBuffer: одновременные отметки разных терминалов попадают в
+одну транзакцию (у буфера свой журнал — <база>-attendance-<id>-<n>.journal).
+
+Маршруты:
+    POST /checkin   {"employee_id": 1, "shift_id": 5?, "time": "2024-01-01 08:55"?}
+    POST /checkout  {"employee_id": 1, "time": "2024-01-01 18:03"?}
+    GET  /employees?q=иванов&limit=20
+    GET  /employees/<id>
+    GET  /report?start=2024-01-01&end=2024-01-31[&department=Склад]  (CSV)
+    GET  /metrics   задержки запросов по маршрутам и состояние очереди
+    GET  /health
+
+Без shift_id приход привязывается к смене сотрудника, в окно которой
+попадает время (с допуском CHECK_IN_EARLY_HOURS до начала). Без time
+берётся текущее время сервера.
+
+Запуск: python service.py [--host 127.0.0.1] [--port 8080] [--db irama.db] [--workers 4] [--max-pending 256]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import database
+from attendance_buffer import AttendanceBuffer, DuplicateCheckIn
+from database import transaction
+from db_worker import DBExecutor, ExecutorBusy, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_REPORT
+from log_config import setup_logging
+from migrations import migrate
+from models import EMPLOYEE_COLUMNS
+from reports import write_attendance_report
+from schedule import MAX_SHIFT_HOURS, shift_bounds
+from search import search_employees
+from timestamps import from_epoch, to_epoch, to_epoch_day
+import validators
+
+logger = logging.getLogger('iRama.service')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+MAX_PENDING = 256
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+KEEPALIVE_TIMEOUT = 30
+# Приход засчитывается в смену, если он не раньше начала на столько часов
+CHECK_IN_EARLY_HOURS = 2
+SEARCH_LIMIT = 50
+# Размер порции CSV, передаваемой клиенту при выгрузке отчёта, и сколько
+# порций может ждать отправки
+REPORT_CHUNK_BYTES = 64 * 1024
+REPORT_WINDOW = 4
+# Как часто рабочий поток, ждущий медленного клиента, проверяет обрыв соединения, с
+REPORT_ABORT_POLL = 0.5
+# Сколько последних задержек маршрута хранится для перцентилей
+LATENCY_WINDOW = 10_000
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    """Ошибка запроса, которая возвращается клиенту как JSON {"error": ...}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Запросы, которые выполняются в рабочих потоках DBExecutor
+
+def _find_shift(conn, employee_id, when):
+    """id смены сотрудника, к которой относится приход в момент when."""
+    moment = datetime.fromisoformat(when)
+    day = to_epoch_day(moment)
+    rows = conn.execute("SELECT id, shift_date, start_time, end_time FROM shifts "
+                        "WHERE employee_id = ? AND shift_date IN (?, ?)", (employee_id, day - 1, day)).fetchall()
+    best = None
+    for shift_id, shift_date, start_time, end_time in rows:
+        try:
+            start, end = shift_bounds(shift_date, start_time, end_time)
+        except ValueError:
+            continue
+        if start - timedelta(hours=CHECK_IN_EARLY_HOURS) <= moment < end:
+            distance = abs(moment - start)
+            if best is None or distance < best[0]:
+                best = (distance, shift_id)
+    if best is None:
+        raise HTTPError(409, f"нет смены сотрудника {employee_id} на {when}")
+    return best[1]
+
+
+def db_prepare_check_in(conn, employee_id, shift_id, when):
+    """Проверяет сотрудника и смену прихода; возвращает id смены.
+
+    Повторный открытый приход отсекается уже при записи пачки (unique_open).
+    """
+    with transaction(conn):
+        if conn.execute("SELECT 1 FROM employees WHERE id = ?", (employee_id,)).fetchone() is None:
+            raise HTTPError(404, f"сотрудник {employee_id} не найден")
+        if shift_id is None:
+            return _find_shift(conn, employee_id, when)
+        if conn.execute("SELECT 1 FROM shifts WHERE id = ? AND employee_id = ?",
+                        (shift_id, employee_id)).fetchone() is None:
+            raise HTTPError(404, f"смена {shift_id} сотрудника {employee_id} не найдена")
+    return shift_id
+
+
+def db_check_out(conn, employee_id, when):
+    """Закрывает последний открытый приход сотрудника; возвращает (id отметки, приход)."""
+    moment = to_epoch(when)
+    with transaction(conn, mode='IMMEDIATE'):
+        row = conn.execute("SELECT id, check_in_time FROM attendance "
+                           "WHERE employee_id = ? AND check_out_time IS NULL AND check_in_time <= ? "
+                           "ORDER BY check_in_time DESC LIMIT 1", (employee_id, moment)).fetchone()
+        if row is None:
+            raise HTTPError(404, f"у сотрудника {employee_id} нет открытого прихода")
+        attendance_id, check_in_time = row
+        # Забытый уход не закрывается отметкой через несколько дней
+        if moment - check_in_time > MAX_SHIFT_HOURS * 3600:
+            raise HTTPError(409, f"открытый приход {from_epoch(check_in_time)} старше {MAX_SHIFT_HOURS} ч")
+        conn.execute("UPDATE attendance SET check_out_time = ? WHERE id = ?", (moment, attendance_id))
+    return attendance_id, from_epoch(check_in_time)
+
+
+def db_search(conn, text, limit):
+    return [dict(zip(EMPLOYEE_COLUMNS, row)) for row in search_employees(text, limit=limit, conn=conn)]
+
+
+def db_employee(conn, employee_id):
+    row = conn.execute(f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees WHERE id = ?",
+                       (employee_id,)).fetchone()
+    if row is None:
+        raise HTTPError(404, f"сотрудник {employee_id} не найден")
+    return dict(zip(EMPLOYEE_COLUMNS, row))
+
+
+class _ChunkSink:
+    """Файловый объект для write_attendance_report, отдающий CSV порциями в цикл asyncio."""
+
+    def __init__(self, put):
+        self.put = put
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= REPORT_CHUNK_BYTES:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.parts:
+            chunk = ''.join(self.parts).encode('utf-8')
+            # Буфер очищается до отправки: если put оборвётся, повторный flush
+            # (из finally отчёта) не будет отправлять ту же порцию снова
+            self.parts = []
+            self.size = 0
+            self.put(chunk)
+
+
+def db_stream_report(conn, put, start_date, end_date, department):
+    sink = _ChunkSink(put)
+    # BOM, как в файловых отчётах: Excel иначе не узнаёт UTF-8
+    sink.write('\ufeff')
+    try:
+        return write_attendance_report(sink, start_date, end_date, department=department, compress=False,
+                                       conn=conn)
+    except ConnectionAbortedError:
+        # Клиент отключился — это не ошибка выгрузки
+        return None
+
+
+class RouteStats:
+    """Задержки одного маршрута: счётчики по кодам ответа и окно последних значений."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statuses = {}
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, status, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.recent.append(elapsed)
+
+    def to_dict(self):
+        ordered = sorted(self.recent)
+
+        def percentile(share):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * share))] * 1000, 2) if ordered else None
+        return {'count': self.count, 'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+                'mean_ms': round(self.total / self.count * 1000, 2) if self.count else None,
+                'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+                'max_ms': round(self.max * 1000, 2)}
+
+
+class CheckInService:
+    """HTTP-сервер отметок поверх DBExecutor."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        self.buffer = None
+        self.loop = None
+        self.server = None
+        self.stats = {}
+        self.rejected = 0
+        self.in_flight = 0
+        self.started = time.time()
+        self.routes = {
+            ('POST', 'checkin'): self.handle_check_in,
+            ('POST', 'checkout'): self.handle_check_out,
+            ('GET', 'employees'): self.handle_employees,
+            ('GET', 'report'): self.handle_report,
+            ('GET', 'metrics'): self.handle_metrics,
+            ('GET', 'health'): self.handle_health,
+        }
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.loop = asyncio.get_running_loop()
+        self.executor = DBExecutor(workers=self.workers, max_pending=self.max_pending, wakeup=self._wakeup)
+        self.buffer = AttendanceBuffer()
+        self.server = await asyncio.start_server(self._serve_connection, host, port, limit=MAX_HEADER_BYTES)
+        address = self.server.sockets[0].getsockname()
+        logger.info(f"Сервис отметок слушает {address[0]}:{address[1]}, потоков БД: {self.workers}")
+        return address
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            await asyncio.to_thread(self.executor.shutdown)
+            self.executor.process_results()
+        if self.buffer is not None:
+            await asyncio.to_thread(self.buffer.close)
+        logger.info(f"Сервис отметок остановлен: {json.dumps(self.metrics()['routes'], ensure_ascii=False)}")
+
+    def _wakeup(self):
+        # Вызывается из рабочего потока: результаты доставляются в цикле asyncio
+        self.loop.call_soon_threadsafe(self.executor.process_results)
+
+    def run_db(self, func, *args, priority=PRIORITY_NORMAL):
+        """Future с результатом func(conn, *args) из DBExecutor."""
+        future = self.loop.create_future()
+
+        def call(conn):
+            # Отказ (404, 409) — обычный ответ, а не сбой: DBExecutor не пишет его в журнал
+            try:
+                return None, func(conn, *args)
+            except HTTPError as e:
+                return e, None
+
+        def done(result):
+            error, value = result
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+        def failed(error):
+            if not future.done():
+                future.set_exception(error)
+        try:
+            self.executor.submit(call, priority=priority, callback=done, errback=failed)
+        except ExecutorBusy:
+            self.rejected += 1
+            raise HTTPError(503, "сервер перегружен, повторите позже")
+        return future
+
+    def metrics(self):
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'in_flight': self.in_flight,
+            'db_pending': self.executor.pending if self.executor is not None else 0,
+            'db_max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'attendance_written': self.buffer.written if self.buffer is not None else 0,
+            'attendance_batches': self.buffer.batches if self.buffer is not None else 0,
+            'routes': {name: stats.to_dict() for name, stats in sorted(self.stats.items())},
+        }
+
+    # Протокол
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_json(writer, 413, {'error': "слишком длинные заголовки"}, keep_alive=False)
+                    break
+                if not await self._serve_request(head, reader, writer):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_request(self, head, reader, writer):
+        """Обрабатывает один запрос; возвращает, можно ли продолжать соединение."""
+        start = time.perf_counter()
+        route = 'invalid'
+        status = 500
+        keep_alive = False
+        self.in_flight += 1
+        try:
+            try:
+                method, target, version, headers = _parse_head(head)
+                keep_alive = _keep_alive(version, headers)
+                body = await _read_body(reader, headers)
+                url = urlsplit(target)
+                parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+                route = parts[0] if parts else ''
+                handler = self.routes.get((method, route))
+                if handler is None:
+                    if any(name == route for _, name in self.routes):
+                        raise HTTPError(405, f"метод {method} не поддерживается для /{route}")
+                    route = 'unknown'
+                    raise HTTPError(404, f"нет маршрута {url.path}")
+                status = await handler(writer, parts[1:], parse_qs(url.query), body, keep_alive)
+            except HTTPError as e:
+                status = e.status
+                extra = {'Retry-After': '1'} if status == 503 else None
+                await self._send_json(writer, status, {'error': e.message}, keep_alive, extra)
+            except sqlite3.Error as e:
+                status = 500
+                logger.error(f"Ошибка БД при обработке {route}: {e}")
+                await self._send_json(writer, status, {'error': "ошибка базы данных"}, keep_alive)
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                status = 500
+                logger.error(f"Ошибка при обработке {route}: {e}")
+                await self._send_json(writer, status, {'error': "внутренняя ошибка сервера"}, keep_alive)
+        except ConnectionError:
+            keep_alive = False
+            # Клиент закрыл соединение, не дождавшись ответа (код как в nginx)
+            status = 499
+        finally:
+            self.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            stats = self.stats.get(route)
+            if stats is None:
+                stats = self.stats[route] = RouteStats()
+            stats.add(status, elapsed)
+            logger.debug(f"{route} {status} {elapsed * 1000:.1f} мс",
+                         extra={'route': route, 'status': status, 'elapsed_ms': round(elapsed * 1000, 2)})
+        return keep_alive
+
+    async def _send_json(self, writer, status, payload, keep_alive, extra_headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json; charset=utf-8', 'Content-Length': str(len(body))}
+        if extra_headers:
+            headers.update(extra_headers)
+        writer.write(_response_head(status, headers, keep_alive) + body)
+        await writer.drain()
+        return status
+
+    # Маршруты
+
+    async def handle_check_in(self, writer, args, query, body, keep_alive):
+        data = _json_body(body)
+        employee_id = _int_field(data, 'employee_id')
+        shift_id = _int_field(data, 'shift_id', required=False)
+        when = _time_field(data)
+        shift_id = await self.run_db(db_prepare_check_in, employee_id, shift_id, when,
+                                     priority=PRIORITY_INTERACTIVE)
+        # submit пишет журнал (и fsync) под блокировкой буфера: цикл событий
+        # не должен её ждать, поэтому вызов уходит в поток, а здесь ждётся Future
+        future = await asyncio.to_thread(self.buffer.submit, employee_id, shift_id, when, unique_open=True)
+        try:
+            attendance_id = await asyncio.wrap_future(future)
+        except DuplicateCheckIn as e:
+            raise HTTPError(409, str(e))
+        except sqlite3.IntegrityError as e:
+            raise HTTPError(409, f"отметка отвергнута: {e}")
+        return await self._send_json(writer, 201, {'attendance_id': attendance_id, 'employee_id': employee_id,
+                                                   'shift_id': shift_id, 'check_in_time': when}, keep_alive)
+
+    async def handle_check_out(self, writer, args, query, body, keep_alive):
+        data = _json_body(body)
+        employee_id = _int_field(data, 'employee_id')
+        when = _time_field(data)
+        attendance_id, check_in_time = await self.run_db(db_check_out, employee_id, when,
+                                                         priority=PRIORITY_INTERACTIVE)
+        return await self._send_json(writer, 200, {'attendance_id': attendance_id, 'employee_id': employee_id,
+                                                   'check_in_time': check_in_time, 'check_out_time': when},
+                                     keep_alive)
+
+    async def handle_employees(self, writer, args, query, body, keep_alive):
+        if args:
+            if len(args) != 1 or not args[0].isdigit():
+                raise HTTPError(404, "ожидается /employees/<id>")
+            employee = await self.run_db(db_employee, int(args[0]))
+            return await self._send_json(writer, 200, employee, keep_alive)
+        text = _query_value(query, 'q', '')
+        try:
+            limit = min(int(_query_value(query, 'limit', SEARCH_LIMIT)), SEARCH_LIMIT)
+        except ValueError:
+            raise HTTPError(400, "limit должен быть числом")
+        employees = await self.run_db(db_search, text, limit)
+        return await self._send_json(writer, 200, {'employees': employees}, keep_alive)
+
+    async def handle_report(self, writer, args, query, body, keep_alive):
+        start_date = _query_value(query, 'start')
+        end_date = _query_value(query, 'end')
+        if not (validators.validate_iso_date(start_date) and validators.validate_iso_date(end_date)):
+            raise HTTPError(400, "start и end — даты в формате гггг-мм-дд")
+        department = _query_value(query, 'department')
+        chunks = asyncio.Queue()
+        # Рабочий поток ждёт, пока клиент не заберёт предыдущие порции, поэтому
+        # медленный клиент не раздувает память сервера
+        window = threading.Semaphore(REPORT_WINDOW)
+        aborted = threading.Event()
+
+        def put(chunk):
+            # После обрыва put не ждёт окна: иначе рабочий поток БД повис бы навсегда
+            while not window.acquire(timeout=REPORT_ABORT_POLL):
+                if aborted.is_set():
+                    break
+            if aborted.is_set():
+                raise ConnectionAbortedError("клиент отключился")
+            self.loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+        job = self.run_db(db_stream_report, put, start_date, end_date, department,
+                          priority=PRIORITY_REPORT)
+        job.add_done_callback(lambda future: chunks.put_nowait(None))
+        headers = {'Content-Type': 'text/csv; charset=utf-8', 'Transfer-Encoding': 'chunked',
+                   'Content-Disposition': f'attachment; filename="attendance_{start_date}_{end_date}.csv"'}
+        writer.write(_response_head(200, headers, keep_alive))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                window.release()
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Задание прервётся на следующей порции
+            aborted.set()
+            raise
+        if job.exception() is not None:
+            # Заголовки уже отправлены: обрываем ответ без завершающей порции
+            logger.error(f"Ошибка выгрузки отчёта: {job.exception()}")
+            writer.close()
+            return 500
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        return 200
+
+    async def handle_metrics(self, writer, args, query, body, keep_alive):
+        return await self._send_json(writer, 200, self.metrics(), keep_alive)
+
+    async def handle_health(self, writer, args, query, body, keep_alive):
+        return await self._send_json(writer, 200, {'status': 'ok'}, keep_alive)
+
+
+def _parse_head(head):
+    try:
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HTTPError(400, "некорректная строка запроса")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, version, headers
+
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+async def _read_body(reader, headers):
+    if 'transfer-encoding' in headers:
+        raise HTTPError(411, "нужен Content-Length")
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise HTTPError(400, "некорректный Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "слишком большое тело запроса")
+    if length <= 0:
+        return b''
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("тело запроса не получено")
+
+
+def _response_head(status, headers, keep_alive):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+def _json_body(body):
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(400, "тело запроса должно быть JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "тело запроса должно быть объектом JSON")
+    return data
+
+
+def _int_field(data, name, required=True):
+    value = data.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise HTTPError(400, f"{name} должен быть положительным целым")
+    return value
+
+
+def _time_field(data):
+    value = data.get('time')
+    if value is None:
+        return datetime.now().strftime('%Y-%m-%d %H:%M')
+    if not validators.validate_datetime(value):
+        raise HTTPError(400, "time — отметка в формате гггг-мм-дд чч:мм")
+    return value
+
+
+def _query_value(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING):
+    """Запускает сервис и работает до SIGINT/SIGTERM."""
+    service = CheckInService(workers, max_pending)
+    await service.start(host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: цикл не принимает обработчики сигналов, остановка по Ctrl+C
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис отметок iRama")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', help="путь к базе (по умолчанию irama.db)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="потоков БД")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help="предел очереди запросов к БД")
+    args = parser.parse_args()
+    setup_logging()
+    if args.db:
+        database.DB_PATH = args.db
+    migrate(database.get_connection())
+    database.close_connection()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        database.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Хранение дат и отметок времени целыми числами.
+
+В базе check_in_time и check_out_time — секунды от 1970-01-01 00:00, а
+shift_date — номер дня от 1970-01-01. Время местное, без часового пояса:
+так же его понимают date(x, 'unixepoch') и strftime('%s', x) в SQLite.
+Снаружи (GUI, CSV, HTTP, отчёты) остаются строки 'гггг-мм-дд чч:мм' и
+'гггг-мм-дд'; перевод в обе стороны выполняется здесь.
+"""
+from datetime import date, datetime, timedelta
+
+DAY_SECONDS = 86400
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def to_epoch(value):
+    """'гггг-мм-дд чч:мм' или datetime → секунды; None и целые возвращаются как есть."""
+    if value is None or isinstance(value, int):
+        return value
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    return (value.toordinal() - _EPOCH_ORDINAL) * DAY_SECONDS + value.hour * 3600 + value.minute * 60 + value.second
+
+
+def from_epoch(seconds):
+    """Секунды → 'гггг-мм-дд чч:мм' (с секундами, если они не нулевые)."""
+    if seconds is None:
+        return None
+    moment = _EPOCH + timedelta(seconds=seconds)
+    return moment.isoformat(' ', 'seconds' if moment.second else 'minutes')
+
+
+def to_epoch_day(value):
+    """'гггг-мм-дд' или date → номер дня; None и целые возвращаются как есть."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = date.fromisoformat(value)
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def from_epoch_day(day):
+    """Номер дня → 'гггг-мм-дд'."""
+    if day is None:
+        return None
+    return date.fromordinal(day + _EPOCH_ORDINAL).isoformat()
+
+
+def period_bounds(start, end):
+    """Полуинтервал [начало, конец) в секундах для периода с концом включительно.
+
+    Границы — даты 'гггг-мм-дд' или отметки 'гггг-мм-дд чч:мм'; конечная
+    дата входит в период целиком, конечная отметка — до своей минуты.
+    """
+    if _is_day(start):
+        start_seconds = to_epoch_day(start) * DAY_SECONDS
+    else:
+        start_seconds = to_epoch(start)
+    if _is_day(end):
+        end_seconds = (to_epoch_day(end) + 1) * DAY_SECONDS
+    else:
+        end_seconds = to_epoch(end) + 60
+    return start_seconds, end_seconds
+
+
+def _is_day(value):
+    if isinstance(value, str):
+        return len(value) == 10
+    return isinstance(value, date) and not isinstance(value, datetime)
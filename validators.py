@@ -0,0 +1,49 @@
+import re
+from datetime import date, datetime, time
+
+PHONE_PATTERN = re.compile(r'^\+?\d{10,15}$')  # Пример: +79161234567 или 89161234567
+
+# Форма значения проверяется регуляркой, а корректность календаря — быстрым
+# fromisoformat (strptime заметно медленнее на пакетной загрузке)
+ISO_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+TIME_PATTERN = re.compile(r'\d{2}:\d{2}')
+DATETIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}')
+
+
+def validate_date(date_str):
+    """Проверяет, соответствует ли строка формату даты дд.мм.гггг."""
+    try:
+        datetime.strptime(date_str, '%d.%m.%Y')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_phone(phone):
+    """Проверяет, соответствует ли номер телефона формату."""
+    return phone is not None and PHONE_PATTERN.match(phone) is not None
+
+
+def _matches(pattern, parse, value):
+    if value is None or pattern.fullmatch(value) is None:
+        return False
+    try:
+        parse(value)
+        return True
+    except ValueError:
+        return False
+
+
+def validate_iso_date(date_str):
+    """Проверяет дату смены в формате гггг-мм-дд."""
+    return _matches(ISO_DATE_PATTERN, date.fromisoformat, date_str)
+
+
+def validate_time(time_str):
+    """Проверяет время в формате чч:мм."""
+    return _matches(TIME_PATTERN, time.fromisoformat, time_str)
+
+
+def validate_datetime(value):
+    """Проверяет отметку времени в формате гггг-мм-дд чч:мм."""
+    return _matches(DATETIME_PATTERN, datetime.fromisoformat, value)